@@ -0,0 +1,45 @@
+"""message versions and tombstones
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Таблицы могли быть созданы через create_all при старте приложения,
+# поэтому добавляем только отсутствующие столбцы
+def _existing_columns(table: str) -> set[str]:
+    inspector = sa.inspect(op.get_bind())
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    columns = _existing_columns("messages")
+
+    if "version" not in columns:
+        op.add_column(
+            "messages",
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+    if "edited_at" not in columns:
+        op.add_column("messages", sa.Column("edited_at", sa.DateTime(), nullable=True))
+    if "deleted_at" not in columns:
+        op.add_column("messages", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "deleted_at")
+    op.drop_column("messages", "edited_at")
+    op.drop_column("messages", "version")
@@ -0,0 +1,78 @@
+"""group chat rooms
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "rooms" not in tables:
+        op.create_table(
+            "rooms",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column(
+                "owner_id",
+                sa.Integer(),
+                sa.ForeignKey("users.id", ondelete="SET NULL"),
+                nullable=True,
+            ),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_rooms_id", "rooms", ["id"])
+        op.create_index("ix_rooms_name", "rooms", ["name"], unique=True)
+
+    if "room_members" not in tables:
+        op.create_table(
+            "room_members",
+            sa.Column(
+                "room_id",
+                sa.Integer(),
+                sa.ForeignKey("rooms.id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column(
+                "user_id",
+                sa.Integer(),
+                sa.ForeignKey("users.id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("joined_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_room_members_user_id", "room_members", ["user_id"])
+
+    columns = {column["name"] for column in inspector.get_columns("messages")}
+    if "room_id" not in columns:
+        op.add_column(
+            "messages",
+            sa.Column(
+                "room_id",
+                sa.Integer(),
+                sa.ForeignKey("rooms.id", ondelete="CASCADE"),
+                nullable=True,
+            ),
+        )
+        op.create_index("ix_messages_room_id", "messages", ["room_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_room_id", table_name="messages")
+    op.drop_column("messages", "room_id")
+    op.drop_table("room_members")
+    op.drop_table("rooms")
@@ -0,0 +1,168 @@
+"""partition messages by timestamp, add messages archive
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Сколько месяцев вперед создаются секции при миграции
+# (дальше их поддерживает задача политики хранения)
+MONTHS_AHEAD = 3
+
+MESSAGE_INDEXES = ("sender_id", "recipient_id", "room_id")
+
+
+def _add_months(month: date, count: int) -> date:
+    month_index = month.month - 1 + count
+    return date(month.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def _is_partitioned(table: str) -> bool:
+    relkind = op.get_bind().execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :table"),
+        {"table": table},
+    ).scalar()
+    return relkind == "p"
+
+
+def _create_monthly_partitions(table: str, first_month: date, last_month: date) -> None:
+    month = first_month
+    while month <= last_month:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {table}_{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        )
+        month = next_month
+
+
+# Перестройка обычной таблицы в секционированную по timestamp с переносом данных
+def _partition_table(
+    table: str, foreign_keys: dict[str, str], monthly: bool = True
+) -> None:
+    bind = op.get_bind()
+    legacy = f"{table}_legacy"
+
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    op.execute(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {legacy}_pkey")
+    op.execute(f'UPDATE {legacy} SET "timestamp" = now() WHERE "timestamp" IS NULL')
+
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) "
+        'PARTITION BY RANGE ("timestamp")'
+    )
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN "timestamp" SET NOT NULL')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "timestamp")')
+
+    for column, target in foreign_keys.items():
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES {target}"
+        )
+
+    for column in MESSAGE_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
+        op.execute(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})")
+    op.execute(f'CREATE INDEX ix_{table}_timestamp ON {table} ("timestamp")')
+
+    if monthly:
+        first_month = bind.execute(
+            sa.text(
+                f'SELECT date_trunc(\'month\', min("timestamp"))::date FROM {legacy}'
+            )
+        ).scalar() or date.today().replace(day=1)
+        last_month = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+
+        _create_monthly_partitions(table, first_month, last_month)
+
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+
+    # Последовательность id переходит к новой таблице
+    sequence = bind.execute(
+        sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": legacy}
+    ).scalar()
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+    op.execute(f"DROP TABLE {legacy} CASCADE")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "messages_archive" not in inspector.get_table_names():
+        op.create_table(
+            "messages_archive",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("sender_id", sa.Integer(), nullable=True),
+            sa.Column("recipient_id", sa.Integer(), nullable=True),
+            sa.Column("room_id", sa.Integer(), nullable=True),
+            sa.Column("text", sa.String(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+            sa.Column("edited_at", sa.DateTime(), nullable=True),
+            sa.Column("deleted_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id", "timestamp"),
+        )
+        for column in MESSAGE_INDEXES:
+            op.create_index(f"ix_messages_archive_{column}", "messages_archive", [column])
+
+    # Секционирование поддерживается только PostgreSQL
+    if bind.dialect.name != "postgresql":
+        return
+
+    if not _is_partitioned("messages"):
+        _partition_table(
+            "messages",
+            {
+                "sender_id": "users (id)",
+                "recipient_id": "users (id)",
+                "room_id": "rooms (id) ON DELETE CASCADE",
+            },
+        )
+
+    # Архив секционирован так же: холодная секция переносится в него
+    # через DETACH/ATTACH PARTITION без копирования строк, поэтому
+    # собственных месячных секций у архива нет
+    if not _is_partitioned("messages_archive"):
+        _partition_table("messages_archive", {}, monthly=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == "postgresql" and _is_partitioned("messages"):
+        op.execute("CREATE TABLE messages_plain (LIKE messages INCLUDING DEFAULTS)")
+        op.execute("INSERT INTO messages_plain SELECT * FROM messages")
+        op.execute("DROP TABLE messages CASCADE")
+        op.execute("ALTER TABLE messages_plain RENAME TO messages")
+        op.execute("ALTER TABLE messages ADD PRIMARY KEY (id)")
+        op.execute(
+            "ALTER TABLE messages ADD FOREIGN KEY (sender_id) REFERENCES users (id)"
+        )
+        op.execute(
+            "ALTER TABLE messages ADD FOREIGN KEY (recipient_id) REFERENCES users (id)"
+        )
+        op.execute(
+            "ALTER TABLE messages ADD FOREIGN KEY (room_id) "
+            "REFERENCES rooms (id) ON DELETE CASCADE"
+        )
+
+    op.drop_table("messages_archive")
@@ -0,0 +1,36 @@
+"""outbox table for background tasks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if "outbox" not in inspector.get_table_names():
+        op.create_table(
+            "outbox",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("task", sa.String(), nullable=False),
+            sa.Column("args", sa.JSON(), nullable=False),
+            sa.Column("message_id", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("outbox")
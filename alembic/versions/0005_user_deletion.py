@@ -0,0 +1,65 @@
+"""set-based user deletion: ON DELETE SET NULL, deletion jobs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MESSAGE_USER_COLUMNS = ("sender_id", "recipient_id")
+
+
+def _set_message_foreign_keys(on_delete: str) -> None:
+    for column in MESSAGE_USER_COLUMNS:
+        op.execute(
+            f"ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_{column}_fkey"
+        )
+        op.execute(
+            f"ALTER TABLE messages ADD CONSTRAINT messages_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES users (id) {on_delete}"
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    columns = {column["name"] for column in inspector.get_columns("users")}
+    if "deleted_at" not in columns:
+        op.add_column("users", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+
+    if "user_deletions" not in inspector.get_table_names():
+        op.create_table(
+            "user_deletions",
+            sa.Column("user_id", sa.Integer(), primary_key=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("messages_anonymised", sa.Integer(), nullable=False),
+            sa.Column("requested_at", sa.DateTime(), nullable=False),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.Column("error", sa.String(), nullable=True),
+        )
+
+    # SQLite не умеет менять ограничения, а внешние ключи в нем по умолчанию
+    # не проверяются; там остаток ссылок обнуляет сама задача удаления
+    if bind.dialect.name == "postgresql":
+        _set_message_foreign_keys("ON DELETE SET NULL")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        _set_message_foreign_keys("")
+
+    op.drop_table("user_deletions")
+    op.drop_column("users", "deleted_at")
@@ -0,0 +1,41 @@
+"""client message ids for idempotent sends
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if "message_client_ids" not in inspector.get_table_names():
+        op.create_table(
+            "message_client_ids",
+            sa.Column("sender_id", sa.Integer(), primary_key=True),
+            sa.Column("client_msg_id", sa.String(length=64), primary_key=True),
+            sa.Column("message_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index(
+            "ix_message_client_ids_created_at",
+            "message_client_ids",
+            ["created_at"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_client_ids_created_at", table_name="message_client_ids")
+    op.drop_table("message_client_ids")
@@ -0,0 +1,59 @@
+"""message change sequence for delta sync
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CHANGE_SEQ_INDEXES = ("sender_id", "recipient_id", "room_id")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Секции архива подключаются к messages_archive, поэтому столбцы таблиц совпадают
+    for table in ("messages", "messages_archive"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "change_seq" not in columns:
+            op.add_column(table, sa.Column("change_seq", sa.Integer(), nullable=True))
+
+    # Существующим сообщениям номер изменения выдается по id
+    op.execute("UPDATE messages SET change_seq = id WHERE change_seq IS NULL")
+
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE SEQUENCE IF NOT EXISTS message_change_seq")
+        op.execute(
+            "SELECT setval('message_change_seq', "
+            "(SELECT coalesce(max(change_seq), 0) + 1 FROM messages), false)"
+        )
+
+    indexes = {index["name"] for index in inspector.get_indexes("messages")}
+    for column in CHANGE_SEQ_INDEXES:
+        name = f"ix_messages_{column}_change_seq"
+        if name not in indexes:
+            op.create_index(name, "messages", [column, "change_seq"])
+
+
+def downgrade() -> None:
+    for column in CHANGE_SEQ_INDEXES:
+        op.drop_index(f"ix_messages_{column}_change_seq", table_name="messages")
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP SEQUENCE IF EXISTS message_change_seq")
+
+    op.drop_column("messages_archive", "change_seq")
+    op.drop_column("messages", "change_seq")
@@ -0,0 +1,49 @@
+"""user change sequence for ETags
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    columns = {column["name"] for column in inspector.get_columns("users")}
+    if "change_seq" not in columns:
+        op.add_column("users", sa.Column("change_seq", sa.Integer(), nullable=True))
+
+    op.execute("UPDATE users SET change_seq = id WHERE change_seq IS NULL")
+
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE SEQUENCE IF NOT EXISTS user_change_seq")
+        op.execute(
+            "SELECT setval('user_change_seq', "
+            "(SELECT coalesce(max(change_seq), 0) + 1 FROM users), false)"
+        )
+
+    indexes = {index["name"] for index in inspector.get_indexes("users")}
+    if "ix_users_change_seq" not in indexes:
+        op.create_index("ix_users_change_seq", "users", ["change_seq"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_change_seq", table_name="users")
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP SEQUENCE IF EXISTS user_change_seq")
+
+    op.drop_column("users", "change_seq")
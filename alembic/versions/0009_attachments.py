@@ -0,0 +1,49 @@
+"""message attachments
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if "attachments" not in inspector.get_table_names():
+        op.create_table(
+            "attachments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "uploader_id",
+                sa.Integer(),
+                sa.ForeignKey("users.id", ondelete="SET NULL"),
+                nullable=True,
+            ),
+            sa.Column("message_id", sa.Integer(), nullable=True),
+            sa.Column("sha256", sa.String(length=64), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("content_type", sa.String(), nullable=False),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("thumbnail_status", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_attachments_message_id", "attachments", ["message_id"])
+        op.create_index("ix_attachments_sha256", "attachments", ["sha256"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attachments_sha256", table_name="attachments")
+    op.drop_index("ix_attachments_message_id", table_name="attachments")
+    op.drop_table("attachments")
@@ -0,0 +1,69 @@
+"""message text stored in message_codec format
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Секции архива подключаются к messages_archive, поэтому тип меняется в обеих таблицах
+MESSAGE_TABLES = ("messages", "messages_archive")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # SQLite не проверяет типы столбцов: старые строки остаются TEXT
+    # и читаются кодеком как есть, новые пишутся BLOB в формате кодека
+    if bind.dialect.name != "postgresql":
+        return
+
+    inspector = sa.inspect(bind)
+
+    for table in MESSAGE_TABLES:
+        columns = {
+            column["name"]: column["type"] for column in inspector.get_columns(table)
+        }
+        if isinstance(columns["text"], sa.LargeBinary):
+            continue
+
+        # Существующий текст получает заголовок "без сжатия" (0x00); сжать его
+        # можно потом задачей compress_message_bodies, не блокируя таблицу
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN text TYPE bytea "
+            "USING '\\x00'::bytea || convert_to(text, 'UTF8')"
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name != "postgresql":
+        return
+
+    for table in MESSAGE_TABLES:
+        compressed = bind.execute(
+            sa.text(f"SELECT count(*) FROM {table} WHERE get_byte(text, 0) <> 0")
+        ).scalar()
+        if compressed:
+            raise RuntimeError(
+                f"{table} has {compressed} compressed rows: run compress_message_bodies "
+                "with MESSAGE_COMPRESSION=none before downgrading"
+            )
+
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN text TYPE varchar "
+            "USING convert_from(substring(text FROM 2), 'UTF8')"
+        )
@@ -0,0 +1,60 @@
+"""ephemeral messages: expires_at and room message TTL
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Секции архива подключаются к messages_archive, поэтому столбцы таблиц совпадают
+MESSAGE_TABLES = ("messages", "messages_archive")
+
+EXPIRES_AT_WHERE = sa.text("expires_at IS NOT NULL")
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    for table in MESSAGE_TABLES:
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "expires_at" not in columns:
+            op.add_column(table, sa.Column("expires_at", sa.DateTime(), nullable=True))
+
+        # Частичный индекс почти пуст, пока исчезающих сообщений мало; индекс
+        # секционированной messages создается и во всех ее секциях
+        indexes = {index["name"] for index in inspector.get_indexes(table)}
+        name = f"ix_{table}_expires_at"
+        if name not in indexes:
+            op.create_index(
+                name,
+                table,
+                ["expires_at"],
+                postgresql_where=EXPIRES_AT_WHERE,
+                sqlite_where=EXPIRES_AT_WHERE,
+            )
+
+    columns = {column["name"] for column in inspector.get_columns("rooms")}
+    if "message_ttl_seconds" not in columns:
+        op.add_column(
+            "rooms", sa.Column("message_ttl_seconds", sa.Integer(), nullable=True)
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("rooms", "message_ttl_seconds")
+
+    for table in MESSAGE_TABLES:
+        op.drop_index(f"ix_{table}_expires_at", table_name=table)
+        op.drop_column(table, "expires_at")
@@ -0,0 +1,59 @@
+"""expiry index without tombstones
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MESSAGE_TABLES = ("messages", "messages_archive")
+
+EXPIRES_AT_WHERE = sa.text("expires_at IS NOT NULL")
+PENDING_WHERE = sa.text("expires_at IS NOT NULL AND deleted_at IS NULL")
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # Задача expire_messages оставляет expires_at у "надгробий", поэтому индекс
+    # из 0011 рос с каждым истекшим сообщением. В новом индексе только строки,
+    # которые еще не обработаны
+    for table in MESSAGE_TABLES:
+        indexes = {index["name"] for index in inspector.get_indexes(table)}
+
+        name = f"ix_{table}_expires_at_pending"
+        if name not in indexes:
+            op.create_index(
+                name,
+                table,
+                ["expires_at"],
+                postgresql_where=PENDING_WHERE,
+                sqlite_where=PENDING_WHERE,
+            )
+
+        if f"ix_{table}_expires_at" in indexes:
+            op.drop_index(f"ix_{table}_expires_at", table_name=table)
+
+
+def downgrade() -> None:
+    for table in MESSAGE_TABLES:
+        op.create_index(
+            f"ix_{table}_expires_at",
+            table,
+            ["expires_at"],
+            postgresql_where=EXPIRES_AT_WHERE,
+            sqlite_where=EXPIRES_AT_WHERE,
+        )
+        op.drop_index(f"ix_{table}_expires_at_pending", table_name=table)
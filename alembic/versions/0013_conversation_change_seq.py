@@ -0,0 +1,36 @@
+"""conversation change sequence index
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEX_NAME = "ix_messages_sender_id_recipient_id_change_seq"
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # Последнее изменение в одном направлении переписки - один шаг по индексу
+    indexes = {index["name"] for index in inspector.get_indexes("messages")}
+    if INDEX_NAME not in indexes:
+        op.create_index(
+            INDEX_NAME, "messages", ["sender_id", "recipient_id", "change_seq"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="messages")
@@ -0,0 +1,485 @@
+# Нагрузочный тест чата: заполняет локальную БД пользователями и сообщениями,
+# запускает приложение в отдельном процессе и гоняет через него K клиентов
+# WebSocket (/ws/messages/{user_id}) и R клиентов REST (POST /api/messages/).
+# Celery работает с брокером memory:// внутри процесса приложения, поэтому
+# Redis не нужен, а постановка уведомлений в очередь все равно замеряется.
+#
+# Результат - JSON (stdout или --output), пригодный для сравнения запусков:
+# задержки доставки p50/p95/p99, сообщений в секунду, SQL-запросов на сообщение
+# (по /metrics приложения) и прирост RSS процесса приложения на одно соединение.
+#
+#   python -m benchmarks.chat_load --users 1000 --messages 100000 \
+#       --ws-clients 200 --rest-clients 20 --per-client 50 --output run.json
+#
+# По умолчанию используется SQLite во временном каталоге; для PostgreSQL:
+#   --database-url postgresql://... --async-database-url postgresql+asyncpg://...
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import httpx
+import websockets
+
+# Модули src импортируются внутри функций: настройки из аргументов
+# должны попасть в окружение раньше, чем загрузится src.config
+from benchmarks.stats import percentile
+
+
+PASSWORD_HASH_ROUNDS = 4
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_bytes(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+    return None
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Сумма по всем меткам метрики из текстового вывода /metrics
+def metric_total(metrics_text: str, name: str) -> float:
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            total += float(line.rsplit(" ", 1)[1])
+
+    return total
+
+
+def summarize(timings: list[float]) -> dict:
+    if not timings:
+        return {"count": 0}
+
+    return {
+        "count": len(timings),
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+# Заполнение БД: пользователи (с одним общим хешем пароля) и история переписки
+def seed_database(users_count: int, messages_count: int) -> None:
+    from passlib.context import CryptContext
+    from sqlalchemy import create_engine, insert
+
+    from src.config import app_settings
+    from src.models.base import Base
+    from src.models import UserORM, MessageORM
+
+    engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    # Токены выдаются напрямую, пароль нужен только для ручного входа
+    hashed_password = CryptContext(
+        schemes=["bcrypt"], bcrypt__rounds=PASSWORD_HASH_ROUNDS
+    ).hash("password")
+
+    with engine.begin() as connection:
+        connection.execute(
+            insert(UserORM),
+            [
+                {
+                    "username": f"user{user_id}",
+                    "email": f"user{user_id}@example.com",
+                    "telegram_url": f"https://t.me/user{user_id}",
+                    "hashed_password": hashed_password,
+                }
+                for user_id in range(1, users_count + 1)
+            ],
+        )
+
+        started_at = datetime.now() - timedelta(days=30)
+        batch = []
+        for index in range(messages_count):
+            sender_id = random.randint(1, users_count)
+            recipient_id = random.randint(1, users_count)
+            batch.append(
+                {
+                    "sender_id": sender_id,
+                    "recipient_id": recipient_id,
+                    "text": f"seed message {index}",
+                    "timestamp": started_at + timedelta(seconds=index),
+                }
+            )
+
+            if len(batch) == 10000:
+                connection.execute(insert(MessageORM), batch)
+                batch = []
+
+        if batch:
+            connection.execute(insert(MessageORM), batch)
+
+    engine.dispose()
+
+
+def access_token(user_id: int, role: str = "user") -> str:
+    import src.services.auth as auth_service
+    from src.models.schemas import UserResponseDTO
+
+    return auth_service.create_access_token(
+        UserResponseDTO.model_validate(
+            {
+                "id": user_id,
+                "username": f"user{user_id}",
+                "email": f"user{user_id}@example.com",
+                "role": role,
+                "telegram_url": f"https://t.me/user{user_id}",
+            }
+        ),
+        timedelta(hours=1),
+    )
+
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get("/metrics")
+                if response.status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+
+            await asyncio.sleep(0.2)
+
+    raise RuntimeError("Application did not start in time")
+
+
+# Учет задержек: на каждое сообщение ожидается эхо отправителю
+# и, если получатель в сети, доставка ему
+class DeliveryTracker:
+    def __init__(self, expected_frames: int):
+        self.sent_at: dict[str, float] = {}
+        self.delivery: list[float] = []
+        self.ack: list[float] = []
+        self.pending = expected_frames
+        self.done = asyncio.Event()
+
+    def sent(self, key: str) -> None:
+        self.sent_at[key] = time.perf_counter()
+
+    def received(self, key: str, is_echo: bool) -> None:
+        sent_at = self.sent_at.get(key)
+        if sent_at is None:
+            return
+
+        elapsed = (time.perf_counter() - sent_at) * 1000
+        (self.ack if is_echo else self.delivery).append(elapsed)
+
+        self.pending -= 1
+        if self.pending == 0:
+            self.done.set()
+
+
+# Клиент WebSocket: читает входящие кадры и отправляет per_client сообщений собеседнику
+async def websocket_client(
+    base_ws_url: str,
+    user_id: int,
+    peer_id: int,
+    per_client: int,
+    interval: float,
+    tracker: DeliveryTracker,
+    connected: asyncio.Barrier,
+    start: asyncio.Event,
+) -> None:
+    url = f"{base_ws_url}/ws/messages/{peer_id}?token={access_token(user_id)}"
+
+    async with websockets.connect(url, max_queue=None) as websocket:
+
+        async def reader():
+            async for frame in websocket:
+                event = json.loads(frame)
+                if event.get("type") != "message":
+                    continue
+
+                key = event["text"]
+                tracker.received(key, is_echo=key.startswith(f"{user_id}:"))
+
+        reader_task = asyncio.create_task(reader())
+        await connected.wait()
+        await start.wait()
+
+        for index in range(per_client):
+            key = f"{user_id}:{index}"
+            tracker.sent(key)
+            await websocket.send(json.dumps({"type": "message", "text": key}))
+
+            if interval:
+                await asyncio.sleep(interval)
+
+        await tracker.done.wait()
+        reader_task.cancel()
+
+
+# Клиент REST: последовательно отправляет per_client сообщений через API
+async def rest_client(
+    base_url: str,
+    user_id: int,
+    recipient_id: int,
+    per_client: int,
+    interval: float,
+    timings: list[float],
+    start: asyncio.Event,
+    timeout: float,
+) -> None:
+    headers = {"Authorization": f"Bearer {access_token(user_id)}"}
+
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, timeout=timeout
+    ) as client:
+        await start.wait()
+
+        for index in range(per_client):
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/messages/",
+                json={"recipient_id": recipient_id, "text": f"rest {user_id}:{index}"},
+            )
+            response.raise_for_status()
+            timings.append((time.perf_counter() - started) * 1000)
+
+            if interval:
+                await asyncio.sleep(interval)
+
+
+async def run_load(args, base_url: str, server_pid: int) -> dict:
+    base_ws_url = base_url.replace("http://", "ws://")
+    ws_clients = args.ws_clients - args.ws_clients % 2
+    offline_pairs = int(ws_clients // 2 * args.offline_share)
+
+    # Клиенты разбиты на пары собеседников; у части пар второй участник
+    # не подключен (его сообщения уходят в уведомления через Celery)
+    pairs = []
+    for pair_index in range(ws_clients // 2):
+        first, second = 2 * pair_index + 1, 2 * pair_index + 2
+        pairs.append((first, second, pair_index >= offline_pairs))
+
+    rest_senders = range(ws_clients + 1, ws_clients + args.rest_clients + 1)
+    if ws_clients + args.rest_clients + 1 > args.users:
+        raise SystemExit("--users must exceed --ws-clients + --rest-clients")
+
+    connections = sum(2 if both_online else 1 for _, _, both_online in pairs)
+    expected_frames = sum(
+        (4 if both_online else 1) * args.per_client for _, _, both_online in pairs
+    )
+
+    tracker = DeliveryTracker(expected_frames)
+    rest_timings: list[float] = []
+    start = asyncio.Event()
+    connected = asyncio.Barrier(connections + 1)
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        rss_before = read_rss_bytes(server_pid)
+
+        tasks = []
+        for first, second, both_online in pairs:
+            tasks.append(
+                websocket_client(
+                    base_ws_url, first, second,
+                    args.per_client, args.interval, tracker, connected, start,
+                )
+            )
+            if both_online:
+                tasks.append(
+                    websocket_client(
+                        base_ws_url, second, first,
+                        args.per_client, args.interval, tracker, connected, start,
+                    )
+                )
+
+        for user_id in rest_senders:
+            tasks.append(
+                rest_client(
+                    base_url, user_id, args.users, args.per_client,
+                    args.interval, rest_timings, start, args.timeout,
+                )
+            )
+
+        running = [asyncio.create_task(task) for task in tasks]
+        await asyncio.wait_for(connected.wait(), args.timeout)
+
+        rss_connected = read_rss_bytes(server_pid)
+        metrics_before = (await client.get("/metrics")).text
+
+        started = time.perf_counter()
+        start.set()
+        await asyncio.wait_for(asyncio.gather(*running), args.timeout)
+        elapsed = time.perf_counter() - started
+
+        # Уведомления передаются брокеру ретранслятором outbox асинхронно
+        await asyncio.sleep(1.5)
+        metrics_after = (await client.get("/metrics")).text
+
+    def delta(name: str) -> float:
+        return metric_total(metrics_after, name) - metric_total(metrics_before, name)
+
+    ingested = delta("messages_ingested_total")
+    queries = delta("db_query_duration_seconds_count")
+
+    rss_per_connection = None
+    if rss_before is not None and rss_connected is not None and connections:
+        rss_per_connection = (rss_connected - rss_before) // connections
+
+    return {
+        "websocket_delivery": summarize(tracker.delivery),
+        "websocket_ack": summarize(tracker.ack),
+        "rest_request": summarize(rest_timings),
+        "messages": int(ingested),
+        "duration_s": round(elapsed, 3),
+        "messages_per_second": round(ingested / elapsed, 1) if elapsed else None,
+        "db_queries_per_message": round(queries / ingested, 2) if ingested else None,
+        "notifications_dispatched": int(delta("outbox_dispatched_total")),
+        "websocket_connections": connections,
+        "server_rss_bytes": rss_connected,
+        "rss_per_connection_bytes": rss_per_connection,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat throughput and latency benchmark")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--ws-clients", type=int, default=100)
+    parser.add_argument("--rest-clients", type=int, default=10)
+    parser.add_argument("--per-client", type=int, default=50)
+    parser.add_argument(
+        "--interval", type=float, default=0.0, help="pause between sends, seconds"
+    )
+    parser.add_argument(
+        "--offline-share",
+        type=float,
+        default=0.2,
+        help="share of WebSocket pairs whose peer is offline (Celery notifications)",
+    )
+    parser.add_argument("--database-url")
+    parser.add_argument("--async-database-url")
+    parser.add_argument(
+        "--no-seed",
+        action="store_true",
+        help="reuse existing data (otherwise all tables are recreated)",
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        path = os.path.join(tempfile.gettempdir(), "chat_load.db")
+        args.database_url = f"sqlite:///{path}"
+        args.async_database_url = f"sqlite+aiosqlite:///{path}"
+
+    # Настройки должны попасть в окружение до импорта src.config
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        ASYNC_DATABASE_URL=args.async_database_url or args.database_url,
+        CELERY_BROKER_URL="memory://",
+        CELERY_RESULT_BACKEND="cache+memory://",
+        RATE_LIMIT_BACKEND="memory",
+        RATE_LIMIT_MESSAGES_PER_SECOND="1000000",
+        RATE_LIMIT_MESSAGES_BURST="1000000",
+        PRESENCE_BACKEND="memory",
+        LOG_LEVEL="WARNING",
+        LOG_SAMPLE_RATE="0",
+    )
+    os.environ.update(env)
+
+    if not args.no_seed:
+        seed_started = time.perf_counter()
+        seed_database(args.users, args.messages)
+        seed_seconds = time.perf_counter() - seed_started
+    else:
+        seed_seconds = 0.0
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port, env)
+
+    try:
+        asyncio.run(wait_until_ready(base_url))
+        results = asyncio.run(run_load(args, base_url, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "benchmark": "chat_load",
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "database": args.database_url.split(":", 1)[0],
+        "parameters": {
+            "users": args.users,
+            "seeded_messages": args.messages,
+            "ws_clients": args.ws_clients,
+            "rest_clients": args.rest_clients,
+            "per_client": args.per_client,
+            "interval": args.interval,
+            "offline_share": args.offline_share,
+        },
+        "seed_seconds": round(seed_seconds, 2),
+        **results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
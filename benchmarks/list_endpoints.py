@@ -0,0 +1,184 @@
+# Замер списковых обработчиков API: GET /api/users/ (администратор получает всех
+# пользователей) и GET /api/messages/ (вся переписка пользователя). Приложение
+# вызывается в том же процессе через ASGI-транспорт httpx, поэтому в задержку
+# входят только обработчик, запрос к БД и сериализация ответа.
+#
+# Отдельно сравнивается сборка DTO: model_validate по загруженным объектам ORM
+# (как было раньше) и from_row по строкам с нужными столбцами.
+#
+#   python -m benchmarks.list_endpoints --users 5000 --messages 100000 \
+#       --iterations 200 --output lists.json
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+import httpx
+
+# Модули src импортируются внутри функций: настройки из аргументов
+# должны попасть в окружение раньше, чем загрузится src.config
+from benchmarks.chat_load import access_token, git_revision, seed_database, summarize
+
+
+ADMIN_USER_ID = 1
+
+
+async def measure_endpoint(
+    client: httpx.AsyncClient, path: str, token: str, iterations: int
+) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    timings = []
+    items = 0
+    size = 0
+
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+
+        response.raise_for_status()
+        items = len(response.json())
+        size = len(response.content)
+
+    return {"items": items, "response_bytes": size, **summarize(timings)}
+
+
+async def run_endpoints(iterations: int) -> dict:
+    from src.main import app
+
+    admin_token = access_token(ADMIN_USER_ID, role="admin")
+    user_token = access_token(ADMIN_USER_ID)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Прогрев: соединения пула, кэши компиляции SQLAlchemy
+        for token in (admin_token, user_token):
+            await client.get("/api/users/", headers={"Authorization": f"Bearer {token}"})
+        await client.get(
+            "/api/messages/", headers={"Authorization": f"Bearer {user_token}"}
+        )
+
+        return {
+            "get_users": await measure_endpoint(
+                client, "/api/users/", admin_token, iterations
+            ),
+            "get_messages": await measure_endpoint(
+                client, "/api/messages/", user_token, iterations
+            ),
+        }
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return round(min(timings), 3)
+
+
+# Сборка списка пользователей из БД: объекты ORM + model_validate против
+# проекции столбцов + from_row (запрос к БД входит в оба замера)
+def compare_dto_building(repeat: int) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.future import select
+
+    from src.config import app_settings
+    from src.models import UserORM
+    from src.models.schemas import UserResponseDTO, user_list_adapter
+    from src.services.users import USER_COLUMNS
+
+    engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
+
+    def orm_validate():
+        with Session(engine) as session:
+            users = [
+                UserResponseDTO.model_validate(user.__dict__)
+                for user in session.execute(select(UserORM)).scalars().all()
+            ]
+        user_list_adapter.validate_python([user.model_dump() for user in users])
+        return user_list_adapter.dump_json(users)
+
+    def row_construct():
+        with Session(engine) as session:
+            users = [
+                UserResponseDTO.from_row(row)
+                for row in session.execute(select(*USER_COLUMNS)).all()
+            ]
+        return user_list_adapter.dump_json(users)
+
+    assert json.loads(orm_validate()) == json.loads(row_construct())
+
+    result = {
+        "orm_model_validate_ms": best_of(repeat, orm_validate),
+        "columns_from_row_ms": best_of(repeat, row_construct),
+    }
+    engine.dispose()
+
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List endpoints benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url")
+    parser.add_argument("--async-database-url")
+    parser.add_argument(
+        "--no-seed",
+        action="store_true",
+        help="reuse existing data (otherwise all tables are recreated)",
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        path = os.path.join(tempfile.gettempdir(), "list_endpoints.db")
+        args.database_url = f"sqlite:///{path}"
+        args.async_database_url = f"sqlite+aiosqlite:///{path}"
+
+    # Настройки должны попасть в окружение до импорта src.config
+    os.environ.update(
+        DATABASE_URL=args.database_url,
+        ASYNC_DATABASE_URL=args.async_database_url or args.database_url,
+        PRESENCE_BACKEND="memory",
+        RATE_LIMIT_BACKEND="memory",
+        LOG_LEVEL="WARNING",
+        LOG_SAMPLE_RATE="0",
+    )
+
+    if not args.no_seed:
+        seed_database(args.users, args.messages)
+
+    report = {
+        "benchmark": "list_endpoints",
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "database": args.database_url.split(":", 1)[0],
+        "parameters": {
+            "users": args.users,
+            "seeded_messages": args.messages,
+            "iterations": args.iterations,
+        },
+        "endpoints": asyncio.run(run_endpoints(args.iterations)),
+        "dto_building": compare_dto_building(args.repeat),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
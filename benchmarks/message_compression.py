@@ -0,0 +1,225 @@
+# Замер формата хранения текста сообщений (src/data/message_codec.py): степень
+# сжатия и время кодирования/декодирования одного сообщения без сжатия, zstd
+# без словаря и zstd со словарем. Словарь обучается на одной половине корпуса,
+# замер идет на другой, как это будет со словарем, обученным на старой переписке.
+#
+# Корпус - последние сообщения из БД (--database-url) или сгенерированная
+# переписка: короткие реплики, фразы средней длины, ссылки и редкие длинные тексты.
+# Распределение длин печатается в отчете, чтобы результаты можно было сравнивать.
+# Сгенерированная переписка однообразнее настоящей и завышает выигрыш словаря:
+# решение о включении сжатия принимается по замеру на данных из БД.
+#
+#   python -m benchmarks.message_compression --messages 50000 --output codec.json
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+from benchmarks.chat_load import git_revision
+from benchmarks.stats import percentile
+
+
+SHORT_REPLIES = [
+    "ok", "ок", "да", "нет", "спасибо!", "👍", "ага", "thanks", "+1", "понял",
+    "хорошо", "сейчас", "lol", "да, давай", "не знаю", "позже напишу",
+]
+
+PHRASES = [
+    "привет, как дела?",
+    "во сколько встречаемся завтра?",
+    "скинь, пожалуйста, ссылку на документ",
+    "я уже выехал, буду минут через {n}",
+    "посмотри задачу #{n}, там опять падает сборка",
+    "созвон переносится на {n}:00",
+    "можешь проверить мой pull request?",
+    "не получается зайти в личный кабинет, пишет ошибку {n}",
+    "did you see the latest release notes?",
+    "let's sync tomorrow at {n} pm",
+    "I pushed the fix, can you take a look?",
+    "отправил тебе файл, проверь почту",
+    "ссылка: https://example.com/docs/{n}?utm_source=chat",
+    "заказ №{n} уже в пути, курьер позвонит заранее",
+]
+
+WORDS = (
+    "сообщение чат сервер база данных запрос пользователь ошибка время встреча "
+    "проект задача команда релиз тест сборка ответ вопрос документ файл ссылка "
+    "the and for with deploy review build query latency cache index user"
+).split()
+
+
+def generate_message(rng: random.Random) -> str:
+    kind = rng.random()
+
+    if kind < 0.35:
+        return rng.choice(SHORT_REPLIES)
+
+    if kind < 0.85:
+        parts = [rng.choice(PHRASES) for _ in range(rng.randint(1, 2))]
+        return " ".join(parts).format(n=rng.randint(1, 9999))
+
+    if kind < 0.97:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 60)))
+
+    paragraphs = [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+        for _ in range(rng.randint(2, 6))
+    ]
+    return "\n\n".join(paragraphs)
+
+
+def generated_corpus(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [generate_message(rng) for _ in range(count)]
+
+
+def database_corpus(count: int) -> list[str]:
+    from sqlalchemy import create_engine
+    from sqlalchemy.future import select
+
+    from src.config import app_settings
+    from src.models.message import MessageORM
+
+    engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
+    with engine.connect() as connection:
+        texts = connection.execute(
+            select(MessageORM.text)
+            .where(MessageORM.deleted_at.is_(None))
+            .order_by(MessageORM.id.desc())
+            .limit(count)
+        ).scalars().all()
+    engine.dispose()
+
+    return list(texts)
+
+
+def length_distribution(texts: list[str]) -> dict:
+    lengths = [len(text.encode("utf-8")) for text in texts]
+
+    return {
+        "p50_bytes": percentile(lengths, 0.50),
+        "p90_bytes": percentile(lengths, 0.90),
+        "p99_bytes": percentile(lengths, 0.99),
+        "max_bytes": max(lengths),
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+def measure_codec(codec, texts: list[str], repeat: int) -> dict:
+    encoded = [codec.encode(text) for text in texts]
+    assert [codec.decode(value) for value in encoded] == texts
+
+    raw_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    stored_bytes = sum(len(value) for value in encoded)
+
+    encode_seconds = best_of(repeat, lambda: [codec.encode(text) for text in texts])
+    decode_seconds = best_of(
+        repeat, lambda: [codec.decode(value) for value in encoded]
+    )
+
+    return {
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(raw_bytes / stored_bytes, 3),
+        "compressed_share": round(
+            sum(1 for value in encoded if value[0] != 0) / len(encoded), 3
+        ),
+        "encode_us_per_message": round(encode_seconds / len(texts) * 1e6, 3),
+        "decode_us_per_message": round(decode_seconds / len(texts) * 1e6, 3),
+    }
+
+
+def run(texts: list[str], level: int, min_bytes: int, repeat: int) -> dict:
+    from src.data.message_codec import (
+        MessageCodec,
+        dictionary_path,
+        train_dictionary,
+    )
+
+    middle = len(texts) // 2
+    training, evaluation = texts[:middle], texts[middle:]
+
+    dictionary_dir = tempfile.mkdtemp()
+    started = time.perf_counter()
+    dictionary = train_dictionary([text.encode("utf-8") for text in training])
+    training_seconds = time.perf_counter() - started
+
+    with open(dictionary_path(dictionary_dir, 1), "wb") as file:
+        file.write(dictionary)
+
+    codecs = {
+        "plain": MessageCodec("none", level, min_bytes, None, dictionary_dir),
+        "zstd": MessageCodec("zstd", level, min_bytes, None, dictionary_dir),
+        "zstd_dictionary": MessageCodec("zstd", level, min_bytes, 1, dictionary_dir),
+    }
+
+    return {
+        "dictionary": {
+            "bytes": len(dictionary),
+            "training_messages": len(training),
+            "training_seconds": round(training_seconds, 3),
+        },
+        "codecs": {
+            name: measure_codec(codec, evaluation, repeat)
+            for name, codec in codecs.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Message body codec benchmark")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--min-bytes", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--database-url", help="take the corpus from this database instead"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        # Настройки должны попасть в окружение до импорта src.config
+        os.environ["DATABASE_URL"] = args.database_url
+        texts = database_corpus(args.messages)
+    else:
+        texts = generated_corpus(args.messages, args.seed)
+
+    report = {
+        "benchmark": "message_compression",
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "corpus": "database" if args.database_url else "generated",
+        "parameters": {
+            "messages": len(texts),
+            "level": args.level,
+            "min_bytes": args.min_bytes,
+        },
+        "lengths": length_distribution(texts),
+        **run(texts, args.level, args.min_bytes, args.repeat),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
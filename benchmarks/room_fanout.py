@@ -0,0 +1,80 @@
+# Замер задержки рассылки сообщения в групповой чат с большим числом участников.
+# БД не используется: состав чата берется из кэша, сокеты заменены заглушками.
+#
+#   python -m benchmarks.room_fanout --members 1000 --online 0.5 --iterations 500
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+
+from src.models.schemas import MessageResponseDTO
+from src.services.connections import ConnectionRegistry
+import src.services.rooms as rooms_service
+
+from benchmarks.stats import percentile
+
+
+# Заглушка WebSocket: только принимает текст, как это делает буфер настоящего сокета
+class FakeWebSocket:
+    def __init__(self):
+        self.received = 0
+
+    async def send_text(self, text: str) -> None:
+        self.received += 1
+
+
+async def run(members_count: int, online_share: float, iterations: int) -> dict:
+    registry = ConnectionRegistry()
+    rooms_service.connection_registry = registry
+
+    room_id = 1
+    online_count = int(members_count * online_share)
+    members = {
+        user_id: f"https://t.me/user{user_id}" for user_id in range(1, members_count + 1)
+    }
+    rooms_service.room_membership.store(room_id, members)
+
+    for user_id in range(1, online_count + 1):
+        registry.connect(user_id, FakeWebSocket())
+
+    message = MessageResponseDTO(
+        id=1,
+        sender_id=1,
+        room_id=room_id,
+        text="Hello, everyone! " * 4,
+        timestamp=datetime.now(),
+    )
+
+    timings = []
+
+    for _ in range(iterations):
+        started = time.perf_counter()
+        members = await rooms_service.get_room_members(room_id, db=None)
+        await rooms_service.fan_out_room_message(message, "user1", members)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "benchmark": "room_fanout",
+        "members": members_count,
+        "online": online_count,
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 0.50), 4),
+        "p95_ms": round(percentile(timings, 0.95), 4),
+        "p99_ms": round(percentile(timings, 0.99), 4),
+        "mean_ms": round(statistics.mean(timings), 4),
+        "per_member_us": round(statistics.mean(timings) * 1000 / members_count, 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Room fan-out latency benchmark")
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--online", type=float, default=0.5)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.members, args.online, args.iterations))
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,215 @@
+# Замер времени запуска: импорт src.main в новом процессе (по -X importtime)
+# и время до первого ответа сервера - uvicorn с одним процессом против запуска
+# с предзагрузкой (python -m src.server). Заодно проверяется, что при импорте
+# не загружаются модули, которые приложение откладывает до первого
+# использования или до lifespan (драйверы БД, passlib, python-jose и т.п.).
+#
+# С --budget-ms код возврата 1, если импорт дольше бюджета или загрузил
+# отложенный модуль. Отложенные модули проверяет и тест tests/test_startup.py.
+#
+#   python -m benchmarks.startup_time --repeat 5 --budget-ms 1500 --output startup.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmarks.chat_load import free_port, git_revision
+
+
+# Модули, которые не должны загружаться при импорте src.main
+# (тот же список в tests/test_startup.py)
+DEFERRED_MODULES = (
+    "jose",
+    "passlib",
+    "bcrypt",
+    "asyncpg",
+    "aiosqlite",
+    "psycopg2",
+    "redis",
+    "celery",
+    "requests",
+    "PIL",
+    "zstandard",
+)
+
+TOP_MODULES = 15
+
+
+def parse_importtime(output: str) -> list[dict]:
+    modules = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+
+    return modules
+
+
+def import_once(env: dict) -> list[dict]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_imports(env: dict, repeat: int) -> dict:
+    runs = [import_once(env) for _ in range(repeat)]
+
+    def total(modules: list[dict]) -> float:
+        return next(m["cumulative_ms"] for m in modules if m["module"] == "src.main")
+
+    best = min(runs, key=total)
+    loaded = {module["module"].split(".")[0] for module in best}
+
+    return {
+        "src_main_ms": [round(total(modules), 1) for modules in runs],
+        "best_ms": round(total(best), 1),
+        "modules_loaded": len(best),
+        "top_cumulative": [
+            {"module": m["module"], "ms": round(m["cumulative_ms"], 1)}
+            for m in sorted(best, key=lambda m: -m["cumulative_ms"])
+            if m["depth"] == 0 or m["module"].startswith("src.")
+        ][:TOP_MODULES],
+        "top_self": [
+            {"module": m["module"], "ms": round(m["self_ms"], 1)}
+            for m in sorted(best, key=lambda m: -m["self_ms"])[:TOP_MODULES]
+        ],
+        "deferred_modules_loaded": sorted(
+            name for name in DEFERRED_MODULES if name in loaded
+        ),
+    }
+
+
+# Время от запуска процесса до первого успешного ответа
+def time_to_ready(command: list[str], env: dict, port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env)
+
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as r:
+                    if r.status == 200:
+                        return round((time.perf_counter() - started) * 1000, 1)
+            except (urllib.error.URLError, ConnectionError):
+                pass
+
+            if process.poll() is not None:
+                raise RuntimeError(f"{command} exited with {process.returncode}")
+            time.sleep(0.02)
+
+        raise RuntimeError(f"{command} did not start in time")
+
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure_servers(env: dict, workers: int, timeout: float) -> dict:
+    def command(*arguments: str) -> tuple[list[str], int]:
+        port = free_port()
+        return [sys.executable, "-m", *arguments, "--port", str(port)], port
+
+    uvicorn_command, uvicorn_port = command(
+        "uvicorn", "src.main:app", "--host", "127.0.0.1", "--log-level", "warning"
+    )
+    # uvicorn --workers запускает воркеры заново (spawn), и каждый импортирует
+    # приложение сам; src.server порождает их из уже загруженного процесса
+    spawn_command, spawn_port = command(
+        "uvicorn", "src.main:app", "--host", "127.0.0.1", "--log-level", "warning",
+        "--workers", str(workers),
+    )
+    preload_command, preload_port = command(
+        "src.server", "--host", "127.0.0.1", "--workers", str(workers)
+    )
+
+    return {
+        "uvicorn_ms": time_to_ready(uvicorn_command, env, uvicorn_port, timeout),
+        f"uvicorn_{workers}_workers_ms": time_to_ready(
+            spawn_command, env, spawn_port, timeout
+        ),
+        f"preload_{workers}_workers_ms": time_to_ready(
+            preload_command, env, preload_port, timeout
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--budget-ms", type=float, help="fail if importing src.main takes longer"
+    )
+    parser.add_argument("--skip-servers", action="store_true")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), "startup_time.db")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{path}",
+        ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+        OUTBOX_RELAY_ENABLED="false",
+        LOG_LEVEL="WARNING",
+    )
+
+    report = {
+        "benchmark": "startup_time",
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "imports": measure_imports(env, args.repeat),
+    }
+    if not args.skip_servers:
+        report["time_to_ready"] = measure_servers(env, args.workers, args.timeout)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    print(output)
+
+    failures = []
+    if args.budget_ms is not None and report["imports"]["best_ms"] > args.budget_ms:
+        failures.append(
+            f"importing src.main took {report['imports']['best_ms']} ms "
+            f"(budget {args.budget_ms} ms)"
+        )
+    if report["imports"]["deferred_modules_loaded"]:
+        failures.append(
+            "deferred modules loaded at import: "
+            + ", ".join(report["imports"]["deferred_modules_loaded"])
+        )
+
+    # Без бюджета скрипт только печатает отчет
+    if failures and args.budget_ms is not None:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[index]
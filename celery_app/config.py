@@ -1,9 +1,12 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class CeleryApplicationSettings(BaseSettings):
     TELEGRAM_BOT_TOKEN: str
     CELERY_BROKER_URL: str
+    # По умолчанию результаты хранятся там же, где очередь
+    CELERY_RESULT_BACKEND: Optional[str] = None
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,6 +1,7 @@
 import requests
 
 from celery import Celery
+from celery.schedules import crontab
 from celery_app.config import celery_app_settings
 
 
@@ -9,11 +10,26 @@ TELEGRAM_BOT_TOKEN = celery_app_settings.TELEGRAM_BOT_TOKEN
 celery_app = Celery(
     "tasks",
     broker=celery_app_settings.CELERY_BROKER_URL,
-    backend=celery_app_settings.CELERY_BROKER_URL,
+    backend=celery_app_settings.CELERY_RESULT_BACKEND
+    or celery_app_settings.CELERY_BROKER_URL,
 )
 
-
-@celery_app.task
+# Периодические задачи (выполняются воркером, запущенным с флагом -B)
+celery_app.conf.beat_schedule = {
+    "apply-message-retention": {
+        "task": "celery_app.tasks.apply_message_retention",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    # Частый запуск держит число истекших, но еще не удаленных строк небольшим
+    "expire-messages": {
+        "task": "celery_app.tasks.expire_messages",
+        "schedule": 30.0,
+    },
+}
+
+
+# Результат не сохраняется: веб-приложение ставит задачу и не ждет ответа
+@celery_app.task(ignore_result=True)
 def send_telegram_notification(telegram_id: str, sender_name: str, message_text: str):
 
     get_updates_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
@@ -46,3 +62,51 @@ def send_telegram_notification(telegram_id: str, sender_name: str, message_text:
                 print(f"Failed to send Telegram notification: {e}")
 
             break
+
+
+# Обезличивание истории и удаление пользователя (ставится через outbox
+# в одной транзакции с пометкой пользователя удаленным)
+@celery_app.task(ignore_result=True)
+def delete_user_data(user_id: int):
+    from src.data.database import get_engine
+    from src.services.user_anonymisation import run_user_deletion
+
+    return run_user_deletion(get_engine(), user_id)
+
+
+# Миниатюра загруженного изображения (ставится через outbox при загрузке)
+@celery_app.task(ignore_result=True)
+def generate_attachment_thumbnail(attachment_id: int):
+    from src.data.database import get_engine
+    from src.services.thumbnails import generate_thumbnail
+
+    return generate_thumbnail(get_engine(), attachment_id)
+
+
+# Перевод текста сообщений в текущий формат хранения (запускается вручную
+# после включения MESSAGE_COMPRESSION или смены словаря)
+@celery_app.task
+def compress_message_bodies(after_id: int = 0):
+    from src.data.database import get_engine
+    from src.services.message_compression import compress_message_bodies
+
+    return compress_message_bodies(get_engine(), after_id)
+
+
+# Перенос холодных сообщений в архив и создание секций messages наперед
+@celery_app.task
+def apply_message_retention():
+    # Модули основного приложения нужны только этой задаче
+    from src.data.database import get_engine
+    from src.services.retention import apply_retention_policy
+
+    return apply_retention_policy(get_engine())
+
+
+# Истекшие исчезающие сообщения превращаются в "надгробия" пачками
+@celery_app.task
+def expire_messages():
+    from src.data.database import get_engine
+    from src.services.message_sweep import expire_messages
+
+    return expire_messages(get_engine())
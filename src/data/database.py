@@ -1,14 +1,59 @@
 from src.config import app_settings
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 
 
-engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
-async_engine = create_async_engine(app_settings.ASYNC_DATABASE_CONNECTION_URL)
+# Движки создаются не при импорте, а в lifespan приложения (init_engines):
+# импорт не загружает драйверы БД, а при запуске с предзагрузкой (src.server)
+# пулы соединений создаются уже в воркерах, после fork
+engine: Engine | None = None
+async_engine: AsyncEngine | None = None
 
-session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-async_session_factory = async_sessionmaker(
-    bind=async_engine, autocommit=False, autoflush=False
-)
+# Реплики только для чтения (необязательно); список заполняется на месте,
+# так как на него ссылается src.data.routing
+replica_engines: list[AsyncEngine] = []
+
+
+# Фабрики сессий импортируются модулями заранее и получают движок в init_engines
+session_factory = sessionmaker(autocommit=False, autoflush=False)
+async_session_factory = async_sessionmaker(autocommit=False, autoflush=False)
+
+
+def init_engines() -> None:
+    global engine, async_engine
+
+    if engine is not None:
+        return
+
+    engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
+    async_engine = create_async_engine(app_settings.ASYNC_DATABASE_CONNECTION_URL)
+    replica_engines[:] = [
+        create_async_engine(url) for url in app_settings.DB_REPLICA_URLS
+    ]
+
+    session_factory.configure(bind=engine)
+    async_session_factory.configure(bind=async_engine)
+
+
+async def dispose_engines() -> None:
+    global engine, async_engine
+
+    if engine is None:
+        return
+
+    for replica in replica_engines:
+        await replica.dispose()
+    await async_engine.dispose()
+    engine.dispose()
+
+    engine = async_engine = None
+    replica_engines.clear()
+
+
+# Синхронный движок для фоновых задач и скриптов, которые работают без lifespan
+def get_engine() -> Engine:
+    init_engines()
+    return engine
@@ -0,0 +1,218 @@
+# Формат хранения текста сообщений. Первый байт значения - версия формата,
+# поэтому строки, записанные с любыми настройками, читаются всегда:
+#
+#   0x00 + UTF-8               - без сжатия (короткие тексты и MESSAGE_COMPRESSION=none)
+#   0x01 + кадр zstd           - zstd без словаря
+#   0x02 + id словаря + кадр   - zstd с общим словарем, обученным на репликах чата
+#
+# Короткие реплики zstd без словаря почти не сжимает: заголовок кадра съедает
+# выигрыш. Словарь хранит частые фрагменты переписки и заменяет их ссылками.
+# Обучение словаря по последним сообщениям из БД:
+#
+#   python -m src.data.message_codec train --id 1 --samples 100000
+
+import os
+import logging
+import argparse
+import threading
+from functools import lru_cache
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+PLAIN = 0
+ZSTD = 1
+ZSTD_DICTIONARY = 2
+
+DICTIONARY_SIZE = 64 * 1024
+
+
+def dictionary_path(directory: str, dictionary_id: int) -> str:
+    return os.path.join(directory, f"{dictionary_id}.zdict")
+
+
+def _zstd():
+    import zstandard
+
+    return zstandard
+
+
+class MessageCodec:
+    def __init__(
+        self,
+        algorithm: str,
+        level: int,
+        min_bytes: int,
+        dictionary_id: int | None,
+        dictionary_dir: str,
+    ):
+        if algorithm not in ("none", "zstd"):
+            raise ValueError(f"Unknown message compression: {algorithm}")
+
+        if dictionary_id is not None and not 0 < dictionary_id < 256:
+            raise ValueError("Dictionary id must be between 1 and 255")
+
+        self.algorithm = algorithm
+        self.level = level
+        self.min_bytes = min_bytes
+        self.dictionary_id = dictionary_id
+        self.dictionary_dir = dictionary_dir
+
+        # Объекты zstandard нельзя использовать из нескольких потоков сразу
+        self._local = threading.local()
+
+        if algorithm == "zstd":
+            try:
+                _zstd()
+            except ImportError:
+                logger.warning(
+                    "zstandard is not installed, messages are stored uncompressed"
+                )
+                self.algorithm = "none"
+
+    @lru_cache
+    def dictionary(self, dictionary_id: int):
+        with open(dictionary_path(self.dictionary_dir, dictionary_id), "rb") as file:
+            return _zstd().ZstdCompressionDict(file.read())
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+
+        if compressor is None:
+            dictionary = None
+            if self.dictionary_id is not None:
+                dictionary = self.dictionary(self.dictionary_id)
+
+            compressor = _zstd().ZstdCompressor(
+                level=self.level,
+                dict_data=dictionary,
+                write_content_size=True,
+                write_checksum=False,
+                write_dict_id=False,
+            )
+            self._local.compressor = compressor
+
+        return compressor
+
+    def _decompressor(self, dictionary_id: int | None):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            dictionary = None
+            if dictionary_id is not None:
+                dictionary = self.dictionary(dictionary_id)
+
+            decompressor = _zstd().ZstdDecompressor(dict_data=dictionary)
+            decompressors[dictionary_id] = decompressor
+
+        return decompressor
+
+    def encode(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+
+        if self.algorithm == "none" or len(data) < self.min_bytes:
+            return bytes((PLAIN,)) + data
+
+        frame = self._compressor().compress(data)
+
+        if self.dictionary_id is None:
+            header = bytes((ZSTD,))
+        else:
+            header = bytes((ZSTD_DICTIONARY, self.dictionary_id))
+
+        # Несжимаемый текст выгоднее хранить как есть
+        if len(header) + len(frame) >= 1 + len(data):
+            return bytes((PLAIN,)) + data
+
+        return header + frame
+
+    def decode(self, value: bytes | str) -> str:
+        # Строки, записанные до появления формата (SQLite хранит их как TEXT)
+        if isinstance(value, str):
+            return value
+
+        value = bytes(value)
+        version = value[0] if value else PLAIN
+
+        if version == PLAIN:
+            return value[1:].decode("utf-8")
+
+        if version == ZSTD:
+            return self._decompressor(None).decompress(value[1:]).decode("utf-8")
+
+        if version == ZSTD_DICTIONARY:
+            decompressor = self._decompressor(value[1])
+            return decompressor.decompress(value[2:]).decode("utf-8")
+
+        raise ValueError(f"Unknown message body format: {version}")
+
+    # Значение в формате текущих настроек или None, если оно уже такое
+    def recode(self, value: bytes | str) -> bytes | None:
+        encoded = self.encode(self.decode(value))
+
+        if isinstance(value, str) or encoded != bytes(value):
+            return encoded
+
+        return None
+
+
+message_codec = MessageCodec(
+    algorithm=app_settings.MESSAGE_COMPRESSION,
+    level=app_settings.MESSAGE_COMPRESSION_LEVEL,
+    min_bytes=app_settings.MESSAGE_COMPRESSION_MIN_BYTES,
+    dictionary_id=app_settings.MESSAGE_COMPRESSION_DICTIONARY_ID,
+    dictionary_dir=app_settings.MESSAGE_COMPRESSION_DICTIONARY_DIR,
+)
+
+
+def train_dictionary(samples: list[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    return _zstd().train_dictionary(size, samples).as_bytes()
+
+
+# Выборка последних сообщений из БД и запись словаря в каталог словарей.
+# Словарь должен появиться у всех процессов до того, как его id будет
+# указан в MESSAGE_COMPRESSION_DICTIONARY_ID
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Message body dictionary")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--id", type=int, required=True)
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.future import select
+
+    from src.models.message import MessageORM
+
+    path = dictionary_path(app_settings.MESSAGE_COMPRESSION_DICTIONARY_DIR, args.id)
+    if os.path.exists(path):
+        parser.error(f"{path} exists: rows written with it must stay readable")
+
+    engine = create_engine(app_settings.DATABASE_CONNECTION_URL)
+    with engine.connect() as connection:
+        texts = connection.execute(
+            select(MessageORM.text)
+            .where(MessageORM.deleted_at.is_(None))
+            .order_by(MessageORM.id.desc())
+            .limit(args.samples)
+        ).scalars()
+        samples = [text.encode("utf-8") for text in texts]
+    engine.dispose()
+
+    dictionary = train_dictionary(samples, args.size)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(dictionary)
+
+    print(f"{path}: {len(dictionary)} bytes from {len(samples)} messages")
+
+
+if __name__ == "__main__":
+    main()
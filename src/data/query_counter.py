@@ -0,0 +1,125 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Счетчики, активные в текущем контексте (HTTP-запрос, задача asyncio или тест)
+_active_counters: ContextVar[tuple] = ContextVar("active_query_counters", default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# Список SQL-запросов, выполненных внутри count_queries или одного HTTP-запроса
+class QueryCounter:
+    def __init__(self, budget: int | None = None, label: str = ""):
+        self.budget = budget
+        self.label = label
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    # Одинаковые запросы, выполненные несколько раз (типичный признак N+1)
+    def duplicates(self) -> dict[str, int]:
+        return {
+            statement: count
+            for statement, count in Counter(self.statements).items()
+            if count > 1
+        }
+
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def report(self) -> str:
+        lines = [f"{self.label or 'block'}: {self.count} queries (budget {self.budget})"]
+        for statement, count in self.duplicates().items():
+            lines.append(f"  {count}x {' '.join(statement.split())}")
+
+        return "\n".join(lines)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+
+# Подсчет запросов в блоке кода; при превышении бюджета выбрасывает
+# QueryBudgetExceeded (для тестов) или пишет предупреждение в лог
+@contextmanager
+def count_queries(budget: int | None = None, label: str = "", strict: bool = True):
+    counter = QueryCounter(budget, label)
+    token = _active_counters.set(_active_counters.get() + (counter,))
+
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+    if counter.exceeded():
+        if strict:
+            raise QueryBudgetExceeded(counter.report())
+        logger.warning(counter.report())
+
+
+# Объявление бюджета запросов для обработчика маршрута:
+#
+#   @router.get("/")
+#   @query_budget(1)
+#   async def handler(...): ...
+def query_budget(budget: int):
+    def decorator(endpoint):
+        endpoint.query_budget = budget
+        return endpoint
+
+    return decorator
+
+
+# Middleware для разработки (QUERY_COUNTER_ENABLED): считает запросы каждого
+# HTTP-запроса, отдает их число в заголовке X-Query-Count, сообщает о повторах
+# и о превышении бюджета, объявленного через query_budget
+class QueryCounterMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as counter:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-Query-Count", str(counter.count))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        route = scope.get("route")
+        counter.budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        counter.label = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+        if counter.exceeded():
+            if app_settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(counter.report())
+            logger.warning(counter.report())
+
+        elif counter.duplicates():
+            logger.warning(counter.report())
+
+        else:
+            logger.debug(counter.report())
@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+import itertools
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.config import app_settings
+from src.data.database import replica_engines
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LAG_QUERY = text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+)
+
+
+# Выбор реплики для чтения: учитывает недавние записи пользователя
+# (read-your-writes) и исключает отстающие или недоступные реплики
+class ReplicaRouter:
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        sticky_seconds: float,
+        max_lag_seconds: float,
+        retry_seconds: float,
+    ):
+        self.engines = engines
+        self.sticky_seconds = sticky_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.retry_seconds = retry_seconds
+
+        self._last_write: dict[int, float] = {}
+        self._unhealthy_until: dict[AsyncEngine, float] = {}
+        # Список движков заполняется при запуске приложения (init_engines)
+        self._round_robin = None
+
+    # Запоминаем запись пользователя: его чтения временно идут на основной сервер
+    def mark_write(self, *user_ids: int) -> None:
+        if not self.engines:
+            return
+
+        now = time.monotonic()
+        for user_id in user_ids:
+            if user_id is not None:
+                self._last_write[user_id] = now
+
+    def mark_failed(self, engine: AsyncEngine) -> None:
+        self._unhealthy_until[engine] = time.monotonic() + self.retry_seconds
+
+    def choose(self, *user_ids: int) -> AsyncEngine | None:
+        if not self.engines:
+            return None
+
+        now = time.monotonic()
+
+        for user_id in user_ids:
+            last_write = self._last_write.get(user_id)
+            if last_write is not None:
+                if now - last_write < self.sticky_seconds:
+                    return None
+                del self._last_write[user_id]
+
+        if self._round_robin is None:
+            self._round_robin = itertools.cycle(self.engines)
+
+        for _ in range(len(self.engines)):
+            engine = next(self._round_robin)
+            if self._unhealthy_until.get(engine, 0) <= now:
+                return engine
+
+        return None
+
+    # Периодическая проверка задержки репликации
+    async def check_replicas(self) -> None:
+        for engine in self.engines:
+            try:
+                async with engine.connect() as connection:
+                    if engine.dialect.name == "postgresql":
+                        lag = float((await connection.execute(REPLICA_LAG_QUERY)).scalar())
+                    else:
+                        await connection.execute(text("SELECT 1"))
+                        lag = 0.0
+
+            except Exception as e:
+                logger.warning("Replica %s is unavailable: %s", engine.url, e)
+                self.mark_failed(engine)
+                continue
+
+            if lag > self.max_lag_seconds:
+                logger.warning("Replica %s lags by %.1f s", engine.url, lag)
+                self.mark_failed(engine)
+            else:
+                self._unhealthy_until.pop(engine, None)
+
+    async def run_health_checks(self, interval: float) -> None:
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(interval)
+
+
+replica_router = ReplicaRouter(
+    replica_engines,
+    sticky_seconds=app_settings.DB_REPLICA_STICKY_SECONDS,
+    max_lag_seconds=app_settings.DB_REPLICA_MAX_LAG_SECONDS,
+    retry_seconds=app_settings.DB_REPLICA_RETRY_SECONDS,
+)
+
+
+# Выполнение запроса только на чтение на реплике. Запрос идет через отдельное
+# соединение, вне транзакции сессии: ошибка реплики не затрагивает работу,
+# которую вызывающий код уже сделал в сессии, а запрос повторяется в ней
+# на основном сервере
+async def replica_execute(db: AsyncSession, statement, *user_ids: int):
+    replica = replica_router.choose(*user_ids)
+
+    if replica is None:
+        return await db.execute(statement)
+
+    try:
+        async with replica.connect() as connection:
+            return await connection.execute(statement)
+
+    except (DBAPIError, OSError) as e:
+        logger.warning("Read on replica %s failed, using primary: %s", replica.url, e)
+        replica_router.mark_failed(replica)
+
+    return await db.execute(statement)
@@ -1,34 +1,130 @@
-from icecream import ic
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, status
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.models.base import Base
-from src.data.database import engine
+from src.data.database import (
+    init_engines,
+    dispose_engines,
+    get_engine,
+    async_session_factory,
+)
+from src.data.routing import replica_router
+from src.data.query_counter import QueryCounterMiddleware
+from src.config import app_settings
+from src.services.instrumentation import MetricsMiddleware, monitor_event_loop_lag
+from src.services.loop_watchdog import loop_watchdog
+from src.services.notifications import task_buffer
+from src.services.outbox import outbox_relay
+from src.services.connections import connection_registry
+from src.services.message_expiry import expiry_wheel
+from src.services.broadcast import broadcast
+from src.services.presence import refresh_presence
+from src.services.user_deletion import load_revoked_users
 
 from src.web.api import (
     auth as api_auth,
     users as api_users,
     messages as api_messages,
+    rooms as api_rooms,
+    sync as api_sync,
+    attachments as api_attachments,
+    metrics as api_metrics,
+    diagnostics as api_diagnostics,
 )
 from src.web.views import (
     auth as views_auth,
     messages as views_chats,
     messages_ws as views_chats_ws,
+    messages_stream as views_chats_stream,
+    rooms_ws as views_rooms_ws,
 )
+from src.web.views.templating import precompile_templates
+from src.web.assets import CachedStaticFiles
+
+
+logging.basicConfig(
+    level=app_settings.LOG_LEVEL,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    ic("Starting up the application...")
-    Base.metadata.create_all(bind=engine)
+    logger.info("Starting up the application...")
+    init_engines()
+
+    # Синхронный драйвер выполняется в отдельном потоке, не блокируя цикл событий.
+    # При запуске через src.server таблицы создает главный процесс до fork
+    # и отмечает это в app.state.tables_created
+    if app_settings.DB_CREATE_TABLES_ON_STARTUP and not getattr(
+        app.state, "tables_created", False
+    ):
+        await asyncio.to_thread(Base.metadata.create_all, bind=get_engine())
+    await asyncio.to_thread(precompile_templates)
+
+    # Токены пользователей, удаленных до запуска воркера, отклоняются
+    # (об удалениях после запуска воркер узнает через broadcast)
+    try:
+        async with async_session_factory() as db:
+            await load_revoked_users(db)
+    except Exception as e:
+        logger.warning("Could not load deleted users: %s", e)
+
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    task_sender = asyncio.create_task(task_buffer.run())
+    expiry_timers = asyncio.create_task(expiry_wheel.run())
+    broadcast_listener = asyncio.create_task(broadcast.run())
+    presence_heartbeat = asyncio.create_task(refresh_presence())
+
+    outbox_relay_task = None
+    if app_settings.OUTBOX_RELAY_ENABLED:
+        outbox_relay_task = asyncio.create_task(outbox_relay.run())
+
+    if app_settings.LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+
+    replica_checks = None
+    if replica_router.engines:
+        replica_checks = asyncio.create_task(
+            replica_router.run_health_checks(
+                app_settings.DB_REPLICA_CHECK_INTERVAL_SECONDS
+            )
+        )
 
     yield
 
-    ic("Shutting down the application...")
+    logger.info("Shutting down the application...")
+
+    # Клиенты, которые еще подключены, получают кадр reconnect до закрытия
+    # соединений (при запуске через src.server это уже сделано раньше, см. DrainingServer)
+    await connection_registry.drain()
+
+    loop_lag_monitor.cancel()
+    loop_watchdog.stop()
+    expiry_timers.cancel()
+    broadcast_listener.cancel()
+    presence_heartbeat.cancel()
+
+    if outbox_relay_task is not None:
+        outbox_relay_task.cancel()
+
+    # Задачи, оставшиеся в буфере, отправляются до остановки воркера
+    task_sender.cancel()
+    try:
+        await task_buffer.close()
+    except Exception as e:
+        logger.warning("Could not flush %d pending tasks: %s", len(task_buffer), e)
+    if replica_checks is not None:
+        replica_checks.cancel()
+
+    await dispose_engines()
+
     # Base.metadata.drop_all(bind=engine)
 
 
@@ -41,20 +137,33 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+if app_settings.QUERY_COUNTER_ENABLED:
+    app.add_middleware(QueryCounterMiddleware)
+
+# Метрики Prometheus
+app.include_router(api_metrics.router)
+app.include_router(api_diagnostics.router)
 
 # Маршрутизаторы для API
 app.include_router(api_auth.router)
 app.include_router(api_users.router)
 app.include_router(api_messages.router)
+app.include_router(api_rooms.router)
+app.include_router(api_sync.router)
+app.include_router(api_attachments.router)
 
 # Маршрутизаторы для веб-страниц
 app.include_router(views_auth.router)
 app.include_router(views_chats.router)
 app.include_router(views_chats_ws.router)
+app.include_router(views_chats_stream.router)
+app.include_router(views_rooms_ws.router)
 
 app.mount(
     "/static",
-    StaticFiles(directory="src/frontend/static"),
+    CachedStaticFiles(directory="src/frontend/static"),
     name="static",
 )
 
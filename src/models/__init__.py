@@ -1,2 +1,6 @@
 from .user import UserORM
-from .message import MessageORM
+from .message import MessageORM, MessageArchiveORM, MessageClientIdORM
+from .room import RoomORM, RoomMemberORM
+from .outbox import OutboxORM
+from .user_deletion import UserDeletionORM
+from .attachment import AttachmentORM
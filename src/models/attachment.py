@@ -0,0 +1,24 @@
+from .base import Base
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+
+
+# Вложение сообщения. Содержимое лежит в хранилище файлов под своим sha256,
+# поэтому одинаковые файлы хранятся один раз. До отправки сообщения вложение
+# принадлежит только загрузившему его пользователю (message_id пустой)
+class AttachmentORM(Base):
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True)
+    uploader_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    # Без внешнего ключа: messages секционирована и ее первичный ключ (id, timestamp)
+    message_id = Column(Integer, nullable=True, index=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    # pending | ready | none (не изображение) | failed
+    thumbnail_status = Column(String, nullable=False, default="none")
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
@@ -1,5 +1,52 @@
+from sqlalchemy import Integer, LargeBinary
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.expression import FunctionElement
+
+from src.data.message_codec import message_codec
 
 
 class Base(DeclarativeBase):
     pass
+
+
+# Следующий номер изменения строки (столбец change_seq): по нему клиенты и кэши
+# узнают, что изменилось с прошлого раза. Подклассы задают последовательность
+# и таблицу
+class next_change_seq(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+
+    sequence = None
+    table = None
+
+
+@compiles(next_change_seq, "postgresql")
+def _next_change_seq_postgresql(element, compiler, **kw):
+    return compiler.process(element.sequence.next_value(), **kw)
+
+
+# В SQLite последовательностей нет, но запись в базу и так идет по одной
+@compiles(next_change_seq)
+def _next_change_seq_default(element, compiler, **kw):
+    return f"(SELECT coalesce(max(change_seq), 0) + 1 FROM {element.table})"
+
+
+# Текст, который хранится в формате message_codec (со сжатием или без);
+# запросы и DTO получают обычную строку
+class CompressedText(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+
+        return message_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        return message_codec.decode(value)
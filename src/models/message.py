@@ -1,23 +1,121 @@
-from .base import Base
+from .base import Base, CompressedText, next_change_seq
 
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import (
+    Column,
+    Index,
+    Integer,
+    String,
+    ForeignKey,
+    DateTime,
+    Sequence,
+    text as sql_text,
+)
 from sqlalchemy.orm import relationship
 
 
+# Общий счетчик изменений сообщений: номер выдается при создании, изменении
+# и удалении сообщения, и по нему клиенты забирают изменения с прошлой синхронизации
+message_change_seq = Sequence("message_change_seq", metadata=Base.metadata)
+
+
+class next_message_change_seq(next_change_seq):
+    inherit_cache = True
+
+    sequence = message_change_seq
+    table = "messages"
+
+
 class MessageORM(Base):
     __tablename__ = "messages"
+    # Выборка изменений по каждой стороне диалога и по групповому чату
+    __table_args__ = (
+        Index("ix_messages_sender_id_change_seq", "sender_id", "change_seq"),
+        Index("ix_messages_recipient_id_change_seq", "recipient_id", "change_seq"),
+        Index("ix_messages_room_id_change_seq", "room_id", "change_seq"),
+        # Отметка переписки двух пользователей (ключ кэша отрисованной истории)
+        Index(
+            "ix_messages_sender_id_recipient_id_change_seq",
+            "sender_id",
+            "recipient_id",
+            "change_seq",
+        ),
+        # Частичный индекс: в нем только исчезающие сообщения, которые еще не
+        # стали "надгробиями"; по нему их находит задача expire_messages
+        Index(
+            "ix_messages_expires_at_pending",
+            "expires_at",
+            postgresql_where=sql_text("expires_at IS NOT NULL AND deleted_at IS NULL"),
+            sqlite_where=sql_text("expires_at IS NOT NULL AND deleted_at IS NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    sender_id = Column(Integer, ForeignKey("users.id"))
-    recipient_id = Column(Integer, ForeignKey("users.id"))
-    text = Column(String, nullable=False)
+    # После удаления пользователя его сообщения остаются у собеседников без автора
+    sender_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    recipient_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    # Сообщение в групповой чат хранится один раз, recipient_id при этом пустой
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
+    text = Column(CompressedText, nullable=False)
     timestamp = Column(DateTime, default=datetime.now)
 
+    # Версия увеличивается при каждом изменении; удаленное сообщение остается
+    # в таблице как "надгробие" (deleted_at), чтобы клиенты и кэши могли синхронизироваться
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    edited_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)
+    # Исчезающее сообщение: после этого момента не читается, а затем
+    # становится "надгробием" (см. src.services.message_expiry)
+    expires_at = Column(DateTime, nullable=True)
+    change_seq = Column(
+        Integer,
+        nullable=True,
+        default=next_message_change_seq(),
+        onupdate=next_message_change_seq(),
+    )
+
     sender = relationship(
         "UserORM", foreign_keys=[sender_id], back_populates="sent_messages"
     )
     recipient = relationship(
         "UserORM", foreign_keys=[recipient_id], back_populates="received_messages"
     )
+
+
+# Архив "холодных" сообщений, перенесенных из messages политикой хранения.
+# Внешних ключей нет: архив не должен мешать удалению пользователей и чатов
+class MessageArchiveORM(Base):
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index(
+            "ix_messages_archive_expires_at_pending",
+            "expires_at",
+            postgresql_where=sql_text("expires_at IS NOT NULL AND deleted_at IS NULL"),
+            sqlite_where=sql_text("expires_at IS NOT NULL AND deleted_at IS NULL"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(Integer, index=True)
+    recipient_id = Column(Integer, index=True)
+    room_id = Column(Integer, index=True)
+    text = Column(CompressedText, nullable=False)
+    timestamp = Column(DateTime, primary_key=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    edited_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    change_seq = Column(Integer, nullable=True)
+
+
+# Идентификаторы сообщений, которые клиент генерирует сам для повторных отправок.
+# Уникальность по отправителю обеспечивается отдельной таблицей: в секционированной
+# messages уникальный индекс обязан включать timestamp и не спасает от дублей
+class MessageClientIdORM(Base):
+    __tablename__ = "message_client_ids"
+
+    sender_id = Column(Integer, primary_key=True)
+    client_msg_id = Column(String(64), primary_key=True)
+    message_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now, index=True)
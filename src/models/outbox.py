@@ -0,0 +1,17 @@
+from .base import Base
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+
+
+# Фоновые задачи, записанные в одной транзакции с сообщением (паттерн outbox).
+# Строка удаляется, когда ретранслятор передал задачу брокеру
+class OutboxORM(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    task = Column(String, nullable=False)
+    args = Column(JSON, nullable=False)
+    message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
@@ -0,0 +1,35 @@
+from .base import Base
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.orm import relationship
+
+
+class RoomORM(Base):
+    __tablename__ = "rooms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, default=datetime.now)
+    # Срок жизни новых сообщений чата в секундах (None - сообщения не исчезают)
+    message_ttl_seconds = Column(Integer, nullable=True)
+
+    members = relationship(
+        "RoomMemberORM", back_populates="room", passive_deletes=True
+    )
+
+
+class RoomMemberORM(Base):
+    __tablename__ = "room_members"
+
+    room_id = Column(
+        Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    joined_at = Column(DateTime, default=datetime.now)
+
+    room = relationship("RoomORM", back_populates="members")
@@ -4,7 +4,9 @@ from datetime import datetime
 
 import enum
 from typing import Optional
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
+
+from src.config import app_settings
 
 
 class RoleEnumDTO(str, enum.Enum):
@@ -44,10 +46,43 @@ class UserResponseDTO(BaseModel):
     class Config:
         model_config = {"from_attributes": True}
 
+    # Сборка из строки запроса (id, username, email, telegram_url, role) без
+    # повторной валидации: данные в БД уже проверены при записи
+    @classmethod
+    def from_row(cls, row) -> "UserResponseDTO":
+        return cls.model_construct(
+            id=row.id,
+            username=row.username,
+            email=row.email,
+            telegram_url=row.telegram_url,
+            role=RoleEnumDTO(row.role.value) if row.role else RoleEnumDTO.user,
+        )
+
+
+# Уникальный для отправителя id, сгенерированный клиентом: по нему повторная
+# отправка того же сообщения не создает дубликат
+CLIENT_MSG_ID_MAX_LENGTH = 64
+
 
 class MessageCreateDTO(BaseModel):
     recipient_id: int
     text: str
+    client_msg_id: Optional[str] = Field(
+        default=None, min_length=1, max_length=CLIENT_MSG_ID_MAX_LENGTH
+    )
+    # Загруженные заранее вложения (POST /api/attachments/)
+    attachment_ids: list[int] = Field(default_factory=list, max_length=10)
+    # Исчезающее сообщение: срок жизни в секундах
+    ttl_seconds: Optional[int] = Field(
+        default=None, ge=1, le=app_settings.MESSAGE_TTL_MAX_SECONDS
+    )
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+
+class MessageUpdateDTO(BaseModel):
+    text: str
 
     class Config:
         model_config = {"from_attributes": True}
@@ -55,15 +90,134 @@ class MessageCreateDTO(BaseModel):
 
 class MessageResponseDTO(BaseModel):
     id: int
-    sender_id: int
-    recipient_id: int
+    # Пустой у сообщений удаленного пользователя
+    sender_id: Optional[int] = None
+    recipient_id: Optional[int] = None
+    room_id: Optional[int] = None
     text: str
     timestamp: datetime
+    version: int = 1
+    edited_at: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+    # Сборка из строки запроса со всеми столбцами сообщения без валидации
+    @classmethod
+    def from_row(cls, row) -> "MessageResponseDTO":
+        return cls.model_construct(**row._asdict())
+
+
+# Сообщение в ответе синхронизации: новое, измененное или удаленное
+# (у удаленного заполнен deleted_at, а текст пустой)
+class MessageSyncDTO(MessageResponseDTO):
+    change_seq: int
+
+
+class SyncResponseDTO(BaseModel):
+    messages: list[MessageSyncDTO]
+    # Передаются в следующий запрос как since и since_id: у нескольких строк
+    # может быть один change_seq, поэтому позиция - пара (change_seq, id)
+    cursor: int
+    cursor_id: int
+    has_more: bool
+
+
+class RoomCreateDTO(BaseModel):
+    name: str
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+
+# Настройки чата, которые меняет его создатель
+class RoomUpdateDTO(BaseModel):
+    # Срок жизни новых сообщений (null - сообщения не исчезают; поле,
+    # которого нет в запросе, не меняется - см. model_fields_set)
+    message_ttl_seconds: Optional[int] = Field(
+        default=None, ge=1, le=app_settings.MESSAGE_TTL_MAX_SECONDS
+    )
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+
+class RoomResponseDTO(BaseModel):
+    id: int
+    name: str
+    owner_id: Optional[int] = None
+    message_ttl_seconds: Optional[int] = None
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+    @classmethod
+    def from_row(cls, row) -> "RoomResponseDTO":
+        return cls.model_construct(
+            id=row.id,
+            name=row.name,
+            owner_id=row.owner_id,
+            message_ttl_seconds=row.message_ttl_seconds,
+        )
+
+
+class RoomMessageCreateDTO(BaseModel):
+    text: str
+    # Не дольше срока жизни сообщений чата, если он задан
+    ttl_seconds: Optional[int] = Field(
+        default=None, ge=1, le=app_settings.MESSAGE_TTL_MAX_SECONDS
+    )
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+
+class RoomMemberAddDTO(BaseModel):
+    user_id: int
 
     class Config:
         model_config = {"from_attributes": True}
 
 
+class UserDeletionDTO(BaseModel):
+    user_id: int
+    status: str
+    messages_anonymised: int
+    requested_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+
+class AttachmentDTO(BaseModel):
+    id: int
+    message_id: Optional[int] = None
+    sha256: str
+    size: int
+    content_type: str
+    filename: str
+    thumbnail_status: str
+    created_at: datetime
+
+    class Config:
+        model_config = {"from_attributes": True}
+
+    @classmethod
+    def from_row(cls, row) -> "AttachmentDTO":
+        return cls.model_construct(**row._asdict())
+
+
 class TokenDTO(BaseModel):
     access_token: str
     token_type: str
+
+
+# Сериализаторы списков для обработчиков, которые отдают JSON напрямую
+# (FastAPI иначе повторно валидирует каждый элемент по response_model)
+user_list_adapter = TypeAdapter(list[UserResponseDTO])
+message_list_adapter = TypeAdapter(list[MessageResponseDTO])
+room_list_adapter = TypeAdapter(list[RoomResponseDTO])
@@ -1,11 +1,22 @@
-from .base import Base
+from .base import Base, next_change_seq
 from .message import MessageORM
 
 import enum
-from sqlalchemy import Column, Integer, String, Enum
+from sqlalchemy import Column, Integer, String, Enum, DateTime, Sequence
 from sqlalchemy.orm import relationship
 
 
+# Номер изменения пользователя: из него строятся ETag списка и карточки пользователя
+user_change_seq = Sequence("user_change_seq", metadata=Base.metadata)
+
+
+class next_user_change_seq(next_change_seq):
+    inherit_cache = True
+
+    sequence = user_change_seq
+    table = "users"
+
+
 class RoleEnumORM(enum.Enum):
     user = "user"
     admin = "admin"
@@ -20,10 +31,28 @@ class UserORM(Base):
     telegram_url = Column(String, nullable=True)
     hashed_password = Column(String)
     role = Column(Enum(RoleEnumORM), default=RoleEnumORM.user)
+    # Момент запроса на удаление: пользователь сразу скрывается, а его сообщения
+    # обезличиваются фоновой задачей, после чего строка удаляется
+    deleted_at = Column(DateTime, nullable=True)
+    change_seq = Column(
+        Integer,
+        nullable=True,
+        index=True,
+        default=next_user_change_seq(),
+        onupdate=next_user_change_seq(),
+    )
 
+    # Ссылки из сообщений обнуляет БД (ON DELETE SET NULL), а не сессия,
+    # которая иначе загрузила бы всю историю пользователя
     sent_messages = relationship(
-        "MessageORM", foreign_keys=[MessageORM.sender_id], back_populates="sender"
+        "MessageORM",
+        foreign_keys=[MessageORM.sender_id],
+        back_populates="sender",
+        passive_deletes=True,
     )
     received_messages = relationship(
-        "MessageORM", foreign_keys=[MessageORM.recipient_id], back_populates="recipient"
+        "MessageORM",
+        foreign_keys=[MessageORM.recipient_id],
+        back_populates="recipient",
+        passive_deletes=True,
     )
@@ -0,0 +1,18 @@
+from .base import Base
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime
+
+
+# Задача удаления пользователя и ее ход. Внешнего ключа нет: строка пользователя
+# удаляется в конце задачи, а запись о ней остается
+class UserDeletionORM(Base):
+    __tablename__ = "user_deletions"
+
+    user_id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, default="pending")
+    messages_anonymised = Column(Integer, nullable=False, default=0)
+    requested_at = Column(DateTime, default=datetime.now, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(String, nullable=True)
@@ -0,0 +1,201 @@
+# Запуск приложения с предзагрузкой. Главный процесс один раз импортирует
+# приложение (и модули, которые оно загружает лениво), создает таблицы,
+# открывает сокет и порождает воркеры через fork. Воркеры делят с ним память
+# модулей (copy-on-write), поэтому каждый следующий воркер - в том числе
+# перезапущенный после падения - готов почти сразу, без повторного импорта.
+# Движки БД, пулы соединений и фоновые задачи создаются в lifespan уже
+# внутри каждого воркера, после fork. Метрики (/metrics) тоже собираются
+# в каждом воркере отдельно и не суммируются между ними.
+#
+#   python -m src.server --workers 4
+
+import gc
+import os
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import importlib
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+# Модули, которые приложение импортирует при первом использовании:
+# в главном процессе они загружаются заранее и достаются воркерам готовыми
+PRELOAD_MODULES = (
+    "jose.jwt",
+    "passlib.context",
+    "passlib.handlers.bcrypt",
+    "bcrypt",
+)
+
+# Пауза перед перезапуском упавшего воркера, чтобы не крутиться в цикле
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def preload():
+    from src.main import app
+    from src.models.base import Base
+    from src.data.database import init_engines, dispose_engines, get_engine
+    from src.web.views.templating import precompile_templates
+    import src.services.auth as auth_service
+
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    auth_service.password_context()
+    precompile_templates()
+
+    # Таблицы создаются один раз; соединения главного процесса закрываются,
+    # чтобы воркеры не унаследовали их через fork. Отметка в состоянии
+    # приложения говорит lifespan воркеров, что создавать их уже не нужно
+    if app_settings.DB_CREATE_TABLES_ON_STARTUP:
+        init_engines()
+        Base.metadata.create_all(bind=get_engine())
+        asyncio.run(dispose_engines())
+        app.state.tables_created = True
+
+    return app
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    return sock
+
+
+# uvicorn при остановке сначала закрывает все соединения (WebSocket - с кодом
+# 1012) и только потом выполняет завершение lifespan. Здесь после закрытия
+# слушающих сокетов подключенные клиенты сначала получают кадр reconnect,
+# а очереди SSE и long-poll дочитываются, и только потом uvicorn закрывает
+# соединения и ждет незавершенные запросы
+def draining_server(config):
+    import uvicorn
+    from src.services.connections import connection_registry
+
+    class DrainingServer(uvicorn.Server):
+        async def shutdown(self, sockets=None) -> None:
+            for server in self.servers:
+                server.close()
+            for sock in sockets or []:
+                sock.close()
+
+            await connection_registry.drain()
+            await super().shutdown(sockets=sockets)
+
+    return DrainingServer(config)
+
+
+def run_worker(server, sock: socket.socket) -> None:
+    # Обработчики главного процесса воркеру не нужны: сигналы обрабатывает uvicorn
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+
+    server.run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, server, sock: socket.socket, workers: int):
+        self.server = server
+        self.sock = sock
+        self.workers = workers
+        self.children: set[int] = set()
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.server, self.sock)
+            except BaseException:
+                logger.exception("Worker %s failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.children.add(pid)
+        logger.info("Started worker %s", pid)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            pid, status = os.wait()
+            self.children.discard(pid)
+
+            if self.stopping:
+                continue
+
+            logger.warning(
+                "Worker %s exited with code %s, restarting",
+                pid,
+                os.waitstatus_to_exitcode(status),
+            )
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            self.spawn()
+
+        logger.info("All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Preforking application server")
+    parser.add_argument("--host", default=app_settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=app_settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=app_settings.SERVER_WORKERS)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    started = time.perf_counter()
+    app = preload()
+
+    config = uvicorn.Config(
+        app,
+        log_level=app_settings.LOG_LEVEL.lower(),
+        timeout_graceful_shutdown=app_settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    )
+    config.load()
+    server = draining_server(config)
+
+    sock = bind_socket(args.host, args.port)
+
+    # Объекты, загруженные до fork, исключаются из сборки мусора: иначе сборщик
+    # в воркерах трогает их заголовки и страницы памяти копируются
+    gc.disable()
+    gc.freeze()
+
+    logger.info(
+        "Preloaded in %.0f ms, listening on %s:%s with %s workers",
+        (time.perf_counter() - started) * 1000,
+        args.host,
+        args.port,
+        args.workers,
+    )
+    Master(server, sock, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
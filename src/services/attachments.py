@@ -0,0 +1,129 @@
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert, update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import app_settings
+from src.models.attachment import AttachmentORM
+from src.models.message import MessageORM
+from src.models.schemas import AttachmentDTO
+
+from src.services.rooms import get_room_members
+from src.services.blob_store import blob_store
+from src.services.outbox import add_outbox_tasks, outbox_relay
+from src.services.thumbnails import THUMBNAIL_CONTENT_TYPES, thumbnail_key
+
+
+GENERATE_THUMBNAIL = "celery_app.tasks.generate_attachment_thumbnail"
+
+
+async def _limited(
+    chunks: AsyncIterator[bytes], max_bytes: int
+) -> AsyncIterator[bytes]:
+    size = 0
+
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                detail=f"Attachment is larger than {max_bytes} bytes",
+            )
+        yield chunk
+
+
+# Сохранение загружаемого файла: тело запроса пишется в хранилище частями,
+# не собираясь в памяти. Миниатюра строится фоновой задачей, записанной
+# в outbox в одной транзакции с вложением (если ее нет от такого же файла)
+async def create_attachment(
+    uploader_id: int,
+    filename: str,
+    content_type: str,
+    chunks: AsyncIterator[bytes],
+    db: AsyncSession,
+) -> AttachmentDTO:
+    sha256, size = await blob_store.save_stream(
+        _limited(chunks, app_settings.ATTACHMENT_MAX_BYTES)
+    )
+
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Attachment is empty",
+        )
+
+    thumbnail_status = "none"
+    if content_type in THUMBNAIL_CONTENT_TYPES:
+        thumbnail_status = (
+            "ready" if blob_store.exists(thumbnail_key(sha256)) else "pending"
+        )
+
+    result = await db.execute(
+        insert(AttachmentORM)
+        .values(
+            uploader_id=uploader_id,
+            sha256=sha256,
+            size=size,
+            content_type=content_type,
+            filename=filename,
+            thumbnail_status=thumbnail_status,
+            created_at=datetime.now(),
+        )
+        .returning(*AttachmentORM.__table__.columns)
+    )
+    row = result.one()
+
+    if thumbnail_status == "pending":
+        await add_outbox_tasks(db, [(GENERATE_THUMBNAIL, (row.id,))])
+    await db.commit()
+
+    if thumbnail_status == "pending":
+        outbox_relay.notify()
+
+    return AttachmentDTO.from_row(row)
+
+
+async def get_attachment(attachment_id: int, db: AsyncSession) -> AttachmentDTO | None:
+    result = await db.execute(
+        select(*AttachmentORM.__table__.columns).where(
+            AttachmentORM.id == attachment_id
+        )
+    )
+    row = result.first()
+
+    if row:
+        return AttachmentDTO.from_row(row)
+
+    return None
+
+
+# Вложение доступно загрузившему его и участникам сообщения, к которому оно
+# прикреплено (для группового чата - его участникам)
+async def can_access_attachment(
+    attachment_id: int, user_id: int, db: AsyncSession
+) -> bool:
+    result = await db.execute(
+        select(
+            AttachmentORM.uploader_id,
+            MessageORM.sender_id,
+            MessageORM.recipient_id,
+            MessageORM.room_id,
+        )
+        .outerjoin(MessageORM, MessageORM.id == AttachmentORM.message_id)
+        .where(AttachmentORM.id == attachment_id)
+    )
+    row = result.first()
+
+    if row is None:
+        return False
+
+    if user_id in (row.uploader_id, row.sender_id, row.recipient_id):
+        return True
+
+    if row.room_id is not None:
+        return user_id in await get_room_members(row.room_id, db)
+
+    return False
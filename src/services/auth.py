@@ -1,5 +1,6 @@
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+import time
+import asyncio
+from functools import cache
 from datetime import datetime, timedelta, timezone
 
 from sqlalchemy.future import select
@@ -10,22 +11,46 @@ from src.models.user import UserORM
 from src.models.schemas import UserResponseDTO
 
 ALGORITHM = "HS256"
-bcrypt_context = CryptContext(schemes=["bcrypt"])
+
+
+# passlib и python-jose загружаются при первом использовании, а не при импорте
+# приложения (при запуске через src.server их заранее загружает главный процесс)
+@cache
+def password_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"])
 
 
 # Проверка корректности логина и пароля с помощью БД
 async def authenticate_user(
     username: str, password: str, db: AsyncSession
 ) -> UserResponseDTO | None:
-    user_model = await db.execute(select(UserORM).where(UserORM.username == username))
+    user_model = await db.execute(
+        select(UserORM)
+        .where(UserORM.username == username)
+        .where(UserORM.deleted_at.is_(None))
+    )
     user_model = user_model.scalars().first()
 
-    if user_model and bcrypt_context.verify(password, user_model.hashed_password):
-        return UserResponseDTO.model_validate(user_model.__dict__)
+    if user_model and await verify_password(password, user_model.hashed_password):
+        return UserResponseDTO.from_row(user_model)
 
     return None
 
 
+# bcrypt намеренно медленный (сотни миллисекунд), поэтому хеширование
+# и проверка пароля выполняются в пуле потоков, а не в цикле событий
+async def hash_password(password: str) -> str:
+    return await asyncio.to_thread(password_context().hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await asyncio.to_thread(
+        password_context().verify, password, hashed_password
+    )
+
+
 # Создание JWT на основе данных пользователя
 def create_access_token(user: UserResponseDTO, expires_delta: timedelta = None) -> str:
     if expires_delta is None:
@@ -42,6 +67,8 @@ def create_access_token(user: UserResponseDTO, expires_delta: timedelta = None)
         "exp": expires,
     }
 
+    from jose import jwt
+
     return jwt.encode(
         to_encode,
         app_settings.JWT_SECRET_KEY,
@@ -49,10 +76,33 @@ def create_access_token(user: UserResponseDTO, expires_delta: timedelta = None)
     )
 
 
-# Расшифровка JWT с помощью секретного ключа
+# Удаленные пользователи, чьи токены еще могут быть действительны: id -> время
+# удаления. Запись нужна не дольше срока жизни токена, выданного до удаления
+_revoked_users: dict[int, float] = {}
+
+
+def revoke_user(user_id: int, revoked_at: float | None = None) -> None:
+    now = time.time()
+    lifetime = app_settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    for revoked_id, at in list(_revoked_users.items()):
+        if now - at > lifetime:
+            del _revoked_users[revoked_id]
+
+    _revoked_users[user_id] = revoked_at or now
+
+
+# Расшифровка JWT с помощью секретного ключа. Токен удаленного пользователя
+# отклоняется, хотя его подпись и срок действия в порядке
 def decode_access_token(token: str) -> dict | None:
+    from jose import jwt, JWTError
+
     try:
         payload = jwt.decode(token, app_settings.JWT_SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+
+    if payload.get("id") in _revoked_users:
+        return None
+
+    return payload
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from typing import AsyncIterator
+
+from src.config import app_settings
+
+
+# Хранилище файлов с адресацией по содержимому: ключ файла - его sha256.
+# Запись идет потоково через временный файл, хеш считается по ходу записи;
+# если файл с таким содержимым уже есть, временный просто удаляется
+class LocalBlobStore:
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.temp_directory = os.path.join(self.root, "tmp")
+
+    # Ключ раскладывается по подкаталогам, чтобы в одном каталоге
+    # не оказывались сотни тысяч файлов
+    def relative_path(self, key: str) -> str:
+        return os.path.join(key[:2], key[2:4], key)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, self.relative_path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> tuple[str, int]:
+        os.makedirs(self.temp_directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=self.temp_directory)
+
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            with os.fdopen(descriptor, "wb") as temp_file:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(temp_file.write, chunk)
+
+            key = digest.hexdigest()
+            self._commit(temp_path, key)
+
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return key, size
+
+    # Запись небольших производных файлов (миниатюр) из фоновых задач
+    def save_bytes(self, key: str, content: bytes) -> None:
+        os.makedirs(self.temp_directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=self.temp_directory)
+
+        with os.fdopen(descriptor, "wb") as temp_file:
+            temp_file.write(content)
+
+        self._commit(temp_path, key)
+
+    def _commit(self, temp_path: str, key: str) -> None:
+        target = self.path(key)
+
+        if os.path.exists(target):
+            os.remove(temp_path)
+            return
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp_path, target)
+
+
+def create_blob_store(backend: str, root: str):
+    if backend == "local":
+        return LocalBlobStore(root)
+
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+
+blob_store = create_blob_store(
+    backend=app_settings.BLOB_STORE_BACKEND,
+    root=app_settings.BLOB_STORE_DIR,
+)
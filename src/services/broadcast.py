@@ -0,0 +1,89 @@
+import json
+import asyncio
+import logging
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Рассылка служебных событий всем воркерам (сброс кэшей, отключение
+# пользователей). Обработчики регистрируются по типу события через subscribe
+class Broadcast:
+    def __init__(self, backend):
+        self.backend = backend
+        self._handlers: dict[str, list] = {}
+
+    def subscribe(self, topic: str, handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, data: dict) -> None:
+        await self.backend.publish(
+            json.dumps({"topic": topic, "data": data}), self.dispatch
+        )
+
+    async def dispatch(self, raw: str | bytes) -> None:
+        event = json.loads(raw)
+
+        for handler in self._handlers.get(event["topic"], ()):
+            try:
+                await handler(**event["data"])
+            except Exception as e:
+                logger.warning("Broadcast handler for %s failed: %s", event["topic"], e)
+
+    # Прием событий от других воркеров (задача на все время работы воркера)
+    async def run(self) -> None:
+        await self.backend.listen(self.dispatch)
+
+
+# Один процесс: событие сразу обрабатывается этим же воркером
+class InMemoryBroadcastBackend:
+    async def publish(self, raw: str, dispatch) -> None:
+        await dispatch(raw)
+
+    async def listen(self, dispatch) -> None:
+        pass
+
+
+# Канал Redis pub/sub, на который подписан каждый воркер (в том числе
+# отправитель). После обрыва соединения подписка восстанавливается;
+# пропущенные за это время события не повторяются, поэтому кэши,
+# которые сбрасываются событиями, все равно ограничены сроком жизни
+class RedisBroadcastBackend:
+    def __init__(self, redis_client, channel: str = "broadcast", retry: float = 1.0):
+        self.channel = channel
+        self.retry = retry
+        self._redis = redis_client
+
+    # Отправитель получит событие через свою подписку, как и остальные воркеры
+    async def publish(self, raw: str, dispatch) -> None:
+        await self._redis.publish(self.channel, raw)
+
+    async def listen(self, dispatch) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await dispatch(message["data"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Broadcast subscription lost: %s", e)
+                await asyncio.sleep(self.retry)
+
+
+def create_broadcast_backend(backend: str):
+    if backend == "redis":
+        from redis.asyncio import Redis
+
+        return RedisBroadcastBackend(Redis.from_url(app_settings.REDIS_URL))
+
+    return InMemoryBroadcastBackend()
+
+
+broadcast = Broadcast(create_broadcast_backend(app_settings.BROADCAST_BACKEND))
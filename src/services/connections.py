@@ -0,0 +1,273 @@
+import json
+import random
+import asyncio
+import logging
+
+from fastapi import WebSocket, status
+
+from src.config import app_settings
+from src.services.broadcast import broadcast
+from src.services.instrumentation import websocket_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+# Подключение без WebSocket (SSE и long-poll): кадры, которые реестр отправил бы
+# в сокет, складываются в очередь, а обработчик запроса забирает их оттуда.
+# Переполненная очередь закрывается: клиент переподключается и догружает
+# пропущенное из БД по id последнего сообщения
+class QueueConnection:
+    def __init__(self, max_size: int):
+        self.close_code: int | None = None
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue(max_size)
+
+    async def send_text(self, text: str) -> None:
+        if self.close_code is not None:
+            return
+
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            await self.close(code=1013)
+
+    async def close(self, code: int) -> None:
+        self.close_code = code
+
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    # Закрытие без потери кадров: обработчик запроса заберет уже поставленные
+    # в очередь кадры (ожидание не дольше timeout) и только потом завершится
+    async def finish(self, code: int, timeout: float) -> None:
+        if self.close_code is not None:
+            return
+
+        self.close_code = code
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            await self.close(code)
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self._queue.empty() and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+
+    # Ожидание кадров не дольше timeout; возвращаются все накопившиеся кадры
+    # (пустой список по таймауту или после закрытия)
+    async def receive(self, timeout: float | None = None) -> list[str]:
+        if self.close_code is not None and self._queue.empty():
+            return []
+
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        frames = [first]
+        while not self._queue.empty():
+            frames.append(self._queue.get_nowait())
+
+        return [frame for frame in frames if frame is not None]
+
+
+# Реестр активных подключений текущего воркера: WebSocket или QueueConnection
+# (у обоих есть send_text и close)
+class ConnectionRegistry:
+    def __init__(self, reconnect_window: float = 10.0, drain_timeout: float = 5.0):
+        self.reconnect_window = reconnect_window
+        self.drain_timeout = drain_timeout
+        # Воркер останавливается: новые подключения сразу получают кадр reconnect
+        self.draining = False
+
+        # id пользователя -> его открытые подключения (несколько вкладок или устройств)
+        self._connections: dict[int, set[WebSocket | QueueConnection]] = {}
+        # id пользователя -> id пользователей, у которых открыт чат с ним
+        self._watchers: dict[int, dict[int, int]] = {}
+
+    # Регистрация сокета; возвращает True, если это первое подключение пользователя
+    def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket | QueueConnection,
+        peer_id: int | None = None,
+    ) -> bool:
+        sockets = self._connections.setdefault(user_id, set())
+        sockets.add(websocket)
+        websocket_connections.inc()
+
+        if peer_id is not None:
+            watchers = self._watchers.setdefault(peer_id, {})
+            watchers[user_id] = watchers.get(user_id, 0) + 1
+
+        return len(sockets) == 1
+
+    # Удаление сокета; возвращает True, если у пользователя не осталось подключений
+    def disconnect(
+        self,
+        user_id: int,
+        websocket: WebSocket | QueueConnection,
+        peer_id: int | None = None,
+    ) -> bool:
+        if peer_id is not None:
+            watchers = self._watchers.get(peer_id)
+            if watchers and user_id in watchers:
+                watchers[user_id] -= 1
+                if watchers[user_id] <= 0:
+                    del watchers[user_id]
+                if not watchers:
+                    del self._watchers[peer_id]
+
+        sockets = self._connections.get(user_id)
+        if not sockets or websocket not in sockets:
+            return False
+
+        sockets.discard(websocket)
+        websocket_connections.dec()
+        if sockets:
+            return False
+
+        del self._connections[user_id]
+        return True
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._connections
+
+    # Пользователи, подключенные к этому воркеру
+    def online_users(self) -> list[int]:
+        return list(self._connections)
+
+    # Пользователи, которым интересно состояние указанного пользователя
+    def watchers(self, user_id: int) -> list[int]:
+        return list(self._watchers.get(user_id, ()))
+
+    # Закрытие всех сокетов пользователя (обработчики соединений сами снимут
+    # их с учета, получив WebSocketDisconnect)
+    async def close_user(self, user_id: int, code: int) -> None:
+        for websocket in list(self._connections.get(user_id, ())):
+            try:
+                await websocket.close(code=code)
+            except Exception as e:
+                logger.debug("Failed to close socket of user %s: %s", user_id, e)
+
+    # Кадр с просьбой переподключиться через случайную задержку: после рестарта
+    # воркера клиенты возвращаются равномерно в пределах reconnect_window,
+    # а не все в одну секунду (каждое подключение - проверка JWT и запросы к БД)
+    def reconnect_frame(self) -> dict:
+        return {
+            "type": "reconnect",
+            "delay_ms": random.randint(0, int(self.reconnect_window * 1000)),
+        }
+
+    async def _drain_connection(self, connection: WebSocket | QueueConnection) -> None:
+        try:
+            await connection.send_text(json.dumps(self.reconnect_frame()))
+
+            if isinstance(connection, QueueConnection):
+                await connection.finish(
+                    status.WS_1012_SERVICE_RESTART, self.drain_timeout
+                )
+            else:
+                await connection.close(code=status.WS_1012_SERVICE_RESTART)
+
+        except Exception as e:
+            logger.debug("Failed to drain connection: %s", e)
+
+    # Плавная остановка воркера: каждому клиенту уходит кадр reconnect, очереди
+    # SSE и long-poll дочитываются обработчиками, после чего подключения
+    # закрываются кодом 1012 (Service Restart). Возвращает число подключений
+    async def drain(self) -> int:
+        self.draining = True
+
+        connections = [
+            connection
+            for connections in self._connections.values()
+            for connection in connections
+        ]
+        if not connections:
+            return 0
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*map(self._drain_connection, connections)),
+                self.drain_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Drain timed out after %s s", self.drain_timeout)
+
+        logger.info("Drained %d connections", len(connections))
+        return len(connections)
+
+    # Отправка данных во все сокеты пользователя; возвращает True, если он в сети
+    async def send(self, user_id: int, data: dict) -> bool:
+        sockets = self._connections.get(user_id)
+        if not sockets:
+            return False
+
+        await self._send_text(user_id, sockets, json.dumps(data))
+        return True
+
+    # Рассылка одного события нескольким пользователям: данные сериализуются один раз,
+    # возвращается список пользователей, которые не в сети на этом воркере
+    async def send_many(self, user_ids, data: dict) -> list[int]:
+        text = json.dumps(data)
+        offline = []
+
+        for user_id in user_ids:
+            sockets = self._connections.get(user_id)
+            if sockets:
+                await self._send_text(user_id, sockets, text)
+            else:
+                offline.append(user_id)
+
+        return offline
+
+    async def _send_text(
+        self, user_id: int, sockets: set[WebSocket | QueueConnection], text: str
+    ) -> None:
+        for websocket in list(sockets):
+            try:
+                await websocket.send_text(text)
+            except Exception as e:
+                logger.debug("Failed to send to user %s: %s", user_id, e)
+
+
+connection_registry = ConnectionRegistry(
+    reconnect_window=app_settings.DRAIN_RECONNECT_WINDOW_SECONDS,
+    drain_timeout=app_settings.DRAIN_TIMEOUT_SECONDS,
+)
+
+
+# Доставка кадра пользователям, к какому бы воркеру они ни были подключены:
+# событие уходит всем воркерам через broadcast, и каждый отправляет кадр в свои
+# сокеты. Если канал недоступен, кадр получают хотя бы сокеты этого воркера
+async def deliver(user_ids, data: dict) -> None:
+    try:
+        await broadcast.publish("deliver", {"user_ids": list(user_ids), "frame": data})
+    except Exception as e:
+        logger.warning("Could not broadcast frame %s: %s", data.get("type"), e)
+        await connection_registry.send_many(user_ids, data)
+
+
+# Доставка кадра всем, у кого открыт чат с пользователем (на любом воркере)
+async def deliver_to_watchers(user_id: int, data: dict) -> None:
+    try:
+        await broadcast.publish("deliver_watchers", {"user_id": user_id, "frame": data})
+    except Exception as e:
+        logger.warning("Could not broadcast frame %s: %s", data.get("type"), e)
+        await _deliver_to_local_watchers(user_id, data)
+
+
+async def _deliver_local(user_ids: list[int], frame: dict) -> None:
+    await connection_registry.send_many(user_ids, frame)
+
+
+async def _deliver_to_local_watchers(user_id: int, frame: dict) -> None:
+    await connection_registry.send_many(connection_registry.watchers(user_id), frame)
+
+
+broadcast.subscribe("deliver", _deliver_local)
+broadcast.subscribe("deliver_watchers", _deliver_to_local_watchers)
@@ -0,0 +1,254 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# Минимальная реализация метрик в текстовом формате Prometheus
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float) -> None:
+        self._values[labels] = value
+
+    def dec(self, *labels, value: float = 1.0) -> None:
+        self.inc(*labels, value=-value)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # метки -> [счетчики по корзинам..., сумма, количество]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def samples(self):
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield (
+                    self.name + "_bucket"
+                    + _format_labels(self.labelnames, labels, f'le="{bound}"'),
+                    cumulative,
+                )
+            yield (
+                self.name + "_bucket" + _format_labels(self.labelnames, labels, 'le="+Inf"'),
+                state[-1],
+            )
+            yield self.name + "_sum" + _format_labels(self.labelnames, labels), state[-2]
+            yield self.name + "_count" + _format_labels(self.labelnames, labels), state[-1]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route", "status"),
+    )
+)
+db_query_duration = registry.register(
+    Histogram("db_query_duration_seconds", "SQL statement latency", ("operation",))
+)
+websocket_connections = registry.register(
+    Gauge("websocket_connections", "Open WebSocket connections on this worker")
+)
+messages_ingested = registry.register(
+    Counter("messages_ingested_total", "Messages accepted for storage", ("transport",))
+)
+fanout_duration = registry.register(
+    Histogram(
+        "fanout_duration_seconds",
+        "Time to deliver a message to local sockets",
+        ("kind",),
+    )
+)
+celery_enqueue_duration = registry.register(
+    Histogram(
+        "celery_enqueue_duration_seconds",
+        "Time spent enqueueing a background task",
+        ("task",),
+    )
+)
+event_loop_lag = registry.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "Delay of a scheduled wake-up on the event loop",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+    )
+)
+outbox_dispatched = registry.register(
+    Counter("outbox_dispatched_total", "Outbox tasks handed over to the broker")
+)
+event_loop_stalls = registry.register(
+    Counter(
+        "event_loop_stalls_total",
+        "Callbacks that blocked the event loop longer than the watchdog threshold",
+    )
+)
+
+
+# Время выполнения SQL-запросов через события SQLAlchemy (для всех движков).
+# Время начала хранится в стеке соединения; контекст выполнения запоминает,
+# что его запись еще лежит в стеке
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+    if context is not None:
+        context._query_timed = True
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    if context is not None:
+        context._query_timed = False
+    operation = statement.lstrip().split(" ", 1)[0].upper()
+    db_query_duration.observe(time.perf_counter() - started, operation)
+
+
+# Если запрос завершился ошибкой, after_cursor_execute не вызывается: время
+# начала снимается со стека здесь, иначе стек соединения рос бы с каждой
+# ошибкой. Ошибки при открытии соединения (connection is None) и при чтении
+# строк уже выполненного запроса стек не трогают
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    context = exception_context.execution_context
+    if conn is None or not getattr(context, "_query_timed", False):
+        return
+
+    context._query_timed = False
+    started = conn.info.get("query_start_time")
+    if started:
+        started.pop()
+
+
+# ASGI middleware для замера длительности HTTP-запросов по шаблону маршрута
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+            )
+
+
+# Фоновая задача: насколько позже запланированного просыпается цикл событий
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - started - interval))
+
+
+# Структурированное логирование с выборкой: на горячем пути пишется
+# только доля LOG_SAMPLE_RATE событий и без содержимого сообщений
+def log_sampled(event_name: str, **fields) -> None:
+    if random.random() >= app_settings.LOG_SAMPLE_RATE:
+        return
+
+    logger.info(json.dumps({"event": event_name, **fields}, default=str))
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+from src.config import app_settings
+from src.services.instrumentation import event_loop_stalls
+
+
+logger = logging.getLogger(__name__)
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    filename = os.path.relpath(code.co_filename) if code.co_filename else "?"
+    if filename.startswith(".."):
+        filename = os.path.basename(code.co_filename)
+
+    return f"{code.co_name} ({filename}:{frame.f_lineno})"
+
+
+# Стек потока от внешнего вызова к внутреннему
+def _capture_stack(frame) -> tuple[str, ...]:
+    stack = []
+    while frame is not None:
+        stack.append(_format_frame(frame))
+        frame = frame.f_back
+
+    return tuple(reversed(stack))
+
+
+# Сторожевой поток для цикла событий. Корутина-пульс на цикле обновляет отметку
+# времени; если она не обновлялась дольше порога, значит, какой-то обратный вызов
+# блокирует цикл, и поток снимает стеки потока цикла, пока блокировка не закончится
+class LoopWatchdog:
+    def __init__(
+        self,
+        threshold: float,
+        sample_interval: float,
+        collapsed_path: str | None = None,
+        history_size: int = 100,
+    ):
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.collapsed_path = collapsed_path
+
+        self._lock = threading.Lock()
+        self._stalls = deque(maxlen=history_size)
+        self._samples: Counter[tuple[str, ...]] = Counter()
+        # основной стек блокировки -> [число блокировок, суммарная длительность]
+        self._offenders: dict[tuple[str, ...], list] = {}
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._heartbeat = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # Запуск из корутины, выполняющейся на отслеживаемом цикле
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.sample_interval)
+
+    def _watch(self) -> None:
+        stall_started = None
+        stall_samples: list[tuple[str, ...]] = []
+
+        while not self._stopped.wait(self.sample_interval):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat
+
+            if blocked_for > self.threshold + self.sample_interval:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    stall_samples.append(_capture_stack(frame))
+                stall_started = last_beat
+                continue
+
+            if stall_started is not None:
+                self._record_stall(last_beat - stall_started, stall_samples)
+                stall_started = None
+                stall_samples = []
+
+    def _record_stall(self, duration: float, samples: list[tuple[str, ...]]) -> None:
+        if not samples:
+            return
+
+        stack, _ = Counter(samples).most_common(1)[0]
+        stall = {
+            "detected_at": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration * 1000, 1),
+            "samples": len(samples),
+            "stack": list(stack),
+        }
+
+        with self._lock:
+            self._stalls.append(stall)
+            self._samples.update(samples)
+            offender = self._offenders.setdefault(stack, [0, 0.0])
+            offender[0] += 1
+            offender[1] += duration
+
+        event_loop_stalls.inc()
+        logger.warning(
+            "Event loop blocked for %.0f ms in %s", duration * 1000, stack[-1]
+        )
+
+        if self.collapsed_path:
+            self._write_collapsed(samples)
+
+    def _write_collapsed(self, samples: list[tuple[str, ...]]) -> None:
+        try:
+            with open(self.collapsed_path, "a", encoding="utf-8") as collapsed_file:
+                for stack, count in Counter(samples).items():
+                    collapsed_file.write(f"{';'.join(stack)} {count}\n")
+        except OSError as e:
+            logger.warning("Could not write collapsed stacks: %s", e)
+
+    # Стеки, на которых цикл провел больше всего времени в блокировках
+    def top_offenders(self, limit: int = 10) -> list[dict]:
+        with self._lock:
+            offenders = sorted(
+                self._offenders.items(), key=lambda item: item[1][1], reverse=True
+            )[:limit]
+
+        return [
+            {
+                "blocked_ms": round(duration * 1000, 1),
+                "stalls": stalls,
+                "stack": list(stack),
+            }
+            for stack, (stalls, duration) in offenders
+        ]
+
+    def recent_stalls(self) -> list[dict]:
+        with self._lock:
+            return list(self._stalls)
+
+    # Все снятые стеки в свернутом формате (flamegraph.pl, speedscope, inferno)
+    def collapsed(self) -> str:
+        with self._lock:
+            samples = list(self._samples.items())
+
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in samples)
+
+
+loop_watchdog = LoopWatchdog(
+    threshold=app_settings.LOOP_WATCHDOG_THRESHOLD_SECONDS,
+    sample_interval=app_settings.LOOP_WATCHDOG_SAMPLE_INTERVAL_SECONDS,
+    collapsed_path=app_settings.LOOP_WATCHDOG_COLLAPSED_PATH,
+)
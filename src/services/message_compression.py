@@ -0,0 +1,92 @@
+import logging
+
+from sqlalchemy import LargeBinary, bindparam, type_coerce, update
+from sqlalchemy.future import select
+from sqlalchemy.engine import Engine
+
+from src.config import app_settings
+from src.data.message_codec import message_codec
+from src.models.message import MessageORM, MessageArchiveORM
+
+
+logger = logging.getLogger(__name__)
+
+
+def _recode_batch(engine: Engine, table, after_id: int, batch_size: int) -> tuple:
+    with engine.begin() as connection:
+        # Значения читаются как есть, в обход CompressedText
+        rows = connection.execute(
+            select(
+                table.c.id,
+                table.c.timestamp,
+                type_coerce(table.c.text, LargeBinary).label("body"),
+            )
+            .where(table.c.id > after_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+
+        changed = []
+        for row in rows:
+            body = message_codec.recode(row.body)
+            if body is not None:
+                changed.append(
+                    {"row_id": row.id, "row_timestamp": row.timestamp, "body": body}
+                )
+
+        if changed:
+            # Текст не меняется, поэтому change_seq (и версия) остаются прежними;
+            # timestamp в условии отсекает лишние секции
+            connection.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .where(table.c.timestamp == bindparam("row_timestamp"))
+                .values(
+                    text=bindparam("body", type_=LargeBinary),
+                    change_seq=table.c.change_seq,
+                ),
+                changed,
+            )
+
+    last_id = rows[-1].id if rows else None
+    return len(rows), len(changed), last_id
+
+
+# Перевод текста сообщений в формат текущих настроек (сжатие, словарь) в основной
+# таблице и в архиве. Строки обходятся по id пачками, каждая пачка - короткая
+# транзакция; переписываются только строки в другом формате, поэтому задачу
+# можно прервать и запустить заново, а с MESSAGE_COMPRESSION=none она же
+# распаковывает все обратно
+def compress_message_bodies(engine: Engine, after_id: int = 0) -> dict:
+    batch_size = app_settings.MESSAGE_COMPRESSION_BATCH_SIZE
+    report = {}
+
+    for model in (MessageORM, MessageArchiveORM):
+        table = model.__table__
+        scanned = rewritten = 0
+        last_id = after_id
+
+        while True:
+            batch_scanned, batch_rewritten, batch_last_id = _recode_batch(
+                engine, table, last_id, batch_size
+            )
+            scanned += batch_scanned
+            rewritten += batch_rewritten
+
+            if batch_last_id is None:
+                break
+            last_id = batch_last_id
+
+            if batch_scanned < batch_size:
+                break
+
+        logger.info(
+            "Message bodies in %s: %s scanned, %s rewritten (up to id %s)",
+            table.name,
+            scanned,
+            rewritten,
+            last_id,
+        )
+        report[table.name] = {"scanned": scanned, "rewritten": rewritten}
+
+    return report
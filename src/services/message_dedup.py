@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+
+from src.config import app_settings
+from src.models.schemas import MessageResponseDTO
+
+
+# Недавно отправленные сообщения по паре (отправитель, id сообщения на клиенте),
+# чтобы повтор отправки отвечал исходным сообщением без обращения к БД
+class InMemoryMessageDedup:
+    def __init__(self, ttl: float, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, str], tuple[float, MessageResponseDTO]] = (
+            OrderedDict()
+        )
+
+    async def get(self, sender_id: int, client_msg_id: str) -> MessageResponseDTO | None:
+        entry = self._entries.get((sender_id, client_msg_id))
+        if entry is None:
+            return None
+
+        stored_at, message = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[(sender_id, client_msg_id)]
+            return None
+
+        return message
+
+    async def store(
+        self, sender_id: int, client_msg_id: str, message: MessageResponseDTO
+    ) -> None:
+        self._entries[(sender_id, client_msg_id)] = (time.monotonic(), message)
+        self._entries.move_to_end((sender_id, client_msg_id))
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# То же в Redis с истечением ключей, общее для всех воркеров
+class RedisMessageDedup:
+    def __init__(self, redis_client, ttl: float, prefix: str = "dedup:messages"):
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis_client
+
+    def _key(self, sender_id: int, client_msg_id: str) -> str:
+        return f"{self.prefix}:{sender_id}:{client_msg_id}"
+
+    async def get(self, sender_id: int, client_msg_id: str) -> MessageResponseDTO | None:
+        data = await self._redis.get(self._key(sender_id, client_msg_id))
+        if data is None:
+            return None
+
+        return MessageResponseDTO.model_validate_json(data)
+
+    async def store(
+        self, sender_id: int, client_msg_id: str, message: MessageResponseDTO
+    ) -> None:
+        await self._redis.set(
+            self._key(sender_id, client_msg_id),
+            message.model_dump_json(),
+            ex=max(1, int(self.ttl)),
+        )
+
+
+def create_message_dedup(backend: str, ttl: float):
+    if backend == "redis":
+        from redis.asyncio import Redis
+
+        return RedisMessageDedup(Redis.from_url(app_settings.REDIS_URL), ttl)
+
+    return InMemoryMessageDedup(ttl)
+
+
+message_dedup = create_message_dedup(
+    backend=app_settings.MESSAGE_DEDUP_BACKEND,
+    ttl=app_settings.MESSAGE_DEDUP_TTL_SECONDS,
+)
@@ -0,0 +1,131 @@
+import math
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from src.config import app_settings
+from src.services.connections import deliver
+
+
+logger = logging.getLogger(__name__)
+
+
+# Условие для запросов чтения: у сообщения нет срока жизни или он еще не истек.
+# Проверяется в SQL, поэтому истекшие строки не попадают в выборку и до того,
+# как задача expire_messages (src.services.message_sweep) превратит их в "надгробия".
+# model - MessageORM или MessageArchiveORM (см. history_select)
+def not_expired(model, now: datetime | None = None):
+    return or_(model.expires_at.is_(None), model.expires_at > (now or datetime.now()))
+
+
+# Момент истечения нового сообщения: срок, указанный при отправке, но не дольше
+# срока, заданного для всего чата
+def expiry_time(
+    ttl_seconds: int | None,
+    default_ttl_seconds: int | None = None,
+    now: datetime | None = None,
+) -> datetime | None:
+    ttls = [ttl for ttl in (ttl_seconds, default_ttl_seconds) if ttl]
+    if not ttls:
+        return None
+
+    return (now or datetime.now()) + timedelta(seconds=min(ttls))
+
+
+# Колесо таймеров (hashed timing wheel) для исчезающих сообщений, отданных
+# клиентам этого воркера: планирование - O(1), а каждый тик просматривает одну
+# ячейку, а не все таймеры. Сроки дальше одного оборота колеса хранятся
+# с числом оставшихся оборотов. По истечении участники, подключенные к любому
+# воркеру, получают кадр messages_expired со списком id
+class ExpiryTimerWheel:
+    def __init__(self, tick: float = 1.0, slots: int = 512):
+        self.tick = tick
+        # Ячейка: id сообщения -> [оставшиеся обороты, id получателей]
+        self._slots: list[dict[int, list]] = [{} for _ in range(slots)]
+        self._position = 0
+        # id сообщения -> номер ячейки
+        self._scheduled: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    # Повторное планирование того же сообщения только добавляет получателей
+    def schedule(self, message_id: int, expires_at: datetime, user_ids) -> None:
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+
+        slot = self._scheduled.get(message_id)
+        if slot is not None:
+            self._slots[slot][message_id][1].update(user_ids)
+            return
+
+        delay = (expires_at - datetime.now()).total_seconds()
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._position + ticks) % len(self._slots)
+
+        self._slots[slot][message_id] = [(ticks - 1) // len(self._slots), user_ids]
+        self._scheduled[message_id] = slot
+
+    # Таймеры для сообщений, которые отдаются клиентам; без user_ids
+    # об истечении узнают оба участника диалога
+    def schedule_messages(self, messages, user_ids=None) -> None:
+        for message in messages:
+            if message.expires_at is not None:
+                self.schedule(
+                    message.id,
+                    message.expires_at,
+                    user_ids or (message.sender_id, message.recipient_id),
+                )
+
+    # Переход к следующей ячейке; возвращает истекшие сообщения и их получателей
+    def advance(self) -> dict[int, set[int]]:
+        self._position = (self._position + 1) % len(self._slots)
+        slot = self._slots[self._position]
+
+        expired = {}
+        for message_id, entry in list(slot.items()):
+            if entry[0] > 0:
+                entry[0] -= 1
+                continue
+
+            del slot[message_id]
+            del self._scheduled[message_id]
+            expired[message_id] = entry[1]
+
+        return expired
+
+    # Один кадр на пользователя со всеми его истекшими сообщениями
+    async def notify(self, expired: dict[int, set[int]]) -> None:
+        by_user: dict[int, list[int]] = {}
+        for message_id, user_ids in expired.items():
+            for user_id in user_ids:
+                by_user.setdefault(user_id, []).append(message_id)
+
+        for user_id, message_ids in by_user.items():
+            await deliver([user_id], {"type": "messages_expired", "ids": message_ids})
+
+    # Тики отсчитываются от времени запуска, поэтому задержки цикла событий
+    # не накапливаются: пропущенные тики обрабатываются подряд
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+            expired = self.advance()
+            if not expired:
+                continue
+
+            try:
+                await self.notify(expired)
+            except Exception as e:
+                logger.warning("Could not notify about expired messages: %s", e)
+
+
+expiry_wheel = ExpiryTimerWheel(
+    tick=app_settings.MESSAGE_EXPIRY_WHEEL_TICK_SECONDS,
+    slots=app_settings.MESSAGE_EXPIRY_WHEEL_SLOTS,
+)
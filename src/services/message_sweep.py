@@ -0,0 +1,73 @@
+# Превращение истекших исчезающих сообщений в "надгробия" (задача Celery
+# expire_messages). Модуль выполняется воркером, поэтому не импортирует
+# веб-слой (FastAPI); условия чтения и таймеры - в src.services.message_expiry
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+from sqlalchemy.engine import Engine
+
+from src.config import app_settings
+from src.models.message import MessageORM, MessageArchiveORM
+
+
+logger = logging.getLogger(__name__)
+
+
+def _expire_batch(engine: Engine, table, now: datetime, batch_size: int) -> int:
+    with engine.begin() as connection:
+        # Истекшие строки находятся по частичному индексу expires_at
+        expired = (
+            select(table.c.id)
+            .where(table.c.expires_at <= now)
+            .where(table.c.deleted_at.is_(None))
+            .order_by(table.c.expires_at)
+            .limit(batch_size)
+        )
+
+        # Строки, которые сейчас изменяет другая транзакция, не ждем:
+        # они достанутся следующему запуску
+        if connection.dialect.name == "postgresql":
+            expired = expired.with_for_update(skip_locked=True)
+
+        # Как при удалении отправителем: текст стирается, строка остается
+        # "надгробием" с новой версией (и change_seq для синхронизации)
+        result = connection.execute(
+            update(table)
+            .where(table.c.id.in_(expired))
+            .values(
+                text="",
+                version=table.c.version + 1,
+                deleted_at=table.c.expires_at,
+            )
+        )
+
+    return result.rowcount
+
+
+# Превращение истекших сообщений в "надгробия" в основной таблице и в архиве.
+# Каждая пачка - отдельная короткая транзакция, которая блокирует только свои
+# строки; за запуск обрабатывается не больше MESSAGE_EXPIRY_MAX_BATCHES пачек
+def expire_messages(engine: Engine) -> dict:
+    batch_size = app_settings.MESSAGE_EXPIRY_BATCH_SIZE
+    now = datetime.now()
+    report = {}
+
+    for model in (MessageORM, MessageArchiveORM):
+        table = model.__table__
+        expired = 0
+
+        for _ in range(app_settings.MESSAGE_EXPIRY_MAX_BATCHES):
+            count = _expire_batch(engine, table, now, batch_size)
+            expired += count
+
+            if count < batch_size:
+                break
+
+        if expired:
+            logger.info("Expired %s messages in %s", expired, table.name)
+        report[table.name] = expired
+
+    return report
@@ -1,108 +1,326 @@
 from datetime import datetime, timezone
-from sqlalchemy import or_, and_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import or_, and_, func, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models.user import UserORM
-from src.models.message import MessageORM
+from src.models.message import MessageORM, MessageClientIdORM
+from src.models.attachment import AttachmentORM
 from src.models.schemas import MessageResponseDTO
+from src.data.routing import replica_execute, replica_router
+from src.services.connections import deliver
+from src.services.rooms import room_membership
+from src.services.retention import history_select
+from src.services.outbox import add_outbox_tasks, outbox_relay
+from src.services.message_dedup import message_dedup
+from src.services.message_expiry import not_expired, expiry_time, expiry_wheel
+
+
+# Столбцы, из которых собирается MessageResponseDTO (в том числе для ... RETURNING)
+MESSAGE_COLUMNS = (
+    MessageORM.id,
+    MessageORM.sender_id,
+    MessageORM.recipient_id,
+    MessageORM.room_id,
+    MessageORM.text,
+    MessageORM.timestamp,
+    MessageORM.version,
+    MessageORM.edited_at,
+    MessageORM.deleted_at,
+    MessageORM.expires_at,
+)
 
 
 # Получение всех сообщений
 async def get_all_messages(db: AsyncSession) -> list[MessageResponseDTO]:
-    result = await db.execute(select(MessageORM))
-    message_models = result.scalars().all()
+    result = await replica_execute(
+        db,
+        select(*MESSAGE_COLUMNS)
+        .where(MessageORM.deleted_at.is_(None))
+        .where(not_expired(MessageORM)),
+    )
 
-    return [
-        MessageResponseDTO.model_validate(message.__dict__)
-        for message in message_models
-    ]
+    return [MessageResponseDTO.from_row(row) for row in result.all()]
 
 
 # Получение сообщения по его id
 async def get_message_by_id(message_id: int, db: AsyncSession) -> MessageResponseDTO:
-    message_model = await db.execute(
-        select(MessageORM).where(MessageORM.id == message_id)
+    result = await db.execute(
+        select(*MESSAGE_COLUMNS).where(MessageORM.id == message_id)
     )
-    message_model = message_model.scalars().first()
+    row = result.first()
 
-    if message_model:
-        return MessageResponseDTO.model_validate(message_model.__dict__)
+    if row:
+        return MessageResponseDTO.from_row(row)
 
     return None
 
 
 # Получение всех отправленных пользователем сообщений по его id
 async def get_user_messages(user_id: int, db: AsyncSession) -> list[MessageResponseDTO]:
-    user_model = await db.execute(
-        select(UserORM)
-        .options(joinedload(UserORM.sent_messages))
-        .where(UserORM.id == user_id)
+    result = await replica_execute(
+        db,
+        select(*MESSAGE_COLUMNS)
+        .where(MessageORM.sender_id == user_id)
+        .where(MessageORM.deleted_at.is_(None))
+        .where(not_expired(MessageORM)),
+        user_id,
     )
-    user_model = user_model.scalars().first()
-
-    if not user_model:
-        return []
 
-    return [
-        MessageResponseDTO.model_validate(message.__dict__)
-        for message in user_model.sent_messages
-    ]
+    return [MessageResponseDTO.from_row(row) for row in result.all()]
 
 
 # Выбор всех сообщений, отправленных пользователю и полученных им
 async def get_user_dialog_messages(
     user_id: int, db: AsyncSession
 ) -> list[MessageResponseDTO]:
-    user_model = await db.execute(
-        select(UserORM)
-        .options(
-            joinedload(UserORM.sent_messages),
-            joinedload(UserORM.received_messages),
-        )
-        .where(UserORM.id == user_id)
+    result = await replica_execute(
+        db,
+        history_select(
+            lambda message: (
+                or_(
+                    message.sender_id == user_id,
+                    message.recipient_id == user_id,
+                ),
+                message.deleted_at.is_(None),
+                not_expired(message),
+            )
+        ),
+        user_id,
     )
-    user_model = user_model.scalars().first()
+    messages = [MessageResponseDTO.from_row(row) for row in result.all()]
 
-    all_messages = user_model.sent_messages + user_model.received_messages
+    expiry_wheel.schedule_messages(messages)
+    return messages
 
-    return [
-        MessageResponseDTO.model_validate(message.__dict__) for message in all_messages
-    ]
 
+# Отметка изменений всех диалогов пользователя для ETag: последний change_seq
+# среди отправленных и среди полученных сообщений (по индексам (..., change_seq))
+# и число его сообщений, которые уже истекли, но еще не стали "надгробиями".
+# Их считает частичный индекс ix_messages_expires_at_pending: "надгробия" из него
+# выпадают, поэтому в нем только строки, которые ждут ближайшего запуска
+# expire_messages
+async def get_dialog_change_marker(
+    user_id: int, db: AsyncSession
+) -> tuple[int, int, int]:
+    result = await replica_execute(
+        db,
+        select(
+            *[
+                select(func.coalesce(func.max(MessageORM.change_seq), 0))
+                .where(column == user_id)
+                .scalar_subquery()
+                for column in (MessageORM.sender_id, MessageORM.recipient_id)
+            ],
+            select(func.count())
+            .where(MessageORM.expires_at <= datetime.now())
+            .where(MessageORM.deleted_at.is_(None))
+            .where(
+                or_(MessageORM.sender_id == user_id, MessageORM.recipient_id == user_id)
+            )
+            .scalar_subquery(),
+        ),
+        user_id,
+    )
+    sent, received, expired = result.one()
 
-# Добавление сообщения в БД
+    return sent, received, expired
+
+
+# Добавление сообщения в БД одним запросом INSERT ... RETURNING. После коммита
+# сессия не открывает новую транзакцию, и соединение сразу возвращается в пул.
+# outbox_tasks (например, уведомления), client_msg_id и привязка вложений
+# отправителя записываются в той же транзакции; повтор client_msg_id
+# отправителя вызывает IntegrityError. С ttl_seconds сообщение исчезающее
 async def create_message(
     sender_id: int,
     recipient_id: int,
     text: str,
     db: AsyncSession,
+    outbox_tasks: list[tuple[str, tuple]] | None = None,
+    client_msg_id: str | None = None,
+    attachment_ids: list[int] | None = None,
+    ttl_seconds: int | None = None,
 ) -> MessageResponseDTO:
+    outbox_tasks = outbox_tasks or []
+    attachment_ids = attachment_ids or []
 
-    message_model = MessageORM(
-        sender_id=sender_id,
-        recipient_id=recipient_id,
-        text=text,
-        timestamp=datetime.now(),
+    now = datetime.now()
+    result = await db.execute(
+        insert(MessageORM)
+        .values(
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            text=text,
+            timestamp=now,
+            expires_at=expiry_time(ttl_seconds, now=now),
+        )
+        .returning(*MESSAGE_COLUMNS)
     )
-    db.add(message_model)
+    row = result.one()
+
+    if client_msg_id is not None:
+        await db.execute(
+            insert(MessageClientIdORM).values(
+                sender_id=sender_id,
+                client_msg_id=client_msg_id,
+                message_id=row.id,
+                created_at=now,
+            )
+        )
 
+    if attachment_ids:
+        await db.execute(
+            update(AttachmentORM)
+            .where(AttachmentORM.id.in_(attachment_ids))
+            .where(AttachmentORM.uploader_id == sender_id)
+            .where(AttachmentORM.message_id.is_(None))
+            .values(message_id=row.id)
+            .execution_options(synchronize_session=False)
+        )
+
+    await add_outbox_tasks(db, outbox_tasks, row.id)
     await db.commit()
-    await db.refresh(message_model)
 
-    return MessageResponseDTO.model_validate(message_model.__dict__)
+    replica_router.mark_write(sender_id)
+    if outbox_tasks:
+        outbox_relay.notify()
+
+    if row.expires_at is not None:
+        expiry_wheel.schedule(row.id, row.expires_at, (sender_id, recipient_id))
+
+    return MessageResponseDTO.from_row(row)
+
+
+# Сообщение, ранее отправленное с этим client_msg_id
+async def get_message_by_client_id(
+    sender_id: int, client_msg_id: str, db: AsyncSession
+) -> MessageResponseDTO | None:
+    result = await db.execute(
+        select(*MESSAGE_COLUMNS)
+        .join(MessageClientIdORM, MessageClientIdORM.message_id == MessageORM.id)
+        .where(MessageClientIdORM.sender_id == sender_id)
+        .where(MessageClientIdORM.client_msg_id == client_msg_id)
+    )
+    row = result.first()
+
+    if row:
+        return MessageResponseDTO.from_row(row)
+
+    return None
+
+
+# Идемпотентная отправка: повтор с тем же client_msg_id возвращает исходное
+# сообщение и False вместо создания нового. Недавние ответы берутся из кэша
+# без обращения к БД; гонку параллельных повторов решает первичный ключ
+# message_client_ids
+async def create_message_once(
+    sender_id: int,
+    recipient_id: int,
+    text: str,
+    db: AsyncSession,
+    client_msg_id: str | None = None,
+    outbox_tasks: list[tuple[str, tuple]] | None = None,
+    attachment_ids: list[int] | None = None,
+    ttl_seconds: int | None = None,
+) -> tuple[MessageResponseDTO, bool]:
+    if client_msg_id is None:
+        message = await create_message(
+            sender_id,
+            recipient_id,
+            text,
+            db,
+            outbox_tasks,
+            None,
+            attachment_ids,
+            ttl_seconds,
+        )
+        return message, True
+
+    message = await message_dedup.get(sender_id, client_msg_id)
+    if message is not None:
+        return message, False
+
+    try:
+        message = await create_message(
+            sender_id,
+            recipient_id,
+            text,
+            db,
+            outbox_tasks,
+            client_msg_id,
+            attachment_ids,
+            ttl_seconds,
+        )
+        created = True
+    except IntegrityError:
+        await db.rollback()
+        message = await get_message_by_client_id(sender_id, client_msg_id, db)
+        await db.commit()
+        created = False
+
+        if message is None:
+            raise
+
+    # Текст исчезающего сообщения не должен пережить его в кэше повторов
+    # (для подтверждения нужны только id и время)
+    if message.expires_at is not None:
+        await message_dedup.store(
+            sender_id, client_msg_id, message.model_copy(update={"text": ""})
+        )
+    else:
+        await message_dedup.store(sender_id, client_msg_id, message)
+
+    return message, created
 
 
 # Получение истории сообщений между двумя пользователями
+# (с учетом сообщений, перенесенных в архив политикой хранения)
 async def get_messages_between_users(
     first_user_id: int,
     second_user_id: int,
     db: AsyncSession,
 ) -> list[MessageResponseDTO]:
-    result = await db.execute(
-        select(MessageORM)
-        .filter(
+    result = await replica_execute(
+        db,
+        history_select(
+            lambda message: (
+                or_(
+                    and_(
+                        message.sender_id == first_user_id,
+                        message.recipient_id == second_user_id,
+                    ),
+                    and_(
+                        message.sender_id == second_user_id,
+                        message.recipient_id == first_user_id,
+                    ),
+                ),
+                message.deleted_at.is_(None),
+                not_expired(message),
+            )
+        ),
+        first_user_id,
+        second_user_id,
+    )
+    messages = [MessageResponseDTO.from_row(row) for row in result.all()]
+
+    expiry_wheel.schedule_messages(messages)
+    return messages
+
+
+# Сообщения переписки после сообщения after_id (не больше limit) - для клиентов,
+# которые переподключаются и догружают пропущенное
+async def get_messages_between_users_after(
+    first_user_id: int,
+    second_user_id: int,
+    after_id: int,
+    limit: int,
+    db: AsyncSession,
+) -> list[MessageResponseDTO]:
+    result = await replica_execute(
+        db,
+        select(*MESSAGE_COLUMNS)
+        .where(
             or_(
                 and_(
                     MessageORM.sender_id == first_user_id,
@@ -114,29 +332,138 @@ async def get_messages_between_users(
                 ),
             )
         )
-        .order_by(MessageORM.timestamp)
+        .where(MessageORM.id > after_id)
+        .where(MessageORM.deleted_at.is_(None))
+        .where(not_expired(MessageORM))
+        .order_by(MessageORM.id)
+        .limit(limit),
+        first_user_id,
+        second_user_id,
     )
-    message_models = result.scalars().all()
+    messages = [MessageResponseDTO.from_row(row) for row in result.all()]
 
-    return [
-        MessageResponseDTO.model_validate(message.__dict__)
-        for message in message_models
-    ]
+    expiry_wheel.schedule_messages(messages)
+    return messages
 
 
-# Удаление сообщения из БД по его id
-async def delete_messages(
-    message_id: int, db: AsyncSession
+# Отметка состояния переписки для ключа кэша отрисованной истории: последний
+# change_seq в каждом направлении (новые, измененные и удаленные сообщения
+# получают новый номер; по индексу (sender_id, recipient_id, change_seq) это
+# один шаг) и число истекших сообщений, которые еще не стали "надгробиями"
+# (по частичному индексу ix_messages_expires_at_pending)
+async def get_conversation_marker(
+    first_user_id: int,
+    second_user_id: int,
+    db: AsyncSession,
+) -> tuple[int, int, int]:
+    result = await replica_execute(
+        db,
+        select(
+            *[
+                select(func.coalesce(func.max(MessageORM.change_seq), 0))
+                .where(MessageORM.sender_id == sender_id)
+                .where(MessageORM.recipient_id == recipient_id)
+                .scalar_subquery()
+                for sender_id, recipient_id in (
+                    (first_user_id, second_user_id),
+                    (second_user_id, first_user_id),
+                )
+            ],
+            select(func.count())
+            .where(MessageORM.expires_at <= datetime.now())
+            .where(MessageORM.deleted_at.is_(None))
+            .where(
+                or_(
+                    and_(
+                        MessageORM.sender_id == first_user_id,
+                        MessageORM.recipient_id == second_user_id,
+                    ),
+                    and_(
+                        MessageORM.sender_id == second_user_id,
+                        MessageORM.recipient_id == first_user_id,
+                    ),
+                )
+            )
+            .scalar_subquery(),
+        ),
+        first_user_id,
+        second_user_id,
+    )
+    sent, received, expired = result.one()
+
+    return sent, received, expired
+
+
+# Изменение текста сообщения его отправителем. Проверка владельца выполняется
+# в условии WHERE, поэтому достаточно одного запроса UPDATE ... RETURNING
+async def edit_message(
+    message_id: int,
+    sender_id: int,
+    text: str,
+    db: AsyncSession,
 ) -> MessageResponseDTO | None:
-    message_model = await db.execute(
-        select(MessageORM).where(MessageORM.id == message_id)
+    result = await db.execute(
+        update(MessageORM)
+        .where(MessageORM.id == message_id)
+        .where(MessageORM.sender_id == sender_id)
+        .where(MessageORM.deleted_at.is_(None))
+        .where(not_expired(MessageORM))
+        .values(text=text, version=MessageORM.version + 1, edited_at=datetime.now())
+        .returning(*MESSAGE_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
-    message_model = message_model.scalars().first()
+    row = result.first()
+    await db.commit()
 
-    if not message_model:
+    if row is None:
         return None
 
-    await db.delete(message_model)
+    replica_router.mark_write(sender_id)
+    return MessageResponseDTO.from_row(row)
+
+
+# Удаление сообщения его отправителем: текст стирается, а строка остается
+# "надгробием" с новой версией, чтобы удаление дошло до кэшей и клиентов
+async def delete_messages(
+    message_id: int, sender_id: int, db: AsyncSession
+) -> MessageResponseDTO | None:
+    result = await db.execute(
+        update(MessageORM)
+        .where(MessageORM.id == message_id)
+        .where(MessageORM.sender_id == sender_id)
+        .where(MessageORM.deleted_at.is_(None))
+        .values(text="", version=MessageORM.version + 1, deleted_at=datetime.now())
+        .returning(*MESSAGE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
     await db.commit()
 
-    return MessageResponseDTO.model_validate(message_model.__dict__)
+    if row is None:
+        return None
+
+    replica_router.mark_write(sender_id)
+    return MessageResponseDTO.from_row(row)
+
+
+# Рассылка события об изменении сообщения обоим участникам диалога
+async def broadcast_message_event(event_type: str, message: MessageResponseDTO) -> None:
+    event = {
+        "type": event_type,
+        "id": message.id,
+        "version": message.version,
+        "text": message.text,
+        "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+        "deleted_at": message.deleted_at.isoformat() if message.deleted_at else None,
+    }
+
+    # Состав группового чата берется из кэша этого воркера; кадр получают
+    # участники, подключенные к любому воркеру
+    if message.room_id is not None:
+        members = room_membership.get_cached(message.room_id)
+        if members:
+            event["room_id"] = message.room_id
+            await deliver(members, event)
+        return
+
+    await deliver({message.sender_id, message.recipient_id}, event)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import uuid
+import base64
+import socket
+import asyncio
+import logging
+from collections import deque
+
+from src.config import app_settings
+from src.services.instrumentation import celery_enqueue_duration
+
+
+logger = logging.getLogger(__name__)
+
+SEND_TELEGRAM_NOTIFICATION = "celery_app.tasks.send_telegram_notification"
+
+ORIGIN = f"gen{os.getpid()}@{socket.gethostname()}"
+
+
+# Сообщение задачи в формате протокола Celery v2, как его кладет в Redis kombu
+# (результат не сохраняется: уведомления не требуют ответа)
+def build_task_message(task_name: str, args: tuple, queue: str) -> str:
+    task_id = str(uuid.uuid4())
+    body = json.dumps(
+        [
+            list(args),
+            {},
+            {"callbacks": None, "errbacks": None, "chain": None, "chord": None},
+        ]
+    )
+
+    return json.dumps(
+        {
+            "body": base64.b64encode(body.encode()).decode(),
+            "content-encoding": "utf-8",
+            "content-type": "application/json",
+            "headers": {
+                "lang": "py",
+                "task": task_name,
+                "id": task_id,
+                "shadow": None,
+                "eta": None,
+                "expires": None,
+                "group": None,
+                "group_index": None,
+                "retries": 0,
+                "timelimit": [None, None],
+                "root_id": task_id,
+                "parent_id": None,
+                "argsrepr": repr(args),
+                "kwargsrepr": "{}",
+                "origin": ORIGIN,
+                "ignore_result": True,
+            },
+            "properties": {
+                "correlation_id": task_id,
+                "reply_to": "",
+                "delivery_mode": 2,
+                "delivery_info": {"exchange": "", "routing_key": queue},
+                "priority": 0,
+                "body_encoding": "base64",
+                "delivery_tag": str(uuid.uuid4()),
+            },
+        }
+    )
+
+
+def telegram_notification_task(
+    telegram_url: str, sender_name: str, text: str
+) -> tuple[str, tuple]:
+    return SEND_TELEGRAM_NOTIFICATION, (telegram_url, sender_name, text)
+
+
+# Буфер фоновых задач в памяти воркера. Постановка в очередь не ждет брокер:
+# задача добавляется в буфер, а фоновая корутина отправляет накопленное
+# пачками (один конвейер Redis на пачку)
+class TaskBuffer:
+    def __init__(
+        self,
+        broker_url: str | None,
+        queue: str = "celery",
+        batch_size: int = 500,
+        limit: int = 10000,
+        flush_interval: float = 0.05,
+    ):
+        self.broker_url = broker_url
+        self.queue = queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._pending: deque[tuple[str, tuple]] = deque()
+        self._limit = limit
+        self._wakeup = asyncio.Event()
+        self._redis = None
+
+    @property
+    def uses_redis(self) -> bool:
+        return bool(self.broker_url) and self.broker_url.startswith(
+            ("redis://", "rediss://")
+        )
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, task_name: str, args: tuple) -> None:
+        if len(self._pending) >= self._limit:
+            logger.warning("Task buffer is full, dropping %s", task_name)
+            return
+
+        self._pending.append((task_name, args))
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            try:
+                while self._pending:
+                    await self.flush()
+            except Exception as e:
+                logger.warning("Could not send tasks to the broker: %s", e)
+                await asyncio.sleep(1.0)
+                self._wakeup.set()
+                continue
+
+            # Короткая пауза, чтобы следующие задачи успели накопиться в пачку
+            await asyncio.sleep(self.flush_interval)
+
+    # Отправка одной пачки из буфера; при ошибке задачи возвращаются в его начало
+    async def flush(self) -> None:
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popleft())
+
+        if not batch:
+            return
+
+        try:
+            await self.send_batch(batch)
+        except Exception:
+            self._pending.extendleft(reversed(batch))
+            raise
+
+    # Передача пачки задач брокеру (в обход буфера, например из outbox)
+    async def send_batch(self, batch: list[tuple[str, tuple]]) -> None:
+        started = time.perf_counter()
+
+        if self.uses_redis:
+            await self._push_redis(batch)
+        else:
+            await asyncio.to_thread(self._send_with_celery, batch)
+
+        celery_enqueue_duration.observe(time.perf_counter() - started, "batch")
+
+    async def _push_redis(self, batch: list[tuple[str, tuple]]) -> None:
+        if self._redis is None:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(self.broker_url)
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for task_name, args in batch:
+                pipe.lpush(self.queue, build_task_message(task_name, args, self.queue))
+            await pipe.execute()
+
+    # Брокер, отличный от Redis (например, memory:// в нагрузочных тестах):
+    # приложение Celery загружается только при первой отправке
+    def _send_with_celery(self, batch: list[tuple[str, tuple]]) -> None:
+        from celery_app.tasks import celery_app
+
+        for task_name, args in batch:
+            celery_app.send_task(task_name, args=args, queue=self.queue)
+
+    async def close(self) -> None:
+        while self._pending:
+            await self.flush()
+
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+task_buffer = TaskBuffer(
+    app_settings.CELERY_BROKER_URL,
+    queue=app_settings.CELERY_TASK_QUEUE,
+    batch_size=app_settings.TASK_BUFFER_BATCH_SIZE,
+    limit=app_settings.TASK_BUFFER_LIMIT,
+    flush_interval=app_settings.TASK_BUFFER_FLUSH_INTERVAL_SECONDS,
+)
+
+
+# Постановка уведомления в телеграм в очередь без ожидания брокера и без
+# гарантии доставки (надежный путь - outbox в транзакции с сообщением)
+def enqueue_telegram_notification(telegram_url: str, sender_name: str, text: str) -> None:
+    started = time.perf_counter()
+
+    task_buffer.put(*telegram_notification_task(telegram_url, sender_name, text))
+
+    celery_enqueue_duration.observe(
+        time.perf_counter() - started, "send_telegram_notification"
+    )
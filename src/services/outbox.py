@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+from sqlalchemy import insert, delete
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import app_settings
+from src.models.outbox import OutboxORM
+from src.data.database import async_session_factory
+from src.services.notifications import task_buffer
+from src.services.instrumentation import outbox_dispatched
+
+
+logger = logging.getLogger(__name__)
+
+
+# Запись задач в outbox в текущей транзакции (без коммита): задачи будут
+# отправлены брокеру, только если транзакция с сообщением завершится успешно
+async def add_outbox_tasks(
+    db: AsyncSession,
+    tasks: list[tuple[str, tuple]],
+    message_id: int | None = None,
+) -> None:
+    if not tasks:
+        return
+
+    await db.execute(
+        insert(OutboxORM),
+        [
+            {"task": task, "args": list(args), "message_id": message_id}
+            for task, args in tasks
+        ],
+    )
+
+
+# Ретранслятор outbox: забирает записанные задачи пачками, передает их брокеру
+# и удаляет из таблицы. На PostgreSQL пачка блокируется через FOR UPDATE
+# SKIP LOCKED, поэтому ретрансляторы нескольких воркеров не мешают друг другу;
+# на SQLite таблица просто опрашивается. Доставка "хотя бы один раз": если
+# после отправки брокеру удаление не зафиксировалось, задача уйдет повторно
+class OutboxRelay:
+    def __init__(self, batch_size: int = 500, poll_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+
+    # Сигнал о новых задачах (чтобы не ждать следующего опроса)
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                dispatched = await self.relay_batch()
+            except Exception as e:
+                logger.warning("Outbox relay failed: %s", e)
+                dispatched = 0
+
+            if dispatched == self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def relay_batch(self) -> int:
+        query = (
+            select(OutboxORM.id, OutboxORM.task, OutboxORM.args)
+            .order_by(OutboxORM.id)
+            .limit(self.batch_size)
+        )
+
+        async with async_session_factory() as db:
+            if db.bind.dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return 0
+
+            await task_buffer.send_batch([(row.task, tuple(row.args)) for row in rows])
+
+            await db.execute(
+                delete(OutboxORM).where(OutboxORM.id.in_([row.id for row in rows]))
+            )
+            await db.commit()
+
+        outbox_dispatched.inc(value=len(rows))
+        return len(rows)
+
+
+outbox_relay = OutboxRelay(
+    batch_size=app_settings.OUTBOX_BATCH_SIZE,
+    poll_interval=app_settings.OUTBOX_POLL_INTERVAL_SECONDS,
+)
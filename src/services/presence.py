@@ -0,0 +1,251 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from src.config import app_settings
+from src.services.connections import (
+    connection_registry,
+    deliver,
+    deliver_to_watchers,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Типы событий, которые обрабатываются только в памяти и никогда не попадают в БД
+EPHEMERAL_EVENT_TYPES = {"typing"}
+
+
+# Хранение статуса "в сети" и времени последнего визита в памяти процесса
+class InMemoryPresenceBackend:
+    def __init__(self):
+        self._online: dict[int, int] = {}
+        self._last_seen: dict[int, float] = {}
+
+    async def set_online(self, user_id: int) -> None:
+        self._online[user_id] = self._online.get(user_id, 0) + 1
+
+    async def set_offline(self, user_id: int) -> float:
+        count = self._online.get(user_id, 0) - 1
+        if count > 0:
+            self._online[user_id] = count
+        else:
+            self._online.pop(user_id, None)
+
+        last_seen = time.time()
+        self._last_seen[user_id] = last_seen
+        return last_seen
+
+    async def get_presence(self, user_id: int) -> tuple[bool, float | None]:
+        return user_id in self._online, self._last_seen.get(user_id)
+
+    async def filter_online(self, user_ids: list[int]) -> set[int]:
+        return {user_id for user_id in user_ids if user_id in self._online}
+
+    async def refresh_online(self, user_ids: list[int]) -> None:
+        pass
+
+
+# Хранение статуса в Redis, общее для всех воркеров
+class RedisPresenceBackend:
+    def __init__(self, redis_client, prefix: str = "presence", ttl: int = 300):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._redis = redis_client
+
+    def _online_key(self, user_id: int) -> str:
+        return f"{self.prefix}:online:{user_id}"
+
+    async def set_online(self, user_id: int) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(self._online_key(user_id))
+            pipe.expire(self._online_key(user_id), self.ttl)
+            await pipe.execute()
+
+    async def set_offline(self, user_id: int) -> float:
+        last_seen = time.time()
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.decr(self._online_key(user_id))
+            pipe.hset(f"{self.prefix}:last_seen", str(user_id), last_seen)
+            count, _ = await pipe.execute()
+
+        if count <= 0:
+            await self._redis.delete(self._online_key(user_id))
+
+        return last_seen
+
+    async def get_presence(self, user_id: int) -> tuple[bool, float | None]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.get(self._online_key(user_id))
+            pipe.hget(f"{self.prefix}:last_seen", str(user_id))
+            count, last_seen = await pipe.execute()
+
+        online = count is not None and int(count) > 0
+        return online, float(last_seen) if last_seen is not None else None
+
+    # Проверка статуса сразу для многих пользователей одним запросом MGET
+    async def filter_online(self, user_ids: list[int]) -> set[int]:
+        if not user_ids:
+            return set()
+
+        counts = await self._redis.mget([self._online_key(user_id) for user_id in user_ids])
+
+        return {
+            user_id
+            for user_id, count in zip(user_ids, counts)
+            if count is not None and int(count) > 0
+        }
+
+    # Продление срока жизни статуса: без него долгое подключение через ttl
+    # секунд выглядело бы для других воркеров как отключение
+    async def refresh_online(self, user_ids: list[int]) -> None:
+        if not user_ids:
+            return
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.expire(self._online_key(user_id), self.ttl)
+            await pipe.execute()
+
+
+def create_presence_backend(backend: str):
+    if backend == "redis":
+        from redis.asyncio import Redis
+
+        return RedisPresenceBackend(
+            Redis.from_url(app_settings.REDIS_URL), ttl=app_settings.PRESENCE_TTL_SECONDS
+        )
+
+    return InMemoryPresenceBackend()
+
+
+presence_backend = create_presence_backend(app_settings.PRESENCE_BACKEND)
+
+
+# Периодическое продление статуса пользователей, подключенных к этому воркеру
+# (задача на все время работы воркера)
+async def refresh_presence() -> None:
+    interval = app_settings.PRESENCE_TTL_SECONDS / 3
+
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            await presence_backend.refresh_online(connection_registry.online_users())
+        except Exception as e:
+            logger.warning("Could not refresh presence: %s", e)
+
+
+# Прореживание событий набора текста: в рамках одного диалога пересылается только
+# смена состояния, а повторный "start" - не чаще, чем раз в TYPING_THROTTLE_SECONDS
+class TypingThrottle:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._state: dict[tuple[int, int], tuple[bool, float]] = {}
+
+    def should_forward(self, sender_id: int, recipient_id: int, typing: bool) -> bool:
+        key = (sender_id, recipient_id)
+        now = time.monotonic()
+        previous = self._state.get(key)
+
+        if previous is None:
+            if not typing:
+                return False
+        elif previous[0] == typing:
+            if not typing or now - previous[1] < self.interval:
+                return False
+
+        self._state[key] = (typing, now)
+        return True
+
+    def forget(self, sender_id: int, recipient_id: int) -> bool:
+        previous = self._state.pop((sender_id, recipient_id), None)
+        return previous is not None and previous[0]
+
+
+typing_throttle = TypingThrottle(app_settings.TYPING_THROTTLE_SECONDS)
+
+
+def format_last_seen(last_seen: float | None) -> str | None:
+    if last_seen is None:
+        return None
+
+    return datetime.fromtimestamp(last_seen, tz=timezone.utc).isoformat()
+
+
+# Пользователи, которые не подключены ни к одному воркеру (им нужны уведомления)
+async def filter_offline(user_ids: list[int]) -> list[int]:
+    candidates = [
+        user_id for user_id in user_ids if not connection_registry.is_online(user_id)
+    ]
+    online_elsewhere = await presence_backend.filter_online(candidates)
+
+    return [user_id for user_id in candidates if user_id not in online_elsewhere]
+
+
+# Подключение пользователя: обновление статуса и уведомление собеседников
+async def user_connected(
+    user_id: int, peer_id: int | None, first_connection: bool
+) -> dict | None:
+    if first_connection:
+        await presence_backend.set_online(user_id)
+
+        await deliver_to_watchers(
+            user_id, {"type": "presence", "user_id": user_id, "status": "online"}
+        )
+
+    if peer_id is None:
+        return None
+
+    online, last_seen = await presence_backend.get_presence(peer_id)
+
+    # Состояние собеседника для только что подключившегося клиента
+    return {
+        "type": "presence",
+        "user_id": peer_id,
+        "status": "online" if online else "offline",
+        "last_seen": format_last_seen(last_seen),
+    }
+
+
+# Отключение пользователя: фиксация времени последнего визита
+async def user_disconnected(
+    user_id: int, peer_id: int | None, last_connection: bool
+) -> None:
+    if peer_id is not None and typing_throttle.forget(user_id, peer_id):
+        await deliver(
+            [peer_id], {"type": "typing", "user_id": user_id, "state": "stop"}
+        )
+
+    if not last_connection:
+        return
+
+    last_seen = await presence_backend.set_offline(user_id)
+
+    await deliver_to_watchers(
+        user_id,
+        {
+            "type": "presence",
+            "user_id": user_id,
+            "status": "offline",
+            "last_seen": format_last_seen(last_seen),
+        },
+    )
+
+
+# Обработка эфемерного события от клиента (без обращения к БД)
+async def handle_event(sender_id: int, recipient_id: int, event: dict) -> None:
+    if event.get("type") == "typing":
+        typing = event.get("state") == "start"
+
+        if typing_throttle.should_forward(sender_id, recipient_id, typing):
+            await deliver(
+                [recipient_id],
+                {
+                    "type": "typing",
+                    "user_id": sender_id,
+                    "state": "start" if typing else "stop",
+                },
+            )
@@ -0,0 +1,162 @@
+import math
+import time
+import asyncio
+import logging
+
+from fastapi import HTTPException, status
+
+from src.config import app_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Token bucket в памяти процесса: одна проверка - это пара операций со словарем,
+# поэтому накладные расходы не превышают единиц микросекунд. Полное ведро ничем
+# не отличается от отсутствующего, поэтому раз в время полного наполнения
+# (burst / rate) такие ведра удаляются и словарь не растет с числом ключей
+class InMemoryTokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = float(burst)
+        self._buckets: dict[int, list[float]] = {}
+        self._refill_time = self.burst / rate
+        self._next_sweep = time.monotonic() + self._refill_time
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _sweep(self, now: float) -> None:
+        full = [
+            key
+            for key, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self.rate >= self.burst
+        ]
+        for key in full:
+            del self._buckets[key]
+
+        self._next_sweep = now + self._refill_time
+
+    # Возвращает 0, если токен выдан, иначе - время (в секундах) до появления токена
+    def try_acquire(self, key: int) -> float:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            self._buckets[key] = [self.burst - 1.0, now]
+            return 0.0
+
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        bucket[1] = now
+
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return 0.0
+
+        bucket[0] = tokens
+        return (1.0 - tokens) / self.rate
+
+    async def acquire(self, key: int) -> float:
+        return self.try_acquire(key)
+
+
+# Скрипт выполняется атомарно на стороне Redis, поэтому лимит общий для всех воркеров
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+
+return tostring(retry_after)
+"""
+
+
+# Token bucket в Redis (клиент передается снаружи, что позволяет подставить fakeredis)
+class RedisTokenBucket:
+    def __init__(self, redis_client, rate: float, burst: int, prefix: str = "ratelimit"):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self._redis = redis_client
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: int) -> float:
+        try:
+            retry_after = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[self.rate, self.burst],
+            )
+        except Exception as e:
+            # При недоступности Redis не блокируем отправку сообщений
+            logger.warning("Rate limiter backend error: %s", e)
+            return 0.0
+
+        return float(retry_after)
+
+
+# Создание ограничителя в соответствии с настройками приложения
+def create_rate_limiter(rate: float, burst: int, backend: str, prefix: str):
+    if backend == "redis":
+        from redis.asyncio import Redis
+
+        redis_client = Redis.from_url(app_settings.REDIS_URL)
+        return RedisTokenBucket(redis_client, rate, burst, prefix=prefix)
+
+    return InMemoryTokenBucket(rate, burst)
+
+
+# Общий ограничитель для всех способов отправки сообщений (WebSocket, API, форма)
+message_rate_limiter = create_rate_limiter(
+    rate=app_settings.RATE_LIMIT_MESSAGES_PER_SECOND,
+    burst=app_settings.RATE_LIMIT_MESSAGES_BURST,
+    backend=app_settings.RATE_LIMIT_BACKEND,
+    prefix="ratelimit:messages",
+)
+
+
+# Проверка лимита для REST: при превышении - ответ 429 с заголовком Retry-After
+async def check_message_rate(user_id: int) -> None:
+    retry_after = await message_rate_limiter.acquire(user_id)
+
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many messages, slow down",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+# Мягкое ограничение для WebSocket: не читаем следующий кадр, пока не появится токен,
+# так что переполненный буфер сокета притормаживает самого клиента
+async def wait_message_rate(user_id: int) -> None:
+    retry_after = await message_rate_limiter.acquire(user_id)
+
+    while retry_after:
+        await asyncio.sleep(retry_after)
+        retry_after = await message_rate_limiter.acquire(user_id)
@@ -0,0 +1,251 @@
+import os
+import re
+import gzip
+import json
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text, select, insert, delete, union_all
+from sqlalchemy.engine import Connection, Engine
+
+from src.config import app_settings
+from src.data.message_codec import message_codec
+from src.models.message import MessageORM, MessageArchiveORM, MessageClientIdORM
+
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+ARCHIVE_COLUMNS = [column.name for column in MessageArchiveORM.__table__.columns]
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, count: int) -> date:
+    month_index = month.month - 1 + count
+    return date(month.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+# Архив подключается к чтению истории, только если он хранится в БД
+def archive_reads_enabled() -> bool:
+    return bool(app_settings.MESSAGE_RETENTION_DAYS) and (
+        app_settings.MESSAGE_ARCHIVE_MODE == "table"
+    )
+
+
+# Запрос истории сообщений: при включенном архиве к горячей таблице
+# прозрачно добавляются строки из messages_archive (UNION ALL).
+# where принимает модель (MessageORM или MessageArchiveORM) и возвращает условия
+def history_select(where):
+    hot = select(*[getattr(MessageORM, name) for name in ARCHIVE_COLUMNS]).where(
+        *where(MessageORM)
+    )
+
+    if not archive_reads_enabled():
+        return hot.order_by(MessageORM.timestamp)
+
+    cold = select(
+        *[getattr(MessageArchiveORM, name) for name in ARCHIVE_COLUMNS]
+    ).where(*where(MessageArchiveORM))
+
+    history = union_all(cold, hot).subquery()
+    return select(history).order_by(history.c.timestamp)
+
+
+# Список секций таблицы с их границами (только PostgreSQL)
+def list_partitions(connection: Connection, table: str) -> list[tuple[str, str, str]]:
+    rows = connection.execute(
+        text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    ).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND_PATTERN.search(bound or "")
+        if match:
+            partitions.append((name, match.group(1), match.group(2)))
+
+    return sorted(partitions, key=lambda partition: partition[2])
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+
+    relkind = connection.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :table"),
+        {"table": table},
+    ).scalar()
+    return relkind == "p"
+
+
+# Создание месячных секций наперед, чтобы новые строки не попадали в DEFAULT
+def ensure_future_partitions(connection: Connection, months_ahead: int) -> list[str]:
+    created = []
+    existing = {name for name, _, _ in list_partitions(connection, "messages")}
+    month = _month_start(date.today())
+
+    for _ in range(months_ahead + 1):
+        name = f"messages_{month:%Y_%m}"
+        next_month = _add_months(month, 1)
+
+        if name not in existing:
+            try:
+                with connection.begin_nested():
+                    connection.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF messages "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                            f"TO ('{next_month:%Y-%m-%d}')"
+                        )
+                    )
+                created.append(name)
+            except Exception as e:
+                # В DEFAULT уже есть строки из этого диапазона
+                logger.warning("Could not create partition %s: %s", name, e)
+
+        month = next_month
+
+    return created
+
+
+def _write_ndjson(path: str, rows) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    count = 0
+    with gzip.open(path, "at", encoding="utf-8") as archive_file:
+        for row in rows:
+            record = row._asdict()
+            # SELECT * возвращает текст в формате хранения
+            record["text"] = message_codec.decode(record["text"])
+            archive_file.write(json.dumps(record, default=str) + "\n")
+            count += 1
+
+    return count
+
+
+# Перенос целой холодной секции: в архивную таблицу (DETACH/ATTACH, без копирования)
+# или в сжатый NDJSON-файл с последующим удалением секции
+def archive_partition(connection: Connection, name: str, lower: str, upper: str) -> int:
+    count = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+
+    if app_settings.MESSAGE_ARCHIVE_MODE == "ndjson":
+        rows = connection.execution_options(yield_per=1000).execute(
+            text(f"SELECT * FROM {name} ORDER BY id")
+        )
+        path = os.path.join(app_settings.MESSAGE_ARCHIVE_DIR, f"{name}.ndjson.gz")
+        _write_ndjson(path, rows)
+
+        connection.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+    else:
+        connection.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        connection.execute(
+            text(
+                f"ALTER TABLE messages_archive ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            )
+        )
+
+    logger.info("Archived partition %s (%s rows)", name, count)
+    return count
+
+
+# Перенос строк старше cutoff пачками (SQLite или несекционированная таблица)
+def archive_rows(connection: Connection, cutoff: datetime, batch_size: int) -> int:
+    moved = 0
+    path = os.path.join(
+        app_settings.MESSAGE_ARCHIVE_DIR,
+        f"messages_before_{cutoff:%Y_%m_%d}.ndjson.gz",
+    )
+
+    while True:
+        rows = connection.execute(
+            select(*[getattr(MessageORM, name) for name in ARCHIVE_COLUMNS])
+            .where(MessageORM.timestamp < cutoff)
+            .order_by(MessageORM.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        if app_settings.MESSAGE_ARCHIVE_MODE == "ndjson":
+            _write_ndjson(path, rows)
+        else:
+            connection.execute(
+                insert(MessageArchiveORM), [row._asdict() for row in rows]
+            )
+
+        connection.execute(
+            delete(MessageORM).where(MessageORM.id.in_([row.id for row in rows]))
+        )
+        connection.commit()
+
+        moved += len(rows)
+
+    return moved
+
+
+# Удаление идентификаторов клиентских сообщений старше MESSAGE_CLIENT_ID_RETENTION_DAYS:
+# повторы отправки приходят в течение минут, а не дней
+def prune_client_message_ids(engine: Engine) -> int:
+    cutoff = datetime.now() - timedelta(
+        days=app_settings.MESSAGE_CLIENT_ID_RETENTION_DAYS
+    )
+
+    with engine.begin() as connection:
+        result = connection.execute(
+            delete(MessageClientIdORM).where(MessageClientIdORM.created_at < cutoff)
+        )
+
+    return result.rowcount
+
+
+# Применение политики хранения: секции messages создаются наперед всегда,
+# а перенос в архив всего, что старше MESSAGE_RETENTION_DAYS, - только если
+# срок задан. Каждая секция переносится в своей транзакции: DETACH держит
+# ACCESS EXCLUSIVE на messages только до фиксации переноса этой секции
+def apply_retention_policy(engine: Engine) -> dict:
+    report = {"created_partitions": [], "archived_partitions": [], "archived_rows": 0}
+    report["expired_client_ids"] = prune_client_message_ids(engine)
+
+    with engine.connect() as connection:
+        partitioned = is_partitioned(connection, "messages")
+
+        if partitioned:
+            report["created_partitions"] = ensure_future_partitions(
+                connection, app_settings.MESSAGE_PARTITION_MONTHS_AHEAD
+            )
+            connection.commit()
+
+        if not app_settings.MESSAGE_RETENTION_DAYS:
+            return report
+
+        cutoff = datetime.now() - timedelta(days=app_settings.MESSAGE_RETENTION_DAYS)
+
+        if partitioned:
+            for name, lower, upper in list_partitions(connection, "messages"):
+                if datetime.fromisoformat(upper) > cutoff:
+                    continue
+
+                report["archived_rows"] += archive_partition(
+                    connection, name, lower, upper
+                )
+                connection.commit()
+                report["archived_partitions"].append(name)
+        else:
+            report["archived_rows"] = archive_rows(
+                connection, cutoff, app_settings.MESSAGE_RETENTION_BATCH_SIZE
+            )
+
+    return report
@@ -0,0 +1,301 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.future import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.user import UserORM
+from src.models.room import RoomORM, RoomMemberORM
+from src.models.message import MessageORM
+from src.models.schemas import RoomResponseDTO, MessageResponseDTO
+from src.data.routing import replica_execute, replica_router
+import src.services.presence as presence_service
+
+from src.services.connections import deliver
+from src.services.broadcast import broadcast
+from src.services.outbox import add_outbox_tasks, outbox_relay
+from src.services.instrumentation import fanout_duration
+from src.services.retention import history_select
+from src.services.message_expiry import not_expired, expiry_time, expiry_wheel
+
+
+# Кэш состава групповых чатов в памяти воркера: id чата -> {id участника: ссылка на телеграм}.
+# Рассылка сообщения не требует запросов к БД для каждого участника.
+# Вместе с составом хранится срок жизни сообщений чата
+class RoomMembershipCache:
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._members: dict[int, dict[int, str | None]] = {}
+        self._message_ttls: dict[int, int | None] = {}
+        self._loaded_at: dict[int, float] = {}
+
+    def get_cached(self, room_id: int) -> dict[int, str | None] | None:
+        loaded_at = self._loaded_at.get(room_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            return None
+
+        return self._members[room_id]
+
+    def store(
+        self,
+        room_id: int,
+        members: dict[int, str | None],
+        message_ttl: int | None = None,
+    ) -> None:
+        self._members[room_id] = members
+        self._message_ttls[room_id] = message_ttl
+        self._loaded_at[room_id] = time.monotonic()
+
+    # Срок жизни сообщений чата из последней загрузки состава
+    def message_ttl(self, room_id: int) -> int | None:
+        return self._message_ttls.get(room_id)
+
+    def add(self, room_id: int, user_id: int, telegram_url: str | None) -> None:
+        members = self._members.get(room_id)
+        if members is not None:
+            members[user_id] = telegram_url
+
+    def discard(self, room_id: int, user_id: int) -> None:
+        members = self._members.get(room_id)
+        if members is not None:
+            members.pop(user_id, None)
+
+    # Удаление пользователя из состава всех закэшированных чатов
+    def discard_user(self, user_id: int) -> None:
+        for members in self._members.values():
+            members.pop(user_id, None)
+
+    def invalidate(self, room_id: int) -> None:
+        self._members.pop(room_id, None)
+        self._message_ttls.pop(room_id, None)
+        self._loaded_at.pop(room_id, None)
+
+
+room_membership = RoomMembershipCache()
+
+
+# Состав чата изменился на другом воркере: кэш перечитывается из БД
+async def _invalidate_room(room_id: int) -> None:
+    room_membership.invalidate(room_id)
+
+
+broadcast.subscribe("room_membership", _invalidate_room)
+
+
+# Получение состава группового чата (из кэша или одним запросом к БД)
+async def get_room_members(room_id: int, db: AsyncSession) -> dict[int, str | None]:
+    members = room_membership.get_cached(room_id)
+    if members is not None:
+        return members
+
+    result = await db.execute(
+        select(
+            RoomMemberORM.user_id, UserORM.telegram_url, RoomORM.message_ttl_seconds
+        )
+        .join(UserORM, UserORM.id == RoomMemberORM.user_id)
+        .join(RoomORM, RoomORM.id == RoomMemberORM.room_id)
+        .where(RoomMemberORM.room_id == room_id)
+    )
+    rows = result.all()
+    members = {user_id: telegram_url for user_id, telegram_url, _ in rows}
+
+    room_membership.store(room_id, members, rows[0][2] if rows else None)
+    return members
+
+
+# Получение группового чата по его id
+async def get_room_by_id(room_id: int, db: AsyncSession) -> RoomResponseDTO | None:
+    result = await db.execute(
+        select(
+            RoomORM.id, RoomORM.name, RoomORM.owner_id, RoomORM.message_ttl_seconds
+        ).where(RoomORM.id == room_id)
+    )
+    row = result.first()
+
+    if row:
+        return RoomResponseDTO.from_row(row)
+
+    return None
+
+
+# Получение групповых чатов, в которых состоит пользователь
+async def get_user_rooms(user_id: int, db: AsyncSession) -> list[RoomResponseDTO]:
+    result = await db.execute(
+        select(
+            RoomORM.id, RoomORM.name, RoomORM.owner_id, RoomORM.message_ttl_seconds
+        )
+        .join(RoomMemberORM, RoomMemberORM.room_id == RoomORM.id)
+        .where(RoomMemberORM.user_id == user_id)
+    )
+
+    return [RoomResponseDTO.from_row(row) for row in result.all()]
+
+
+# Проверка, занято ли название группового чата
+async def check_room_name_free(name: str, db: AsyncSession) -> bool:
+    result = await db.execute(select(RoomORM.id).where(RoomORM.name == name))
+    return result.first() is None
+
+
+# Создание группового чата, создатель сразу становится его участником
+async def create_room(name: str, owner_id: int, db: AsyncSession) -> RoomResponseDTO:
+    room_model = RoomORM(name=name, owner_id=owner_id, created_at=datetime.now())
+    db.add(room_model)
+    await db.flush()
+
+    db.add(RoomMemberORM(room_id=room_model.id, user_id=owner_id))
+
+    await db.commit()
+    await db.refresh(room_model)
+
+    return RoomResponseDTO.from_row(room_model)
+
+
+# Срок жизни новых сообщений чата (уже отправленные сообщения не меняются).
+# Кэш состава вместе со сроком сбрасывается на всех воркерах
+async def update_room_message_ttl(
+    room_id: int, message_ttl_seconds: int | None, db: AsyncSession
+) -> None:
+    await db.execute(
+        update(RoomORM)
+        .where(RoomORM.id == room_id)
+        .values(message_ttl_seconds=message_ttl_seconds)
+    )
+    await db.commit()
+
+    await broadcast.publish("room_membership", {"room_id": room_id})
+
+
+# Добавление участника в групповой чат; возвращает False, если он уже состоит в нем
+async def add_room_member(room_id: int, user_id: int, db: AsyncSession) -> bool:
+    db.add(RoomMemberORM(room_id=room_id, user_id=user_id))
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+    result = await db.execute(select(UserORM.telegram_url).where(UserORM.id == user_id))
+    room_membership.add(room_id, user_id, result.scalar())
+    await broadcast.publish("room_membership", {"room_id": room_id})
+
+    return True
+
+
+# Удаление участника из группового чата. Кэш состава сбрасывается на всех
+# воркерах: удаленный участник больше не получает сообщения чата и не может
+# писать в него через уже открытое соединение
+async def remove_room_member(room_id: int, user_id: int, db: AsyncSession) -> bool:
+    result = await db.execute(
+        delete(RoomMemberORM)
+        .where(RoomMemberORM.room_id == room_id)
+        .where(RoomMemberORM.user_id == user_id)
+    )
+    await db.commit()
+
+    room_membership.discard(room_id, user_id)
+    await broadcast.publish("room_membership", {"room_id": room_id})
+
+    return result.rowcount > 0
+
+
+# Сохранение сообщения в групповой чат (одна строка независимо от числа участников)
+# одним запросом INSERT ... RETURNING; outbox_tasks записываются в той же транзакции.
+# Срок жизни чата берется из кэша состава, загруженного перед отправкой
+async def create_room_message(
+    room_id: int,
+    sender_id: int,
+    text: str,
+    db: AsyncSession,
+    outbox_tasks: list[tuple[str, tuple]] | None = None,
+    ttl_seconds: int | None = None,
+) -> MessageResponseDTO:
+    outbox_tasks = outbox_tasks or []
+
+    now = datetime.now()
+    result = await db.execute(
+        insert(MessageORM)
+        .values(
+            sender_id=sender_id,
+            room_id=room_id,
+            text=text,
+            timestamp=now,
+            expires_at=expiry_time(
+                ttl_seconds, room_membership.message_ttl(room_id), now
+            ),
+        )
+        .returning(*MessageORM.__table__.columns)
+    )
+    row = result.one()
+    await add_outbox_tasks(db, outbox_tasks, row.id)
+    await db.commit()
+
+    replica_router.mark_write(sender_id)
+    if outbox_tasks:
+        outbox_relay.notify()
+
+    return MessageResponseDTO.from_row(row)
+
+
+# Получение истории сообщений группового чата (с учетом архива)
+async def get_room_messages(room_id: int, db: AsyncSession) -> list[MessageResponseDTO]:
+    result = await replica_execute(
+        db,
+        history_select(
+            lambda message: (
+                message.room_id == room_id,
+                message.deleted_at.is_(None),
+                not_expired(message),
+            )
+        ),
+    )
+    messages = [MessageResponseDTO.from_row(row) for row in result.all()]
+
+    members = room_membership.get_cached(room_id)
+    if members:
+        expiry_wheel.schedule_messages(messages, members)
+
+    return messages
+
+
+# Участники не в сети со ссылкой на телеграм, которым нужно уведомление
+# (участники, подключенные к другим воркерам, отсеиваются по статусу присутствия
+# и получают сообщение через fan_out_room_message)
+async def get_offline_room_members(
+    sender_id: int, members: dict[int, str | None]
+) -> list[tuple[int, str]]:
+    candidates = [
+        user_id
+        for user_id, telegram_url in members.items()
+        if user_id != sender_id and telegram_url
+    ]
+    offline = await presence_service.filter_offline(candidates)
+
+    return [(user_id, members[user_id]) for user_id in offline]
+
+
+# Рассылка сообщения участникам, подключенным к любому воркеру
+async def fan_out_room_message(
+    message: MessageResponseDTO,
+    sender_name: str,
+    members: dict[int, str | None],
+) -> None:
+    message_data = {
+        "type": "room_message",
+        "id": message.id,
+        "room_id": message.room_id,
+        "sender_id": message.sender_id,
+        "sender_name": sender_name,
+        "text": message.text,
+        "timestamp": message.timestamp.isoformat(),
+    }
+    if message.expires_at is not None:
+        message_data["expires_at"] = message.expires_at.isoformat()
+        expiry_wheel.schedule(message.id, message.expires_at, members)
+
+    started = time.perf_counter()
+    await deliver(members, message_data)
+    fanout_duration.observe(time.perf_counter() - started, "room")
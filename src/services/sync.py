@@ -0,0 +1,90 @@
+from sqlalchemy import column, or_, table, tuple_, union
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import app_settings
+from src.models.message import MessageORM, message_change_seq
+from src.models.room import RoomMemberORM
+from src.models.schemas import MessageSyncDTO, SyncResponseDTO
+from src.data.routing import replica_execute
+from src.services.messages import MESSAGE_COLUMNS
+from src.services.message_expiry import not_expired
+
+
+# Последний выданный номер последовательности change_seq (только PostgreSQL)
+change_seq_head = (
+    select(table(message_change_seq.name, column("last_value")).c.last_value)
+    .scalar_subquery()
+    .label("change_seq_head")
+)
+
+
+# Изменения сообщений пользователя после курсора (since, since_id): отправленные
+# им, полученные им и сообщения групповых чатов, где он состоит. Каждая часть
+# читается по своему индексу (..., change_seq) не дальше limit строк,
+# поэтому стоимость зависит от числа изменений, а не от размера истории.
+# Истекшие сообщения пропускаются, пока expire_messages не превратит их в
+# "надгробия": с новым change_seq они придут клиенту как удаленные
+async def get_changes_since(
+    user_id: int, since: int, since_id: int, limit: int, db: AsyncSession
+) -> SyncResponseDTO:
+    user_rooms = select(RoomMemberORM.room_id).where(RoomMemberORM.user_id == user_id)
+    visible = or_(MessageORM.deleted_at.is_not(None), not_expired(MessageORM))
+    # Одним UPDATE в SQLite несколько строк получают одинаковый change_seq,
+    # поэтому позиция сравнивается парой; первое условие - для индекса
+    after_cursor = (
+        MessageORM.change_seq >= since,
+        tuple_(MessageORM.change_seq, MessageORM.id) > tuple_(since, since_id),
+    )
+
+    parts = [
+        select(*MESSAGE_COLUMNS, MessageORM.change_seq)
+        .where(condition)
+        .where(*after_cursor)
+        .where(visible)
+        .order_by(MessageORM.change_seq, MessageORM.id)
+        .limit(limit + 1)
+        .subquery()
+        for condition in (
+            MessageORM.sender_id == user_id,
+            MessageORM.recipient_id == user_id,
+            MessageORM.room_id.in_(user_rooms),
+        )
+    ]
+
+    # UNION убирает повторы (сообщение самому себе, свое сообщение в групповом чате)
+    changes = union(*[select(part) for part in parts]).subquery()
+    query = select(changes).order_by(changes.c.change_seq, changes.c.id)
+
+    postgresql = db.bind.dialect.name == "postgresql"
+    if postgresql:
+        query = query.add_columns(change_seq_head)
+
+    result = await replica_execute(db, query.limit(limit + 1), user_id)
+    rows = result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    messages = [MessageSyncDTO.from_row(row) for row in rows]
+
+    # Номер, выданный транзакции, которая еще не зафиксирована, может оказаться
+    # меньше уже видимых. Последняя страница поэтому не сдвигает курсор дальше
+    # SYNC_CURSOR_SAFETY_WINDOW номеров от конца последовательности, и эти строки
+    # придут еще раз. Полные страницы сдвигают его до конца, иначе при большом
+    # числе свежих изменений клиент получал бы одну и ту же страницу
+    horizon = None
+    if postgresql and rows and not has_more:
+        horizon = rows[0].change_seq_head - app_settings.SYNC_CURSOR_SAFETY_WINDOW
+
+    cursor, cursor_id = since, since_id
+    for row in rows:
+        if horizon is not None and row.change_seq > horizon:
+            break
+        cursor, cursor_id = row.change_seq, row.id
+
+    return SyncResponseDTO.model_construct(
+        messages=messages,
+        cursor=cursor,
+        cursor_id=cursor_id,
+        has_more=has_more,
+    )
@@ -0,0 +1,68 @@
+# Миниатюры вложений. Построение выполняется воркером Celery, поэтому модуль
+# не импортирует веб-слой (FastAPI)
+
+import io
+import logging
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+from sqlalchemy.engine import Engine
+
+from src.config import app_settings
+from src.models.attachment import AttachmentORM
+from src.services.blob_store import blob_store
+
+
+logger = logging.getLogger(__name__)
+
+# Типы изображений, для которых строятся миниатюры
+THUMBNAIL_CONTENT_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp")
+
+
+def thumbnail_key(sha256: str) -> str:
+    return f"{sha256}.thumb.jpg"
+
+
+# Построение миниатюры (задача Celery). Pillow нужен только воркеру
+def generate_thumbnail(engine: Engine, attachment_id: int) -> str:
+    with engine.connect() as connection:
+        attachment = connection.execute(
+            select(AttachmentORM.sha256).where(AttachmentORM.id == attachment_id)
+        ).first()
+
+    if attachment is None:
+        return "missing"
+
+    key = thumbnail_key(attachment.sha256)
+    thumbnail_status = "ready"
+
+    if not blob_store.exists(key):
+        try:
+            from PIL import Image
+
+            with Image.open(blob_store.path(attachment.sha256)) as image:
+                image.thumbnail(
+                    (
+                        app_settings.ATTACHMENT_THUMBNAIL_SIZE,
+                        app_settings.ATTACHMENT_THUMBNAIL_SIZE,
+                    )
+                )
+                thumbnail = io.BytesIO()
+                image.convert("RGB").save(thumbnail, "JPEG", quality=85)
+
+            blob_store.save_bytes(key, thumbnail.getvalue())
+
+        except Exception:
+            logger.exception("Thumbnail of attachment %s failed", attachment_id)
+            thumbnail_status = "failed"
+
+    # Миниатюра общая для всех вложений с тем же содержимым
+    with engine.begin() as connection:
+        connection.execute(
+            update(AttachmentORM)
+            .where(AttachmentORM.sha256 == attachment.sha256)
+            .where(AttachmentORM.thumbnail_status == "pending")
+            .values(thumbnail_status=thumbnail_status)
+        )
+
+    return thumbnail_status
@@ -0,0 +1,111 @@
+# Фоновая часть удаления пользователя (см. src.services.user_deletion).
+# Модуль выполняется воркером Celery, поэтому не импортирует веб-слой (FastAPI)
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, update
+from sqlalchemy.future import select
+from sqlalchemy.engine import Engine
+
+from src.config import app_settings
+from src.models.user import UserORM
+from src.models.room import RoomORM, RoomMemberORM
+from src.models.message import MessageORM, MessageArchiveORM
+from src.models.user_deletion import UserDeletionORM
+from src.models.attachment import AttachmentORM
+
+
+logger = logging.getLogger(__name__)
+
+
+def _set_progress(connection, user_id: int, **values) -> None:
+    connection.execute(
+        update(UserDeletionORM)
+        .where(UserDeletionORM.user_id == user_id)
+        .values(**values)
+    )
+
+
+# Обнуление ссылок на пользователя в одном столбце пачками по batch_size строк:
+# каждая пачка - отдельная короткая транзакция, в которой обновляется и ход задачи
+def _anonymise_column(
+    engine: Engine, model, column_name: str, user_id: int, batch_size: int
+) -> int:
+    column = getattr(model, column_name)
+    total = 0
+
+    while True:
+        batch_ids = (
+            select(model.id)
+            .where(column == user_id)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+
+        with engine.begin() as connection:
+            result = connection.execute(
+                update(model)
+                .where(model.id.in_(batch_ids))
+                .where(column == user_id)
+                .values({column_name: None})
+                .execution_options(synchronize_session=False)
+            )
+            total += result.rowcount
+
+            _set_progress(
+                connection,
+                user_id,
+                messages_anonymised=UserDeletionORM.messages_anonymised
+                + result.rowcount,
+            )
+
+        if result.rowcount < batch_size:
+            return total
+
+
+# Фоновая часть удаления (задача Celery): сообщения пользователя в основной
+# таблице и в архиве обезличиваются пачками, затем удаляется строка пользователя.
+# Участие и владение чатами (и авторство вложений) снимаются явно, так как
+# SQLite не выполняет ON DELETE
+def run_user_deletion(engine: Engine, user_id: int) -> dict:
+    batch_size = app_settings.USER_DELETION_BATCH_SIZE
+
+    with engine.begin() as connection:
+        _set_progress(connection, user_id, status="running", error=None)
+
+    try:
+        anonymised = 0
+        for model in (MessageORM, MessageArchiveORM):
+            for column_name in ("sender_id", "recipient_id"):
+                anonymised += _anonymise_column(
+                    engine, model, column_name, user_id, batch_size
+                )
+
+        with engine.begin() as connection:
+            connection.execute(
+                delete(RoomMemberORM).where(RoomMemberORM.user_id == user_id)
+            )
+            connection.execute(
+                update(RoomORM)
+                .where(RoomORM.owner_id == user_id)
+                .values(owner_id=None)
+            )
+            connection.execute(
+                update(AttachmentORM)
+                .where(AttachmentORM.uploader_id == user_id)
+                .values(uploader_id=None)
+            )
+            connection.execute(delete(UserORM).where(UserORM.id == user_id))
+            _set_progress(
+                connection, user_id, status="done", finished_at=datetime.now()
+            )
+
+    except Exception as e:
+        logger.exception("Deletion of user %s failed", user_id)
+        with engine.begin() as connection:
+            _set_progress(connection, user_id, status="failed", error=str(e))
+        raise
+
+    return {"user_id": user_id, "messages_anonymised": anonymised}
+
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+from fastapi import status
+from sqlalchemy import insert, update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.user import UserORM
+from src.models.user_deletion import UserDeletionORM
+from src.models.schemas import UserDeletionDTO
+
+from src.config import app_settings
+from src.services.auth import revoke_user
+from src.services.rooms import room_membership
+from src.services.broadcast import broadcast
+from src.services.connections import connection_registry
+from src.services.outbox import add_outbox_tasks, outbox_relay
+
+
+# Фоновая часть удаления - src.services.user_anonymisation (задача Celery)
+DELETE_USER_DATA = "celery_app.tasks.delete_user_data"
+
+
+# Запрос на удаление пользователя. В одной транзакции пользователь помечается
+# удаленным (скрывается из списков и не может войти) и записывается задача
+# в outbox; сама работа с историей выполняется фоновой задачей частями.
+# Повторный запрос возвращает текущий ход задачи (упавшая задача ставится заново)
+async def request_user_deletion(
+    user_id: int, db: AsyncSession
+) -> UserDeletionDTO | None:
+    result = await db.execute(select(UserORM.id).where(UserORM.id == user_id))
+    if result.first() is None:
+        return None
+
+    deletion = await get_user_deletion(user_id, db)
+
+    if deletion is None:
+        await db.execute(
+            update(UserORM)
+            .where(UserORM.id == user_id)
+            .values(deleted_at=datetime.now())
+        )
+        await db.execute(
+            insert(UserDeletionORM).values(
+                user_id=user_id,
+                status="pending",
+                messages_anonymised=0,
+                requested_at=datetime.now(),
+            )
+        )
+
+    elif deletion.status == "failed":
+        await db.execute(
+            update(UserDeletionORM)
+            .where(UserDeletionORM.user_id == user_id)
+            .values(status="pending", error=None)
+        )
+
+    else:
+        return deletion
+
+    await add_outbox_tasks(db, [(DELETE_USER_DATA, (user_id,))])
+    await db.commit()
+
+    outbox_relay.notify()
+    await evict_user(user_id)
+
+    return await get_user_deletion(user_id, db)
+
+
+async def get_user_deletion(user_id: int, db: AsyncSession) -> UserDeletionDTO | None:
+    result = await db.execute(
+        select(*UserDeletionORM.__table__.columns).where(
+            UserDeletionORM.user_id == user_id
+        )
+    )
+    row = result.first()
+
+    if row:
+        return UserDeletionDTO.model_validate(row._asdict())
+
+    return None
+
+
+# Удаление пользователя из памяти всех воркеров: его токены больше
+# не принимаются, открытые сокеты закрываются, а кэши, где он мог остаться,
+# сбрасываются
+async def evict_user(user_id: int) -> None:
+    await broadcast.publish("user_evicted", {"user_id": user_id})
+
+
+async def _evict_user(user_id: int) -> None:
+    revoke_user(user_id)
+    await connection_registry.close_user(user_id, status.WS_1008_POLICY_VIOLATION)
+    room_membership.discard_user(user_id)
+
+
+broadcast.subscribe("user_evicted", _evict_user)
+
+
+# Пользователи, удаленные до запуска воркера, пока выданные им токены
+# не истекли (запись в user_deletions остается и после удаления строки)
+async def load_revoked_users(db: AsyncSession) -> None:
+    since = datetime.now() - timedelta(minutes=app_settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    result = await db.execute(
+        select(UserDeletionORM.user_id, UserDeletionORM.requested_at).where(
+            UserDeletionORM.requested_at > since
+        )
+    )
+
+    for user_id, requested_at in result.all():
+        revoke_user(user_id, requested_at.timestamp())
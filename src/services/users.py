@@ -1,7 +1,9 @@
+from sqlalchemy import func, union
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.services.auth import bcrypt_context
+from src.services.auth import hash_password
+from src.data.routing import replica_execute
 
 from src.models.user import UserORM, RoleEnumORM
 from src.models.message import MessageORM
@@ -13,6 +15,16 @@ from src.models.schemas import (
 )
 
 
+# Столбцы, из которых собирается UserResponseDTO (без хеша пароля)
+USER_COLUMNS = (
+    UserORM.id,
+    UserORM.username,
+    UserORM.email,
+    UserORM.telegram_url,
+    UserORM.role,
+)
+
+
 # Проверка, занято ли данное имя пользователя
 async def check_username_free(username: str, db: AsyncSession) -> bool:
     result = await db.execute(select(UserORM).where(UserORM.username == username))
@@ -27,19 +39,55 @@ async def check_email_free(email: str, db: AsyncSession) -> bool:
 
 # Получение всех пользователей
 async def get_all_users(db: AsyncSession) -> list[UserResponseDTO]:
-    result = await db.execute(select(UserORM))
-    user_models = result.scalars().all()
+    result = await replica_execute(
+        db, select(*USER_COLUMNS).where(UserORM.deleted_at.is_(None))
+    )
 
-    return [UserResponseDTO.model_validate(user.__dict__) for user in user_models]
+    return [UserResponseDTO.from_row(row) for row in result.all()]
 
 
 # Получение пользователя по его id
 async def get_user_by_id(user_id: int, db: AsyncSession) -> UserResponseDTO | None:
-    user_model = await db.execute(select(UserORM).where(UserORM.id == user_id))
-    user_model = user_model.scalars().first()
+    result = await db.execute(
+        select(*USER_COLUMNS)
+        .where(UserORM.id == user_id)
+        .where(UserORM.deleted_at.is_(None))
+    )
+    row = result.first()
 
-    if user_model:
-        return UserResponseDTO.model_validate(user_model.__dict__)
+    if row:
+        return UserResponseDTO.from_row(row)
+
+    return None
+
+
+# Отметка изменений списка пользователей для ETag и ключа отрисованного
+# списка на страницах: создание, изменение
+# и мягкое удаление выдают новый change_seq (индекс по столбцу). Окончательное
+# удаление строки может вернуть max(change_seq) к прежнему значению, поэтому
+# в отметку входит и число строк: новые и измененные строки получают change_seq
+# из последовательности, больше любого выданного, и пара не повторяется
+# для другого состава таблицы
+async def get_users_change_marker(db: AsyncSession) -> tuple[int, int]:
+    result = await replica_execute(
+        db, select(func.coalesce(func.max(UserORM.change_seq), 0), func.count())
+    )
+    last_change_seq, count = result.one()
+
+    return last_change_seq, count
+
+
+# Отметка изменений пользователя для ETag (None - пользователя нет)
+async def get_user_change_marker(user_id: int, db: AsyncSession) -> int | None:
+    result = await db.execute(
+        select(UserORM.change_seq)
+        .where(UserORM.id == user_id)
+        .where(UserORM.deleted_at.is_(None))
+    )
+    row = result.first()
+
+    if row:
+        return row.change_seq or 0
 
     return None
 
@@ -48,11 +96,15 @@ async def get_user_by_id(user_id: int, db: AsyncSession) -> UserResponseDTO | No
 async def get_user_by_username(
     username: str, db: AsyncSession
 ) -> UserResponseDTO | None:
-    user_model = await db.execute(select(UserORM).where(UserORM.username == username))
-    user_model = user_model.scalars().first()
+    result = await db.execute(
+        select(*USER_COLUMNS)
+        .where(UserORM.username == username)
+        .where(UserORM.deleted_at.is_(None))
+    )
+    row = result.first()
 
-    if user_model:
-        return UserResponseDTO.model_validate(user_model.__dict__)
+    if row:
+        return UserResponseDTO.from_row(row)
 
     return None
 
@@ -60,29 +112,21 @@ async def get_user_by_username(
 # Получение пользователей, с которыми переписывался указанный пользователь
 # (кому он отправлял и от кого получал хотя бы одно сообщение)
 async def get_connected_users(user_id: int, db: AsyncSession) -> list[UserResponseDTO]:
-    subquery = await db.execute(
-        select(MessageORM.sender_id).filter(MessageORM.recipient_id == user_id)
+    peer_ids = union(
+        select(MessageORM.sender_id).where(MessageORM.recipient_id == user_id),
+        select(MessageORM.recipient_id).where(MessageORM.sender_id == user_id),
     )
-    sender_ids = subquery.scalars().all()
-
-    subquery = await db.execute(
-        select(MessageORM.recipient_id).filter(MessageORM.sender_id == user_id)
-    )
-    recipient_ids = subquery.scalars().all()
-
-    unique_ids = set(sender_ids) | set(recipient_ids)
 
-    connected_user_models = await db.execute(
-        select(UserORM)
-        .filter(UserORM.id.in_(unique_ids))
-        .filter(UserORM.id != user_id)
-        .distinct()
+    result = await replica_execute(
+        db,
+        select(*USER_COLUMNS)
+        .where(UserORM.id.in_(peer_ids))
+        .where(UserORM.id != user_id)
+        .where(UserORM.deleted_at.is_(None)),
+        user_id,
     )
-    connected_user_models = connected_user_models.scalars().all()
 
-    return [
-        UserResponseDTO.model_validate(user.__dict__) for user in connected_user_models
-    ]
+    return [UserResponseDTO.from_row(row) for row in result.all()]
 
 
 # Сохранение нового пользователя в БД
@@ -95,7 +139,7 @@ async def create_user(
         username=user.username,
         email=user.email,
         telegram_url=user.telegram_url,
-        hashed_password=bcrypt_context.hash(user.password),
+        hashed_password=await hash_password(user.password),
         role=RoleEnumORM.admin if user.role == RoleEnumDTO.admin else RoleEnumORM.user,
     )
     db.add(new_user_model)
@@ -103,7 +147,7 @@ async def create_user(
     await db.commit()
     await db.refresh(new_user_model)
 
-    return UserResponseDTO.model_validate(new_user_model.__dict__)
+    return UserResponseDTO.from_row(new_user_model)
 
 
 # Изменение параметров пользователя (имя, почта, пароль, ссылка на телеграм)
@@ -125,7 +169,7 @@ async def update_user(
         user_model.telegram_url = updated_user.new_telegram_url
 
     if updated_user.new_password:
-        user_model.hashed_password = bcrypt_context.hash(updated_user.new_password)
+        user_model.hashed_password = await hash_password(updated_user.new_password)
 
     if updated_user.new_role:
         user_model.role = (
@@ -137,18 +181,5 @@ async def update_user(
     await db.commit()
     await db.refresh(user_model)
 
-    return UserResponseDTO.model_validate(user_model.__dict__)
-
-
-# Удаление пользователя из БД по его id
-async def delete_user(user_id: int, db: AsyncSession) -> UserResponseDTO | None:
-    user_model = await db.execute(select(UserORM).where(UserORM.id == user_id))
-    user_model = user_model.scalars().first()
-
-    if not user_model:
-        return None
-
-    await db.delete(user_model)
-    await db.commit()
+    return UserResponseDTO.from_row(user_model)
 
-    return UserResponseDTO.model_validate(user_model.__dict__)
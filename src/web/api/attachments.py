@@ -0,0 +1,154 @@
+import os
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from src.config import app_settings
+from src.models.schemas import AttachmentDTO
+from src.web.api.auth import api_user_dependency
+from src.data.dependencies import async_db_dependency
+
+import src.services.attachments as attachments_service
+from src.services.blob_store import blob_store
+from src.data.query_counter import query_budget
+
+
+router = APIRouter(prefix="/api/attachments", tags=["attachments"])
+
+# Содержимое по id вложения не меняется
+BLOB_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def upload_filename(request: Request) -> str:
+    filename = request.headers.get("x-filename") or request.query_params.get(
+        "filename", ""
+    )
+    filename = os.path.basename(filename.replace("\\", "/"))[:255]
+
+    return filename or "file"
+
+
+# Загрузка файла телом запроса (Content-Type - тип файла, имя - в заголовке
+# X-Filename или параметре filename). Тело читается потоком и сразу пишется
+# в хранилище; ответ - описание вложения для attachment_ids при отправке сообщения
+@router.post("/", response_model=AttachmentDTO, status_code=status.HTTP_201_CREATED)
+@query_budget(2)
+async def upload_attachment(
+    request: Request,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> AttachmentDTO:
+    max_bytes = app_settings.ATTACHMENT_MAX_BYTES
+    content_length = request.headers.get("content-length")
+
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Attachment is larger than {max_bytes} bytes",
+        )
+
+    content_type = request.headers.get("content-type", "application/octet-stream")
+
+    return await attachments_service.create_attachment(
+        uploader_id=current_user.id,
+        filename=upload_filename(request),
+        content_type=content_type.split(";")[0].strip().lower(),
+        chunks=request.stream(),
+        db=db,
+    )
+
+
+async def get_accessible_attachment(
+    attachment_id: int, user_id: int, db
+) -> AttachmentDTO:
+    attachment = await attachments_service.get_attachment(attachment_id, db)
+
+    if attachment is None or not await attachments_service.can_access_attachment(
+        attachment_id, user_id, db
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found",
+        )
+
+    return attachment
+
+
+# Отдача файла из хранилища: через nginx (X-Accel-Redirect), если он настроен,
+# иначе FileResponse (sendfile, поддержка Range). Встраивать в страницу можно
+# только изображения, остальное скачивается как файл
+def blob_response(key: str, content_type: str, filename: str) -> Response:
+    disposition = (
+        "inline"
+        if content_type in attachments_service.THUMBNAIL_CONTENT_TYPES
+        else "attachment"
+    )
+    headers = {
+        "Cache-Control": BLOB_CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff",
+    }
+
+    prefix = app_settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        headers["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + (
+            blob_store.relative_path(key).replace(os.sep, "/")
+        )
+        headers["Content-Disposition"] = (
+            f"{disposition}; filename*=utf-8''{quote(filename)}"
+        )
+        return Response(media_type=content_type, headers=headers)
+
+    return FileResponse(
+        blob_store.path(key),
+        media_type=content_type,
+        filename=filename,
+        content_disposition_type=disposition,
+        headers=headers,
+    )
+
+
+@router.get("/{attachment_id}", response_model=AttachmentDTO)
+@query_budget(2)
+async def get_attachment(
+    attachment_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> AttachmentDTO:
+    return await get_accessible_attachment(attachment_id, current_user.id, db)
+
+
+@router.get("/{attachment_id}/content")
+@query_budget(2)
+async def download_attachment(
+    attachment_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> Response:
+    attachment = await get_accessible_attachment(attachment_id, current_user.id, db)
+
+    return blob_response(
+        attachment.sha256, attachment.content_type, attachment.filename
+    )
+
+
+@router.get("/{attachment_id}/thumbnail")
+@query_budget(2)
+async def download_thumbnail(
+    attachment_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> Response:
+    attachment = await get_accessible_attachment(attachment_id, current_user.id, db)
+
+    if attachment.thumbnail_status != "ready":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Thumbnail is {attachment.thumbnail_status}",
+        )
+
+    return blob_response(
+        attachments_service.thumbnail_key(attachment.sha256),
+        "image/jpeg",
+        os.path.splitext(attachment.filename)[0] + ".thumb.jpg",
+    )
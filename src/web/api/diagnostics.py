@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from src.models.schemas import RoleEnumDTO
+from src.web.api.auth import api_user_dependency
+from src.services.loop_watchdog import loop_watchdog
+
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+
+def check_admin(current_user) -> None:
+    if current_user.role != RoleEnumDTO.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can access diagnostics",
+        )
+
+
+# Обратные вызовы, дольше всего блокировавшие цикл событий
+@router.get("/loop-stalls")
+async def get_loop_stalls(current_user: api_user_dependency, limit: int = 10) -> dict:
+    check_admin(current_user)
+
+    return {
+        "enabled": loop_watchdog.running,
+        "threshold_ms": loop_watchdog.threshold * 1000,
+        "sample_interval_ms": loop_watchdog.sample_interval * 1000,
+        "top_offenders": loop_watchdog.top_offenders(limit),
+        "recent_stalls": loop_watchdog.recent_stalls(),
+    }
+
+
+# Снятые стеки в свернутом формате для построения flamegraph
+@router.get("/loop-stalls/collapsed", response_class=PlainTextResponse)
+async def get_loop_stalls_collapsed(current_user: api_user_dependency):
+    check_admin(current_user)
+
+    return PlainTextResponse(loop_watchdog.collapsed())
@@ -1,69 +1,116 @@
 from typing import List
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 
 from src.web.api.auth import api_user_dependency
-from src.models.schemas import MessageCreateDTO, MessageResponseDTO
+from src.models.schemas import (
+    MessageCreateDTO,
+    MessageUpdateDTO,
+    MessageResponseDTO,
+    message_list_adapter,
+)
 from src.data.dependencies import async_db_dependency
+from src.web.http_cache import make_etag, etag_matches, not_modified, json_response
 
-import src.services.users as users_service
 import src.services.messages as messages_service
+import src.services.rate_limit as rate_limit_service
+from src.services.instrumentation import messages_ingested
+from src.data.query_counter import query_budget
 
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
 
+# Список сериализуется напрямую, без повторной валидации по response_model.
+# Если с прошлого запроса клиента ничего не изменилось, история не читается (304)
 @router.get("/", response_model=List[MessageResponseDTO])
+@query_budget(2)
 async def get_all_dialog_messages(
+    request: Request,
     db: async_db_dependency,
     current_user: api_user_dependency,
-) -> list[MessageResponseDTO]:
-    return await messages_service.get_user_dialog_messages(current_user.id, db)
+) -> Response:
+    marker = await messages_service.get_dialog_change_marker(current_user.id, db)
+    etag = make_etag("messages", current_user.id, *marker)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    messages = await messages_service.get_user_dialog_messages(current_user.id, db)
+
+    return json_response(message_list_adapter.dump_json(messages), etag)
 
 
+# Повтор с тем же client_msg_id возвращает исходное сообщение с кодом 200.
+# Бюджет - худший случай: INSERT сообщения, INSERT client_msg_id и привязка
+# вложений (в SQLite изменяющие запросы нельзя объединить в один через CTE)
 @router.post(
     "/",
     response_model=MessageResponseDTO,
     status_code=status.HTTP_201_CREATED,
 )
+@query_budget(3)
 async def send_message(
     new_message: MessageCreateDTO,
+    response: Response,
     db: async_db_dependency,
     current_user: api_user_dependency,
 ) -> MessageResponseDTO:
-    user = await users_service.get_user_by_id(current_user.id, db)
-
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with id={new_message.recipient_id} not found",
-        )
+    await rate_limit_service.check_message_rate(current_user.id)
 
-    return await messages_service.create_message(
+    message, created = await messages_service.create_message_once(
         sender_id=current_user.id,
         recipient_id=new_message.recipient_id,
         text=new_message.text,
         db=db,
+        client_msg_id=new_message.client_msg_id,
+        attachment_ids=new_message.attachment_ids,
+        ttl_seconds=new_message.ttl_seconds,
     )
 
+    if created:
+        messages_ingested.inc("api")
+    else:
+        response.status_code = status.HTTP_200_OK
 
-@router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_message(
+    return message
+
+
+@router.patch("/{message_id}", response_model=MessageResponseDTO)
+@query_budget(1)
+async def edit_message(
     message_id: int,
+    updated_message: MessageUpdateDTO,
     db: async_db_dependency,
     current_user: api_user_dependency,
-):
-    message = await messages_service.get_message_by_id(message_id, db)
+) -> MessageResponseDTO:
+    message = await messages_service.edit_message(
+        message_id, current_user.id, updated_message.text, db
+    )
 
     if message is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Message not found",
+            detail="Message not found or you are not its sender",
         )
 
-    if message.sender_id != current_user.id:
+    await messages_service.broadcast_message_event("message_edited", message)
+
+    return message
+
+
+@router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(1)
+async def delete_message(
+    message_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+):
+    message = await messages_service.delete_messages(message_id, current_user.id, db)
+
+    if message is None:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete your own messages",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found or you are not its sender",
         )
 
-    await messages_service.delete_messages(message_id, db)
+    await messages_service.broadcast_message_event("message_deleted", message)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.services.instrumentation import registry
+
+
+router = APIRouter(tags=["metrics"])
+
+
+# Метрики в текстовом формате Prometheus. Реестр свой у каждого процесса:
+# при запуске через src.server (несколько воркеров) ответ содержит метрики
+# только того воркера, который принял запрос, поэтому Prometheus должен
+# опрашивать каждый воркер отдельно либо работать с одним воркером на контейнер
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,195 @@
+from fastapi import APIRouter, HTTPException, Response, status
+
+from src.models.schemas import (
+    RoomCreateDTO,
+    RoomUpdateDTO,
+    RoomResponseDTO,
+    RoomMemberAddDTO,
+    RoomMessageCreateDTO,
+    MessageResponseDTO,
+    room_list_adapter,
+    message_list_adapter,
+)
+from src.web.api.auth import api_user_dependency
+from src.data.dependencies import async_db_dependency
+
+import src.services.rooms as rooms_service
+import src.services.users as users_service
+import src.services.rate_limit as rate_limit_service
+
+import src.services.notifications as notifications_service
+from src.services.instrumentation import messages_ingested
+
+
+router = APIRouter(prefix="/api/rooms", tags=["rooms"])
+
+
+@router.get("/", response_model=list[RoomResponseDTO])
+async def get_my_rooms(
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> Response:
+    rooms = await rooms_service.get_user_rooms(current_user.id, db)
+
+    return Response(room_list_adapter.dump_json(rooms), media_type="application/json")
+
+
+@router.post("/", response_model=RoomResponseDTO, status_code=status.HTTP_201_CREATED)
+async def create_room(
+    new_room: RoomCreateDTO,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> RoomResponseDTO:
+    if not await rooms_service.check_room_name_free(new_room.name, db):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Room with this name already exists",
+        )
+
+    return await rooms_service.create_room(new_room.name, current_user.id, db)
+
+
+# Изменение настроек чата (выполняет создатель чата): срок жизни новых сообщений
+@router.patch("/{room_id}", response_model=RoomResponseDTO)
+async def update_room(
+    room_id: int,
+    room_update: RoomUpdateDTO,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> RoomResponseDTO:
+    room = await rooms_service.get_room_by_id(room_id, db)
+
+    if room is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found",
+        )
+
+    if room.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the room owner can change room settings",
+        )
+
+    # Поле, которого нет в запросе, не меняется; явный null отключает срок жизни
+    if "message_ttl_seconds" not in room_update.model_fields_set:
+        return room
+
+    await rooms_service.update_room_message_ttl(
+        room_id, room_update.message_ttl_seconds, db
+    )
+
+    return room.model_copy(
+        update={"message_ttl_seconds": room_update.message_ttl_seconds}
+    )
+
+
+# Добавление участника (выполняет создатель чата)
+@router.post("/{room_id}/members", status_code=status.HTTP_204_NO_CONTENT)
+async def add_room_member(
+    room_id: int,
+    new_member: RoomMemberAddDTO,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+):
+    room = await rooms_service.get_room_by_id(room_id, db)
+
+    if room is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found",
+        )
+
+    if room.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the room owner can add members",
+        )
+
+    if await users_service.get_user_by_id(new_member.user_id, db) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    await rooms_service.add_room_member(room_id, new_member.user_id, db)
+
+
+# Выход из группового чата
+@router.post("/{room_id}/leave", status_code=status.HTTP_204_NO_CONTENT)
+async def leave_room(
+    room_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+):
+    if not await rooms_service.remove_room_member(room_id, current_user.id, db):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="You are not a member of this room",
+        )
+
+
+@router.get("/{room_id}/messages", response_model=list[MessageResponseDTO])
+async def get_room_messages(
+    room_id: int,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> Response:
+    members = await rooms_service.get_room_members(room_id, db)
+
+    if current_user.id not in members:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not a member of this room",
+        )
+
+    messages = await rooms_service.get_room_messages(room_id, db)
+
+    return Response(
+        message_list_adapter.dump_json(messages), media_type="application/json"
+    )
+
+
+@router.post(
+    "/{room_id}/messages",
+    response_model=MessageResponseDTO,
+    status_code=status.HTTP_201_CREATED,
+)
+async def send_room_message(
+    room_id: int,
+    new_message: RoomMessageCreateDTO,
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+) -> MessageResponseDTO:
+    await rate_limit_service.check_message_rate(current_user.id)
+
+    members = await rooms_service.get_room_members(room_id, db)
+
+    if current_user.id not in members:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not a member of this room",
+        )
+
+    offline_members = await rooms_service.get_offline_room_members(
+        current_user.id, members
+    )
+
+    message = await rooms_service.create_room_message(
+        room_id,
+        current_user.id,
+        new_message.text,
+        db,
+        outbox_tasks=[
+            notifications_service.telegram_notification_task(
+                telegram_url, current_user.username, new_message.text
+            )
+            for _, telegram_url in offline_members
+        ],
+        ttl_seconds=new_message.ttl_seconds,
+    )
+    messages_ingested.inc("room_api")
+
+    await rooms_service.fan_out_room_message(message, current_user.username, members)
+
+    return message
@@ -0,0 +1,35 @@
+from typing import Annotated
+from fastapi import APIRouter, Query, Response
+
+from src.config import app_settings
+from src.web.api.auth import api_user_dependency
+from src.models.schemas import SyncResponseDTO
+from src.data.dependencies import async_db_dependency
+
+import src.services.sync as sync_service
+from src.data.query_counter import query_budget
+
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+
+# Догоняющая синхронизация клиента за один запрос: все новые, измененные
+# и удаленные сообщения во всех диалогах и групповых чатах после курсора.
+# Пока has_more истинно, клиент повторяет запрос с полученными cursor и cursor_id.
+# Сообщение может прийти повторно, клиент сверяет его по id и version
+@router.get("/", response_model=SyncResponseDTO)
+@query_budget(1)
+async def sync(
+    db: async_db_dependency,
+    current_user: api_user_dependency,
+    since: Annotated[int, Query(ge=0)] = 0,
+    since_id: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[
+        int, Query(ge=1, le=app_settings.SYNC_MAX_PAGE_SIZE)
+    ] = app_settings.SYNC_PAGE_SIZE,
+) -> Response:
+    changes = await sync_service.get_changes_since(
+        current_user.id, since, since_id, limit, db
+    )
+
+    return Response(changes.model_dump_json(), media_type="application/json")
@@ -1,47 +1,76 @@
-from fastapi import APIRouter, HTTPException, status
-from passlib.context import CryptContext
+from fastapi import APIRouter, HTTPException, Request, Response, status
 
 from src.models.schemas import (
     UserCreateDTO,
     UserResponseDTO,
     UserUpdateDTO,
     RoleEnumDTO,
+    UserDeletionDTO,
+    user_list_adapter,
 )
 from src.web.api.auth import api_user_dependency
 from src.data.dependencies import async_db_dependency
+from src.web.http_cache import make_etag, etag_matches, not_modified, json_response
 
 import src.services.users as users_service
+import src.services.user_deletion as user_deletion_service
 
 router = APIRouter(prefix="/api/users", tags=["users"])
-bcrypt_context = CryptContext(schemes=["bcrypt"])
 
 
+# Список сериализуется напрямую, без повторной валидации по response_model.
+# ETag строится из номера последнего изменения и числа пользователей: совпадение
+# с If-None-Match дает 304 без чтения списка
 @router.get("/", response_model=list[UserResponseDTO])
 async def get_users(
+    request: Request,
     db: async_db_dependency,
     current_user: api_user_dependency,
-) -> list[UserResponseDTO]:
+) -> Response:
+    if current_user.role == RoleEnumDTO.admin:
+        marker = await users_service.get_users_change_marker(db)
+        etag = make_etag("users", "all", *marker)
+    else:
+        marker = await users_service.get_user_change_marker(current_user.id, db)
+        etag = make_etag("users", current_user.id, marker)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     if current_user.role == RoleEnumDTO.admin:
         users = await users_service.get_all_users(db)
-        return users
 
     else:
-        current_user = await users_service.get_user_by_id(current_user.id, db)
-        return [current_user]
+        users = [await users_service.get_user_by_id(current_user.id, db)]
+
+    return json_response(user_list_adapter.dump_json(users), etag)
 
 
 @router.get("/{user_id}", response_model=UserResponseDTO)
 async def get_user_by_id(
     user_id: int,
+    request: Request,
     db: async_db_dependency,
     current_user: api_user_dependency,
-) -> UserResponseDTO:
+) -> Response:
     if (current_user.id != user_id) and current_user.role != RoleEnumDTO.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions to access this user",
         )
 
+    marker = await users_service.get_user_change_marker(user_id, db)
+
+    if marker is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    etag = make_etag("user", user_id, marker)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     user = await users_service.get_user_by_id(user_id, db)
 
     if user is None:
@@ -50,7 +79,7 @@ async def get_user_by_id(
             detail="User not found",
         )
 
-    return user
+    return json_response(user.model_dump_json(), etag)
 
 
 @router.post("/", response_model=UserResponseDTO, status_code=status.HTTP_201_CREATED)
@@ -156,17 +185,54 @@ async def update_user(
     return await users_service.update_user(old_user.id, updated_user, db)
 
 
-# Удаление пользователя
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+# Удаление пользователя: он сразу скрывается, а история обезличивается
+# фоновой задачей, ход которой возвращается в ответе
+@router.delete(
+    "/{user_id}",
+    response_model=UserDeletionDTO,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def delete_user(
     user_id: int,
     db: async_db_dependency,
     current_user_: api_user_dependency,
-):
+) -> UserDeletionDTO:
     if current_user_.role != RoleEnumDTO.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can delete users",
         )
 
-    await users_service.delete_user(user_id, db)
+    deletion = await user_deletion_service.request_user_deletion(user_id, db)
+
+    if deletion is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    return deletion
+
+
+# Ход удаления пользователя
+@router.get("/{user_id}/deletion", response_model=UserDeletionDTO)
+async def get_user_deletion(
+    user_id: int,
+    db: async_db_dependency,
+    current_user_: api_user_dependency,
+) -> UserDeletionDTO:
+    if current_user_.role != RoleEnumDTO.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view user deletions",
+        )
+
+    deletion = await user_deletion_service.get_user_deletion(user_id, db)
+
+    if deletion is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User deletion not found",
+        )
+
+    return deletion
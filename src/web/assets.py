@@ -0,0 +1,182 @@
+# Сборка статических файлов: минификация (если установлены rcssmin и rjsmin),
+# имена с хешем содержимого и заранее сжатые варианты .gz и .br (если установлен
+# brotli). Результат и manifest.json с соответствием исходных путей собранным
+# записываются в static/dist; шаблоны получают пути через static_url.
+#
+#   python -m src.web.assets
+
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import logging
+import mimetypes
+from functools import lru_cache
+
+from starlette.types import Scope
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIRECTORY = "src/frontend/static"
+DIST_DIRECTORY = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Собранные файлы никогда не меняются (новое содержимое - новое имя)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Файлы без хеша в имени браузер перепроверяет при каждом использовании
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt")
+
+
+def minify(path: str, content: bytes) -> bytes:
+    try:
+        if path.endswith(".css"):
+            import rcssmin
+
+            return rcssmin.cssmin(content, keep_bang_comments=True)
+
+        if path.endswith(".js"):
+            import rjsmin
+
+            return rjsmin.jsmin(content, keep_bang_comments=True)
+
+    except ImportError as e:
+        logger.warning("%s is not minified: %s", path, e)
+
+    return content
+
+
+def hashed_name(path: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, extension = os.path.splitext(path)
+
+    return f"{root}.{digest}{extension}"
+
+
+# Сжатые варианты рядом с файлом (для gzip_static в nginx и для CachedStaticFiles)
+def write_compressed(path: str, content: bytes) -> None:
+    with open(path + ".gz", "wb") as gz_file:
+        gz_file.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+    try:
+        import brotli
+    except ImportError:
+        return
+
+    with open(path + ".br", "wb") as br_file:
+        br_file.write(brotli.compress(content, quality=11))
+
+
+def build_assets(static_directory: str = STATIC_DIRECTORY) -> dict[str, str]:
+    dist_directory = os.path.join(static_directory, DIST_DIRECTORY)
+    shutil.rmtree(dist_directory, ignore_errors=True)
+
+    manifest = {}
+    for root, directories, files in os.walk(static_directory):
+        if root == static_directory:
+            directories[:] = [name for name in directories if name != DIST_DIRECTORY]
+
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, static_directory).replace(os.sep, "/")
+
+            with open(source, "rb") as source_file:
+                content = minify(path, source_file.read())
+
+            built_path = f"{DIST_DIRECTORY}/{hashed_name(path, content)}"
+            target = os.path.join(static_directory, built_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with open(target, "wb") as target_file:
+                target_file.write(content)
+            if path.endswith(COMPRESSIBLE_EXTENSIONS):
+                write_compressed(target, content)
+
+            manifest[path] = built_path
+
+    with open(os.path.join(dist_directory, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+    return manifest
+
+
+# Манифест читается один раз на процесс; без сборки пути остаются исходными
+@lru_cache
+def load_manifest(static_directory: str = STATIC_DIRECTORY) -> dict[str, str]:
+    path = os.path.join(static_directory, DIST_DIRECTORY, MANIFEST_NAME)
+
+    try:
+        with open(path) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+# Адрес статического файла для шаблонов: {{ static_url('css/base.css') }}
+def static_url(path: str) -> str:
+    path = path.lstrip("/")
+    return "/static/" + load_manifest().get(path, path)
+
+
+# StaticFiles с заголовками кэширования; для собранных файлов отдается заранее
+# сжатый вариант (br или gz), если клиент его принимает
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.dist_directory = os.path.join(os.path.abspath(directory), DIST_DIRECTORY)
+
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        if not os.path.abspath(full_path).startswith(self.dist_directory + os.sep):
+            response = super().file_response(
+                full_path, stat_result, scope, status_code
+            )
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if media_type.startswith("text/"):
+            media_type += "; charset=utf-8"
+
+        for encoding, extension in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accept_encoding:
+                continue
+
+            try:
+                compressed_stat = os.stat(full_path + extension)
+            except FileNotFoundError:
+                continue
+
+            response = super().file_response(
+                full_path + extension, compressed_stat, scope, status_code
+            )
+            response.headers["Content-Type"] = media_type
+            response.headers["Content-Encoding"] = encoding
+            break
+        else:
+            response = super().file_response(
+                full_path, stat_result, scope, status_code
+            )
+
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    built = build_assets()
+    print(f"Built {len(built)} assets into {STATIC_DIRECTORY}/{DIST_DIRECTORY}")
@@ -0,0 +1,50 @@
+# Условные GET-запросы: ETag строится из дешевых счетчиков изменений (change_seq),
+# и при совпадении с If-None-Match ответ 304 отдается до основного запроса к БД
+from fastapi import Request, Response, status
+
+from src.config import app_settings
+
+
+def make_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+# Слабое сравнение (RFC 9110): префикс W/ не учитывается
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+# Заголовки кэширования для ответов, зависящих от пользователя: браузер каждый раз
+# перепроверяет ответ по ETag, а nginx (X-Accel-Expires) может держать его
+# HTTP_MICROCACHE_SECONDS секунд в кэше с ключом по заголовку Authorization
+def cache_headers(etag: str) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if app_settings.HTTP_MICROCACHE_SECONDS:
+        headers["X-Accel-Expires"] = str(app_settings.HTTP_MICROCACHE_SECONDS)
+
+    return headers
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag)
+    )
+
+
+def json_response(content: bytes, etag: str) -> Response:
+    return Response(
+        content, media_type="application/json", headers=cache_headers(etag)
+    )
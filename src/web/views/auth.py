@@ -1,3 +1,4 @@
+import logging
 from datetime import timedelta
 from pydantic import ValidationError
 from typing import Annotated, Optional
@@ -5,7 +6,6 @@ from typing import Annotated, Optional
 from fastapi import APIRouter, Request, Response, Depends, Form, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
 from src.config import app_settings
 from src.models.schemas import TokenDTO, UserResponseDTO, UserCreateDTO
@@ -13,9 +13,11 @@ from src.data.dependencies import async_db_dependency
 
 import src.services.auth as auth_service
 import src.services.users as users_service
+from src.web.views.templating import templates
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
-templates = Jinja2Templates(directory="src/frontend/templates")
 
 
 class LoginForm:
@@ -96,7 +98,7 @@ async def login(db: async_db_dependency, request: Request):
         return response
 
     except Exception as e:
-        print("Unknown error", e)
+        logger.exception("Unknown error during login: %s", e)
 
         msg = f"Unknown error"
         return templates.TemplateResponse(
@@ -1,19 +1,27 @@
 from fastapi import APIRouter, Request, status, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
 from src.web.views.auth import views_user_dependency
 from src.data.dependencies import async_db_dependency
 
 import src.services.users as users_service
 import src.services.messages as messages_service
+import src.services.rate_limit as rate_limit_service
+from src.services.instrumentation import messages_ingested
+from src.data.query_counter import query_budget
+from src.web.views.messages_ws import parse_ttl_seconds
+from src.web.views.templating import (
+    stream_template,
+    message_list_fragments,
+    user_list_fragments,
+)
 
 
 router = APIRouter(prefix="/messages", tags=["messages"])
-templates = Jinja2Templates(directory="src/frontend/templates")
 
 
 @router.get("/", response_class=HTMLResponse, include_in_schema=False)
+@query_budget(3)
 async def chat_page(
     request: Request,
     current_user: views_user_dependency,
@@ -22,16 +30,28 @@ async def chat_page(
     if not current_user:
         return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
 
-    all_users = await users_service.get_all_users(db)
     chat_users = await users_service.get_connected_users(current_user.id, db)
 
-    return templates.TemplateResponse(
+    # Список всех пользователей одинаков для всех страниц и отрисовывается
+    # заново только после изменения таблицы пользователей на любом воркере
+    users_key = await users_service.get_users_change_marker(db)
+    users_html = user_list_fragments.get(users_key)
+
+    if users_html is None:
+        all_users = await users_service.get_all_users(db)
+        user_fragments = user_list_fragments.render(
+            users_key, "users_datalist.html", {"all_users": all_users}
+        )
+    else:
+        user_fragments = [users_html]
+
+    return stream_template(
+        request,
         "users_list.html",
         {
-            "request": request,
             "user": current_user,
-            "all_users": all_users,
             "chat_users": chat_users,
+            "user_fragments": user_fragments,
         },
     )
 
@@ -57,6 +77,7 @@ async def start_chat(
 
 
 @router.get("/{user_id}", response_class=HTMLResponse, include_in_schema=False)
+@query_budget(3)
 async def user_chat(
     request: Request,
     user_id: int,
@@ -66,40 +87,67 @@ async def user_chat(
     if not current_user:
         return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
 
-    messages = await messages_service.get_messages_between_users(
-        current_user.id, user_id, db
-    )
-
     other_user = await users_service.get_user_by_id(user_id, db)
     if not other_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return templates.TemplateResponse(
+    # История загружается и отрисовывается, только если в переписке
+    # появились новые, измененные или удаленные сообщения
+    marker = await messages_service.get_conversation_marker(
+        current_user.id, user_id, db
+    )
+    messages_key = (current_user.id, other_user.id, other_user.username, *marker)
+    messages_html = message_list_fragments.get(messages_key)
+
+    if messages_html is None:
+        messages = await messages_service.get_messages_between_users(
+            current_user.id, user_id, db
+        )
+        message_fragments = message_list_fragments.render(
+            messages_key,
+            "chat_messages.html",
+            {"user": current_user, "other_user": other_user, "messages": messages},
+        )
+    else:
+        message_fragments = [messages_html]
+
+    return stream_template(
+        request,
         "chat.html",
         {
-            "request": request,
             "user": current_user,
             "other_user": other_user,
-            "messages": messages,
+            "message_fragments": message_fragments,
         },
     )
 
 
 @router.post("/{user_id}", response_class=HTMLResponse, include_in_schema=False)
+@query_budget(1)
 async def send_message(
     user_id: int,
     request: Request,
     current_user: views_user_dependency,
     db: async_db_dependency,
 ):
+    await rate_limit_service.check_message_rate(current_user.id)
+
     form = await request.form()
     message_content = form.get("text")
+    # Пустое значение - сообщение без срока жизни
+    ttl_seconds = form.get("ttl_seconds", "")
+    messages_ingested.inc("form")
 
     new_message = await messages_service.create_message(
         sender_id=current_user.id,
         recipient_id=user_id,
         text=message_content,
         db=db,
+        ttl_seconds=(
+            parse_ttl_seconds({"ttl_seconds": int(ttl_seconds)})
+            if ttl_seconds.isdigit()
+            else None
+        ),
     )
 
     return RedirectResponse(
@@ -0,0 +1,237 @@
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from src.config import app_settings
+from src.models.schemas import UserResponseDTO
+from src.web.views.auth import views_user_dependency
+from src.data.database import async_session_factory
+from src.data.dependencies import async_db_dependency
+from src.data.query_counter import query_budget
+
+import src.services.users as users_service
+import src.services.presence as presence_service
+import src.services.rate_limit as rate_limit_service
+from src.services.connections import QueueConnection, connection_registry
+from src.web.views.messages_ws import backlog_frames, handle_chat_event
+
+
+# Запасные транспорты чата для сетей, где WebSocket не проходит через прокси:
+# поток SSE и long-poll для получения, POST для отправки. Кадры те же, что
+# в chat_websocket, и приходят из того же реестра подключений; пропущенные
+# за время переподключения сообщения догружаются из БД по id последнего
+router = APIRouter(prefix="/messages", tags=["messages"])
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def get_chat_peer(
+    user_id: int, current_user: UserResponseDTO | None, db
+) -> UserResponseDTO:
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+        )
+
+    recipient = await users_service.get_user_by_id(user_id, db)
+
+    if recipient is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    return recipient
+
+
+def sse_event(data: str, event_id: int | None = None) -> str:
+    if event_id is None:
+        return f"data: {data}\n\n"
+
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+# Поток SSE: подключение регистрируется до чтения пропущенного из БД, поэтому
+# сообщения между чтением и началом потока не теряются (повторы отсекаются по id)
+async def sse_stream(
+    current_user: UserResponseDTO, recipient: UserResponseDTO, last_id: int | None
+):
+    connection = QueueConnection(app_settings.STREAM_QUEUE_SIZE)
+    first_connection = connection_registry.connect(
+        current_user.id, connection, recipient.id
+    )
+
+    try:
+        peer_presence = await presence_service.user_connected(
+            current_user.id, recipient.id, first_connection
+        )
+        yield "retry: 3000\n\n"
+
+        if connection_registry.draining:
+            yield sse_event(json.dumps(connection_registry.reconnect_frame()))
+            return
+
+        yield sse_event(json.dumps(peer_presence))
+
+        if last_id is not None:
+            async with async_session_factory() as db:
+                backlog = await backlog_frames(current_user, recipient, last_id, db)
+
+            # У кадра resync нет id: Last-Event-ID остается у последнего сообщения
+            for frame in backlog:
+                last_id = frame.get("id", last_id)
+                yield sse_event(json.dumps(frame), frame.get("id"))
+
+        # После закрытия подключения поток дочитывает очередь и завершается
+        while True:
+            frames = await connection.receive(app_settings.SSE_KEEPALIVE_SECONDS)
+
+            # Комментарий не дает прокси закрыть простаивающее соединение
+            if not frames:
+                if connection.close_code is not None:
+                    break
+
+                yield ": keepalive\n\n"
+                continue
+
+            for text in frames:
+                frame = json.loads(text)
+
+                if frame.get("type") != "message" or "id" not in frame:
+                    yield sse_event(text)
+                    continue
+
+                if last_id is not None and frame["id"] <= last_id:
+                    continue
+
+                last_id = frame["id"]
+                yield sse_event(text, last_id)
+
+    finally:
+        last_connection = connection_registry.disconnect(
+            current_user.id, connection, recipient.id
+        )
+        await presence_service.user_disconnected(
+            current_user.id, recipient.id, last_connection
+        )
+
+
+# EventSource при переподключении сам передает Last-Event-ID; при первом
+# подключении страница передает id последнего отрисованного сообщения
+@router.get("/{user_id}/events", include_in_schema=False)
+@query_budget(1)
+async def chat_events(
+    user_id: int,
+    request: Request,
+    current_user: views_user_dependency,
+    db: async_db_dependency,
+    last_id: int | None = Query(default=None, ge=0),
+):
+    recipient = await get_chat_peer(user_id, current_user, db)
+    await db.close()
+
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+
+    return StreamingResponse(
+        sse_stream(current_user, recipient, last_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# Long-poll для клиентов без EventSource: сразу возвращает пропущенные после
+# last_id сообщения, а если их нет - ждет новых кадров до LONG_POLL_TIMEOUT_SECONDS.
+# Пока запрос ждет кадров, пользователь в сети, как и с потоком SSE: сообщения,
+# полученные через long-poll, не дублируются уведомлением в телеграм
+@router.get("/{user_id}/poll", include_in_schema=False)
+@query_budget(2)
+async def chat_poll(
+    user_id: int,
+    current_user: views_user_dependency,
+    db: async_db_dependency,
+    last_id: int | None = Query(default=None, ge=0),
+) -> Response:
+    recipient = await get_chat_peer(user_id, current_user, db)
+
+    if connection_registry.draining:
+        await db.close()
+        return JSONResponse({"events": [connection_registry.reconnect_frame()]})
+
+    connection = QueueConnection(app_settings.STREAM_QUEUE_SIZE)
+    first_connection = connection_registry.connect(
+        current_user.id, connection, recipient.id
+    )
+
+    try:
+        await presence_service.user_connected(current_user.id, None, first_connection)
+
+        backlog = []
+        if last_id is not None:
+            backlog = await backlog_frames(current_user, recipient, last_id, db)
+        await db.close()
+
+        if backlog:
+            return JSONResponse({"events": backlog})
+
+        frames = await connection.receive(app_settings.LONG_POLL_TIMEOUT_SECONDS)
+
+    finally:
+        last_connection = connection_registry.disconnect(
+            current_user.id, connection, recipient.id
+        )
+        await presence_service.user_disconnected(
+            current_user.id, recipient.id, last_connection
+        )
+
+    # Кадры уже сериализованы реестром и склеиваются без повторного разбора
+    return Response(
+        '{"events":[' + ",".join(frames) + "]}", media_type="application/json"
+    )
+
+
+# Отправка события (сообщения или набора текста) без WebSocket; в ответе кадры,
+# которые WebSocket получил бы только от сервера этому клиенту (подтверждения).
+# Бюджет - худший случай: собеседник, INSERT сообщения, client_msg_id
+# и уведомление в outbox, если собеседник не в сети
+@router.post("/{user_id}/send", include_in_schema=False)
+@query_budget(4)
+async def chat_send(
+    user_id: int,
+    request: Request,
+    current_user: views_user_dependency,
+    db: async_db_dependency,
+) -> JSONResponse:
+    recipient = await get_chat_peer(user_id, current_user, db)
+
+    try:
+        event = await request.json()
+    except ValueError:
+        event = None
+
+    if not isinstance(event, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a JSON object",
+        )
+    event.setdefault("type", "message")
+
+    replies = []
+
+    async def reply(frame: dict) -> None:
+        replies.append(frame)
+
+    await handle_chat_event(
+        current_user,
+        recipient,
+        event,
+        db,
+        reply=reply,
+        throttle=rate_limit_service.check_message_rate,
+        source="http_stream",
+    )
+
+    return JSONResponse(replies)
@@ -1,5 +1,8 @@
-from typing import Annotated
+import json
+import time
+from typing import Annotated, Awaitable, Callable
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi import (
     APIRouter,
@@ -7,16 +10,27 @@ from fastapi import (
     WebSocket,
     WebSocketDisconnect,
     Depends,
+    status,
 )
 
 import src.services.auth as auth_service
 import src.services.users as users_service
 import src.services.messages as messages_service
+import src.services.presence as presence_service
+import src.services.rate_limit as rate_limit_service
 
-from src.models.schemas import UserResponseDTO
+from src.config import app_settings
+from src.models.schemas import UserResponseDTO, CLIENT_MSG_ID_MAX_LENGTH
 from src.data.dependencies import async_db_dependency
+from src.services.connections import connection_registry, deliver
+from src.services.message_dedup import message_dedup
 
-from celery_app.tasks import send_telegram_notification
+import src.services.notifications as notifications_service
+from src.services.instrumentation import (
+    fanout_duration,
+    messages_ingested,
+    log_sampled,
+)
 
 
 async def get_current_user_ws(token: str = Query(...)):
@@ -40,11 +54,201 @@ async def get_current_user_ws(token: str = Query(...)):
         return None
 
 
+# Подтверждение отправителю: по client_msg_id клиент сопоставляет
+# оптимистично показанное сообщение с id и временем на сервере
+def ack_frame(client_msg_id: str, message) -> dict:
+    return {
+        "type": "ack",
+        "client_msg_id": client_msg_id,
+        "id": message.id,
+        "timestamp": message.timestamp.isoformat(),
+    }
+
+
+def parse_client_msg_id(event: dict) -> str | None:
+    client_msg_id = event.get("client_msg_id")
+
+    if (
+        isinstance(client_msg_id, str)
+        and 0 < len(client_msg_id) <= CLIENT_MSG_ID_MAX_LENGTH
+    ):
+        return client_msg_id
+
+    return None
+
+
+# Срок жизни исчезающего сообщения в секундах (поле ttl_seconds события)
+def parse_ttl_seconds(event: dict) -> int | None:
+    ttl_seconds = event.get("ttl_seconds")
+
+    if (
+        isinstance(ttl_seconds, int)
+        and not isinstance(ttl_seconds, bool)
+        and 0 < ttl_seconds <= app_settings.MESSAGE_TTL_MAX_SECONDS
+    ):
+        return ttl_seconds
+
+    return None
+
+
 router = APIRouter(prefix="/ws/messages", tags=["messages"])
 ws_user_dependency = Annotated[UserResponseDTO | None, Depends(get_current_user_ws)]
 
-# Словарь для хранения активных подключений
-connected_users = {}
+
+# Разбор входящего кадра: JSON-событие с полем type или обычный текст сообщения
+def parse_client_frame(data: str) -> dict:
+    if data.startswith("{"):
+        try:
+            event = json.loads(data)
+        except ValueError:
+            event = None
+
+        if isinstance(event, dict) and "type" in event:
+            return event
+
+    return {"type": "message", "text": data}
+
+
+# Кадр нового сообщения, который получают участники диалога
+def message_frame(message, sender_name: str, client_msg_id: str | None = None) -> dict:
+    message_data = {}
+    message_data["type"] = "message"
+    message_data["id"] = message.id
+    message_data["text"] = message.text
+    message_data["sender_name"] = sender_name
+    message_data["timestamp"] = message.timestamp.isoformat()
+    if message.expires_at is not None:
+        message_data["expires_at"] = message.expires_at.isoformat()
+    if client_msg_id is not None:
+        message_data["client_msg_id"] = client_msg_id
+
+    return message_data
+
+
+# Кадры сообщений, пропущенных после last_id (не больше STREAM_BACKLOG_LIMIT).
+# Если пропущено больше, последним идет кадр resync, и клиент перезагружает
+# историю целиком; так же он поступает после обрыва соединения, потому что
+# правки и удаления за это время здесь не повторяются
+async def backlog_frames(
+    current_user: UserResponseDTO,
+    recipient: UserResponseDTO,
+    last_id: int,
+    db: AsyncSession,
+) -> list[dict]:
+    limit = app_settings.STREAM_BACKLOG_LIMIT
+    backlog = await messages_service.get_messages_between_users_after(
+        current_user.id, recipient.id, last_id, limit + 1, db
+    )
+
+    frames = [
+        message_frame(
+            message,
+            current_user.username
+            if message.sender_id == current_user.id
+            else recipient.username,
+        )
+        for message in backlog[:limit]
+    ]
+    if len(backlog) > limit:
+        frames.append({"type": "resync"})
+
+    return frames
+
+
+# Воркер останавливается (см. ConnectionRegistry.drain): принятое соединение
+# сразу получает кадр reconnect и закрывается, клиент переподключится к другому
+async def close_if_draining(websocket: WebSocket) -> bool:
+    if not connection_registry.draining:
+        return False
+
+    await websocket.send_json(connection_registry.reconnect_frame())
+    await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+    return True
+
+
+# Обработка события клиента в диалоге. Общая для WebSocket и запасных транспортов
+# (SSE и long-poll): reply отправляет кадр только источнику события,
+# throttle ограничивает частоту (ожидание или ответ 429), source - метка в метриках
+async def handle_chat_event(
+    current_user: UserResponseDTO,
+    recipient: UserResponseDTO,
+    event: dict,
+    db: AsyncSession,
+    reply: Callable[[dict], Awaitable[None]],
+    throttle: Callable[[int], Awaitable[None]],
+    source: str,
+) -> None:
+    # Эфемерные события (набор текста) обрабатываются только в памяти
+    if event["type"] in presence_service.EPHEMERAL_EVENT_TYPES:
+        await presence_service.handle_event(current_user.id, recipient.id, event)
+        return
+
+    if event["type"] != "message" or not event.get("text"):
+        return
+
+    data = event["text"]
+    client_msg_id = parse_client_msg_id(event)
+
+    # Повтор уже принятого сообщения: только подтверждение, без БД и рассылки
+    if client_msg_id is not None:
+        original = await message_dedup.get(current_user.id, client_msg_id)
+        if original is not None:
+            await reply(ack_frame(client_msg_id, original))
+            return
+
+    await throttle(current_user.id)
+
+    messages_ingested.inc(source)
+    log_sampled(
+        "message_received",
+        sender_id=current_user.id,
+        recipient_id=recipient.id,
+        length=len(data),
+    )
+
+    # Уведомление записывается в outbox вместе с сообщением, если
+    # собеседник не подключен ни к одному воркеру
+    outbox_tasks = []
+    if recipient.telegram_url and await presence_service.filter_offline(
+        [recipient.id]
+    ):
+        outbox_tasks.append(
+            notifications_service.telegram_notification_task(
+                recipient.telegram_url, current_user.username, data
+            )
+        )
+
+    message_dto, created = await messages_service.create_message_once(
+        sender_id=current_user.id,
+        recipient_id=recipient.id,
+        text=data,
+        db=db,
+        client_msg_id=client_msg_id,
+        outbox_tasks=outbox_tasks,
+        ttl_seconds=parse_ttl_seconds(event),
+    )
+
+    if not created:
+        await reply(ack_frame(client_msg_id, message_dto))
+        return
+
+    message_data = message_frame(message_dto, current_user.username, client_msg_id)
+    if client_msg_id is not None:
+        await reply(ack_frame(client_msg_id, message_dto))
+
+    # Кадр получают сокеты обоих участников на всех воркерах
+    started = time.perf_counter()
+    await deliver({current_user.id, recipient.id}, message_data)
+    fanout_duration.observe(time.perf_counter() - started, "direct")
+
+    # Собеседник отключился между проверкой и отправкой
+    if not outbox_tasks and recipient.telegram_url:
+        if await presence_service.filter_offline([recipient.id]):
+            notifications_service.enqueue_telegram_notification(
+                recipient.telegram_url,
+                current_user.username,
+                message_data["text"],
+            )
 
 
 @router.websocket("/{user_id}")
@@ -53,44 +257,62 @@ async def chat_websocket(
     user_id: int,
     current_user: ws_user_dependency,
     db: async_db_dependency,
+    last_id: int | None = Query(default=None, ge=0),
 ):
-    await websocket.accept()
-    connected_users[current_user.id] = websocket
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-    try:
-        while True:
-            data = await websocket.receive_text()
-            print(
-                f"Client#{current_user.id} writes a message to client#{user_id}: {data}"
-            )
+    # Собеседник загружается один раз на соединение, а не на каждое сообщение;
+    # после этого соединение с БД возвращается в пул на время ожидания
+    recipient = await users_service.get_user_by_id(user_id, db)
+    await db.close()
 
-            message_dto = await messages_service.create_message(
-                sender_id=current_user.id,
-                recipient_id=user_id,
-                text=data,
-                db=db,
-            )
+    if recipient is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-            sender = await users_service.get_user_by_id(message_dto.sender_id, db)
-            recipient = await users_service.get_user_by_id(message_dto.recipient_id, db)
+    await websocket.accept()
+    if await close_if_draining(websocket):
+        return
+
+    first_connection = connection_registry.connect(current_user.id, websocket, user_id)
+    peer_presence = await presence_service.user_connected(
+        current_user.id, user_id, first_connection
+    )
 
-            message_data = {}
-            message_data["text"] = message_dto.text
-            message_data["sender_name"] = sender.username
-            message_data["timestamp"] = message_dto.timestamp.isoformat()
+    try:
+        await websocket.send_json(peer_presence)
 
-            if sender.id in connected_users:
-                await connected_users[sender.id].send_json(message_data)
+        # Переподключение: сообщения, пропущенные после last_id, догружаются из БД.
+        # Сокет уже зарегистрирован, поэтому новые сообщения не теряются, а
+        # повторы клиент отбрасывает по id
+        if last_id is not None:
+            backlog = await backlog_frames(current_user, recipient, last_id, db)
+            await db.close()
 
-            if recipient.id in connected_users:
-                await connected_users[recipient.id].send_json(message_data)
-            else:
-                if recipient.telegram_url:
-                    send_telegram_notification.delay(
-                        recipient.telegram_url,
-                        sender.username,
-                        message_data["text"],
-                    )
+            for frame in backlog:
+                await websocket.send_json(frame)
+
+        while True:
+            event = parse_client_frame(await websocket.receive_text())
+            await handle_chat_event(
+                current_user,
+                recipient,
+                event,
+                db,
+                reply=websocket.send_json,
+                throttle=rate_limit_service.wait_message_rate,
+                source="websocket",
+            )
 
     except WebSocketDisconnect:
-        del connected_users[current_user.id]
+        pass
+
+    finally:
+        last_connection = connection_registry.disconnect(
+            current_user.id, websocket, user_id
+        )
+        await presence_service.user_disconnected(
+            current_user.id, user_id, last_connection
+        )
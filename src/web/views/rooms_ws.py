@@ -0,0 +1,94 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+import src.services.rooms as rooms_service
+import src.services.presence as presence_service
+import src.services.rate_limit as rate_limit_service
+
+from src.data.dependencies import async_db_dependency
+from src.services.connections import connection_registry
+from src.web.views.messages_ws import (
+    ws_user_dependency,
+    parse_client_frame,
+    parse_ttl_seconds,
+    close_if_draining,
+)
+
+import src.services.notifications as notifications_service
+from src.services.instrumentation import messages_ingested
+
+
+router = APIRouter(prefix="/ws/rooms", tags=["rooms"])
+
+
+@router.websocket("/{room_id}")
+async def room_websocket(
+    websocket: WebSocket,
+    room_id: int,
+    current_user: ws_user_dependency,
+    db: async_db_dependency,
+):
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Состав чата загружается один раз и дальше берется из памяти воркера
+    members = await rooms_service.get_room_members(room_id, db)
+    await db.close()
+
+    if current_user.id not in members:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    if await close_if_draining(websocket):
+        return
+
+    first_connection = connection_registry.connect(current_user.id, websocket)
+    await presence_service.user_connected(current_user.id, None, first_connection)
+
+    try:
+        while True:
+            event = parse_client_frame(await websocket.receive_text())
+
+            if event["type"] != "message" or not event.get("text"):
+                continue
+
+            await rate_limit_service.wait_message_rate(current_user.id)
+            messages_ingested.inc("room_websocket")
+
+            # Состав перечитывается до записи: коммит сообщения завершает транзакцию,
+            # и соединение с БД не удерживается между сообщениями. Участник,
+            # которого удалили из чата, пока соединение было открыто, отключается
+            members = await rooms_service.get_room_members(room_id, db)
+            if current_user.id not in members:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            offline_members = await rooms_service.get_offline_room_members(
+                current_user.id, members
+            )
+
+            # Уведомления участникам не в сети пишутся в outbox в одной
+            # транзакции с сообщением
+            message_dto = await rooms_service.create_room_message(
+                room_id=room_id,
+                sender_id=current_user.id,
+                text=event["text"],
+                db=db,
+                outbox_tasks=[
+                    notifications_service.telegram_notification_task(
+                        telegram_url, current_user.username, event["text"]
+                    )
+                    for _, telegram_url in offline_members
+                ],
+                ttl_seconds=parse_ttl_seconds(event),
+            )
+            await rooms_service.fan_out_room_message(
+                message_dto, current_user.username, members
+            )
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        last_connection = connection_registry.disconnect(current_user.id, websocket)
+        await presence_service.user_disconnected(current_user.id, None, last_connection)
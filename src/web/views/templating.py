@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
+from markupsafe import Markup
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+from src.config import app_settings
+from src.web.assets import static_url
+
+
+TEMPLATES_DIRECTORY = "src/frontend/templates"
+
+# Размер части ответа при потоковой отрисовке (Jinja отдает много мелких строк)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+# Скомпилированные шаблоны сохраняются на диск и загружаются оттуда после
+# перезапуска, без повторного разбора и компиляции исходников
+def create_bytecode_cache() -> FileSystemBytecodeCache:
+    directory = app_settings.TEMPLATE_BYTECODE_CACHE_DIR
+    if directory is None:
+        return FileSystemBytecodeCache()
+
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(TEMPLATES_DIRECTORY),
+        autoescape=select_autoescape(),
+        bytecode_cache=create_bytecode_cache(),
+    )
+)
+templates.env.globals["static_url"] = static_url
+
+
+# Компиляция всех шаблонов при старте воркера (из кэша байткода, если он есть)
+def precompile_templates() -> None:
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+
+
+def _buffered(parts: Iterable[str], chunk_size: int) -> Iterator[str]:
+    buffer = []
+    size = 0
+
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+# Потоковая отрисовка страницы: начало документа уходит браузеру, пока остальное
+# еще отрисовывается. Генератор шаблона выполняется в пуле потоков Starlette
+def stream_template(request: Request, name: str, context: dict) -> StreamingResponse:
+    template = templates.get_template(name)
+    parts = template.generate({"request": request, **context})
+
+    return StreamingResponse(
+        _buffered(parts, STREAM_CHUNK_SIZE), media_type="text/html; charset=utf-8"
+    )
+
+
+# Кэш отрисованных фрагментов страниц в памяти воркера. Ключ должен меняться
+# вместе с данными фрагмента; ttl ограничивает устаревание, когда данные меняются
+# в другом воркере. Обращения идут и из пула потоков, поэтому нужна блокировка
+class FragmentCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, Markup]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Markup | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, html = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return html
+
+    def store(self, key: tuple, html: Markup) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), html)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Отрисовка фрагмента частями для вставки в потоковую страницу
+    # (в кэш попадает только полностью отрисованный фрагмент)
+    def render(self, key: tuple, name: str, context: dict) -> Iterator[Markup]:
+        rendered = []
+        for part in templates.get_template(name).generate(context):
+            rendered.append(part)
+            yield Markup(part)
+
+        self.store(key, Markup("".join(rendered)))
+
+
+message_list_fragments = FragmentCache(
+    max_entries=app_settings.TEMPLATE_FRAGMENT_CACHE_SIZE,
+    ttl=app_settings.TEMPLATE_FRAGMENT_TTL_SECONDS,
+)
+user_list_fragments = FragmentCache(
+    max_entries=16,
+    ttl=app_settings.TEMPLATE_FRAGMENT_TTL_SECONDS,
+)
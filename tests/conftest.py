@@ -0,0 +1,100 @@
+import os
+import tempfile
+
+# Настройки читаются при импорте src.config, поэтому окружение для тестов
+# задается до импорта приложения: SQLite во временном каталоге, без Redis
+# и без ретранслятора outbox
+TEST_DIR = tempfile.mkdtemp(prefix="chat-tests-")
+
+os.environ.update(
+    {
+        "JWT_SECRET_KEY": "test-secret",
+        "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+        "DATABASE_URL": f"sqlite:///{TEST_DIR}/test.db",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{TEST_DIR}/test.db",
+        "DB_REPLICA_URLS": "[]",
+        "OUTBOX_RELAY_ENABLED": "false",
+        "BLOB_STORE_DIR": f"{TEST_DIR}/media",
+        "MESSAGE_DEDUP_BACKEND": "memory",
+        "PRESENCE_BACKEND": "memory",
+        "RATE_LIMIT_BACKEND": "memory",
+        "BROADCAST_BACKEND": "memory",
+    }
+)
+
+import httpx
+import pytest
+from datetime import timedelta
+
+from src.models.base import Base
+from src.models.user import UserORM
+from src.models.schemas import UserResponseDTO
+from src.data.database import (
+    init_engines,
+    dispose_engines,
+    get_engine,
+    async_session_factory,
+)
+import src.services.auth as auth_service
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# Пустая база для каждого теста; движки создаются в цикле событий теста
+@pytest.fixture
+async def database():
+    init_engines()
+    Base.metadata.drop_all(get_engine())
+    Base.metadata.create_all(get_engine())
+
+    yield
+
+    await dispose_engines()
+
+
+@pytest.fixture
+async def db(database):
+    async with async_session_factory() as session:
+        yield session
+
+
+# Два пользователя и заголовки с их токенами: {"alice": (UserResponseDTO, headers), ...}
+@pytest.fixture
+async def users(db):
+    created = {}
+
+    for name in ("alice", "bob"):
+        user_model = UserORM(
+            username=name,
+            email=f"{name}@example.com",
+            telegram_url=f"https://t.me/{name}",
+            hashed_password="",
+        )
+        db.add(user_model)
+        await db.flush()
+
+        user = UserResponseDTO.from_row(user_model)
+        token = auth_service.create_access_token(user, timedelta(minutes=5))
+        created[name] = (user, {"Authorization": f"Bearer {token}"})
+
+    await db.commit()
+    return created
+
+
+# HTTP-клиент, который вызывает приложение в цикле событий теста (без lifespan:
+# движки создает фикстура database). Кэши отрисованных фрагментов очищаются:
+# id в пустой базе повторяются от теста к тесту
+@pytest.fixture
+async def client(database):
+    from src.main import app
+    from src.web.views.templating import message_list_fragments, user_list_fragments
+
+    message_list_fragments._entries.clear()
+    user_list_fragments._entries.clear()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
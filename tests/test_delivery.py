@@ -0,0 +1,120 @@
+import json
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import src.services.presence as presence_service
+from src.services.broadcast import Broadcast, RedisBroadcastBackend, broadcast
+from src.services.connections import (
+    ConnectionRegistry,
+    QueueConnection,
+    connection_registry,
+)
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Второй воркер: своя подписка на канал Redis и свой реестр подключений,
+# кадры доставляются так же, как в src.services.connections
+@pytest.fixture
+async def other_worker(monkeypatch):
+    server = fakeredis.FakeServer()
+    backend = RedisBroadcastBackend(fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(broadcast, "backend", backend)
+
+    registry = ConnectionRegistry()
+    other = Broadcast(RedisBroadcastBackend(fakeredis.FakeAsyncRedis(server=server)))
+
+    async def deliver_local(user_ids, frame):
+        await registry.send_many(user_ids, frame)
+
+    async def deliver_to_watchers(user_id, frame):
+        await registry.send_many(registry.watchers(user_id), frame)
+
+    other.subscribe("deliver", deliver_local)
+    other.subscribe("deliver_watchers", deliver_to_watchers)
+
+    tasks = [asyncio.create_task(other.run()), asyncio.create_task(broadcast.run())]
+    await asyncio.sleep(0.05)
+
+    yield registry
+
+    for task in tasks:
+        task.cancel()
+
+
+async def receive(connection: QueueConnection) -> list[dict]:
+    return [json.loads(frame) for frame in await connection.receive(1.0)]
+
+
+# Сообщение, отправленное на этом воркере, доходит до собеседника,
+# подключенного к другому
+async def test_message_reaches_peer_on_another_worker(client, users, other_worker):
+    alice, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    connection = QueueConnection(16)
+    other_worker.connect(bob.id, connection, alice.id)
+
+    response = await client.post(
+        f"/messages/{bob.id}/send",
+        json={"type": "message", "text": "hi", "client_msg_id": "d-1"},
+    )
+    assert response.status_code == 200
+
+    frames = await receive(connection)
+    assert [frame["text"] for frame in frames if frame["type"] == "message"] == ["hi"]
+
+
+# Сообщение группового чата доходит до участника на другом воркере
+async def test_room_message_reaches_member_on_another_worker(
+    client, users, other_worker
+):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+
+    response = await client.post(
+        "/api/rooms/", json={"name": "team"}, headers=alice_headers
+    )
+    room_id = response.json()["id"]
+    response = await client.post(
+        f"/api/rooms/{room_id}/members", json={"user_id": bob.id}, headers=alice_headers
+    )
+    assert response.status_code == 204
+
+    connection = QueueConnection(16)
+    other_worker.connect(bob.id, connection)
+
+    response = await client.post(
+        f"/api/rooms/{room_id}/messages", json={"text": "hi all"}, headers=alice_headers
+    )
+    assert response.status_code == 201
+
+    frames = await receive(connection)
+    assert [frame["text"] for frame in frames if frame["type"] == "room_message"] == [
+        "hi all"
+    ]
+
+
+# Собеседник, открывший чат на другом воркере, видит подключение пользователя
+async def test_presence_reaches_watcher_on_another_worker(users, other_worker):
+    alice, _ = users["alice"]
+    bob, _ = users["bob"]
+
+    connection = QueueConnection(16)
+    other_worker.connect(bob.id, connection, alice.id)
+
+    alice_connection = QueueConnection(16)
+    first_connection = connection_registry.connect(alice.id, alice_connection)
+    try:
+        await presence_service.user_connected(alice.id, None, first_connection)
+
+        frames = await receive(connection)
+        assert {"type": "presence", "user_id": alice.id, "status": "online"} in frames
+    finally:
+        last_connection = connection_registry.disconnect(alice.id, alice_connection)
+        await presence_service.user_disconnected(alice.id, None, last_connection)
@@ -0,0 +1,29 @@
+import pytest
+
+from src.models.user import UserORM
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Пользователь, созданный в обход этого воркера (другой воркер или задача),
+# появляется в отрисованном списке без ожидания срока жизни кэша
+async def test_user_list_follows_database(client, users, db):
+    _, alice_headers = users["alice"]
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    response = await client.get("/messages/")
+    assert "carol" not in response.text
+
+    db.add(
+        UserORM(
+            username="carol",
+            email="carol@example.com",
+            telegram_url="https://t.me/carol",
+            hashed_password="",
+        )
+    )
+    await db.commit()
+
+    response = await client.get("/messages/")
+    assert "carol" in response.text
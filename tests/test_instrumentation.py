@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import src.services.instrumentation  # noqa: F401  регистрирует обработчики событий
+
+
+# Запрос с ошибкой не оставляет время начала в стеке соединения
+def test_failed_statement_does_not_leak_start_time():
+    engine = create_engine("sqlite://")
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+            connection.rollback()
+
+        connection.execute(text("SELECT 1"))
+
+        assert connection.info["query_start_time"] == []
+
+    engine.dispose()
@@ -0,0 +1,50 @@
+import pytest
+
+from src.config import app_settings
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def poll(client, users, last_id: int) -> list[dict]:
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    response = await client.get(f"/messages/{bob.id}/poll?last_id={last_id}")
+    assert response.status_code == 200
+    return response.json()["events"]
+
+
+async def send_messages(client, users, count: int) -> None:
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+
+    for i in range(count):
+        response = await client.post(
+            "/api/messages/",
+            json={"recipient_id": bob.id, "text": f"m{i}"},
+            headers=alice_headers,
+        )
+        assert response.status_code == 201
+
+
+# Все пропущенные сообщения помещаются в лимит: кадра resync нет
+async def test_replay_within_limit(client, users, monkeypatch):
+    monkeypatch.setattr(app_settings, "STREAM_BACKLOG_LIMIT", 3)
+    await send_messages(client, users, 3)
+
+    events = await poll(client, users, 0)
+
+    assert [event["text"] for event in events] == ["m0", "m1", "m2"]
+
+
+# Пропущено больше лимита: первые сообщения и кадр resync в конце
+async def test_replay_over_limit_asks_to_resync(client, users, monkeypatch):
+    monkeypatch.setattr(app_settings, "STREAM_BACKLOG_LIMIT", 2)
+    await send_messages(client, users, 3)
+
+    events = await poll(client, users, 0)
+
+    assert [event.get("text") for event in events[:2]] == ["m0", "m1"]
+    assert events[2] == {"type": "resync"}
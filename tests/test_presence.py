@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+import src.services.presence as presence_service
+from src.config import app_settings
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Пока long-poll ждет кадров, пользователь в сети для всех воркеров,
+# после ответа - снова не в сети
+async def test_long_poll_marks_user_online(client, users, monkeypatch):
+    monkeypatch.setattr(app_settings, "LONG_POLL_TIMEOUT_SECONDS", 0.5)
+    alice, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    poll = asyncio.create_task(client.get(f"/messages/{bob.id}/poll"))
+    await asyncio.sleep(0.2)
+
+    assert await presence_service.presence_backend.filter_online([alice.id]) == {
+        alice.id
+    }
+    assert await presence_service.filter_offline([alice.id]) == []
+
+    response = await poll
+    assert response.status_code == 200
+    assert await presence_service.filter_offline([alice.id]) == [alice.id]
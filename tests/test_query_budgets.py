@@ -0,0 +1,312 @@
+import zlib
+import struct
+
+import pytest
+
+from src.config import app_settings
+from src.data.database import get_engine
+from src.services.thumbnails import generate_thumbnail
+from src.data.query_counter import count_queries
+from src.services.connections import connection_registry
+import src.web.api.messages as api_messages
+import src.web.api.sync as api_sync
+import src.web.api.attachments as api_attachments
+import src.web.views.messages as views_messages
+import src.web.views.messages_stream as views_messages_stream
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Настоящее изображение PNG 1x1, чтобы путь миниатюры работал как в жизни
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+PNG = (
+    b"\x89PNG\r\n\x1a\n"
+    + png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+    + png_chunk(b"IDAT", zlib.compress(b"\x00\xff\x00\x00"))
+    + png_chunk(b"IEND", b"")
+)
+
+
+# Запрос под count_queries с бюджетом, объявленным у обработчика через
+# query_budget: превышение бюджета - QueryBudgetExceeded
+async def request(client, endpoint, method: str, url: str, **kwargs):
+    with count_queries(endpoint.query_budget, f"{method} {url}") as counter:
+        response = await client.request(method, url, **kwargs)
+
+    return response, counter.count
+
+
+async def send(client, headers, recipient_id: int, text: str, **fields) -> dict:
+    response = await client.post(
+        "/api/messages/",
+        json={"recipient_id": recipient_id, "text": text, **fields},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def upload(client, headers) -> dict:
+    response = await client.post(
+        "/api/attachments/",
+        content=PNG,
+        headers={**headers, "Content-Type": "image/png", "X-Filename": "a.png"},
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def test_dialog_messages(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    await send(client, alice_headers, bob.id, "hello")
+
+    response, count = await request(
+        client,
+        api_messages.get_all_dialog_messages,
+        "GET",
+        "/api/messages/",
+        headers=alice_headers,
+    )
+    assert response.status_code == 200
+    assert count == 2
+
+    # С тем же ETag история не читается
+    response, count = await request(
+        client,
+        api_messages.get_all_dialog_messages,
+        "GET",
+        "/api/messages/",
+        headers={**alice_headers, "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+    assert count == 1
+
+
+async def test_send_message(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+
+    response, count = await request(
+        client,
+        api_messages.send_message,
+        "POST",
+        "/api/messages/",
+        json={"recipient_id": bob.id, "text": "hello"},
+        headers=alice_headers,
+    )
+    assert response.status_code == 201
+    assert count == 1
+
+
+async def test_send_message_with_client_id_and_attachments(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    attachment = await upload(client, alice_headers)
+
+    response, count = await request(
+        client,
+        api_messages.send_message,
+        "POST",
+        "/api/messages/",
+        json={
+            "recipient_id": bob.id,
+            "text": "photo",
+            "client_msg_id": "m-1",
+            "attachment_ids": [attachment["id"]],
+        },
+        headers=alice_headers,
+    )
+    assert response.status_code == 201
+    assert count == 3
+
+
+async def test_edit_and_delete_message(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    message = await send(client, alice_headers, bob.id, "hello")
+
+    response, count = await request(
+        client,
+        api_messages.edit_message,
+        "PATCH",
+        f"/api/messages/{message['id']}",
+        json={"text": "edited"},
+        headers=alice_headers,
+    )
+    assert response.status_code == 200
+    assert count == 1
+
+    response, count = await request(
+        client,
+        api_messages.delete_message,
+        "DELETE",
+        f"/api/messages/{message['id']}",
+        headers=alice_headers,
+    )
+    assert response.status_code == 204
+    assert count == 1
+
+
+async def test_sync(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    await send(client, alice_headers, bob.id, "hello")
+
+    response, count = await request(
+        client,
+        api_sync.sync,
+        "GET",
+        "/api/sync/",
+        headers=alice_headers,
+    )
+    assert response.status_code == 200
+    assert len(response.json()["messages"]) == 1
+    assert count == 1
+
+
+async def test_attachments(client, users, monkeypatch):
+    _, alice_headers = users["alice"]
+    # Файл отдает nginx: ответ не читает хранилище
+    monkeypatch.setattr(app_settings, "ATTACHMENT_ACCEL_REDIRECT_PREFIX", "/media/")
+
+    response, count = await request(
+        client,
+        api_attachments.upload_attachment,
+        "POST",
+        "/api/attachments/",
+        content=PNG,
+        headers={**alice_headers, "Content-Type": "image/png", "X-Filename": "a.png"},
+    )
+    assert response.status_code == 201
+    assert count == 2
+    attachment_id = response.json()["id"]
+    assert response.json()["thumbnail_status"] == "pending"
+
+    # Задача Celery строит миниатюру (без Pillow - статус failed)
+    thumbnail_status = generate_thumbnail(get_engine(), attachment_id)
+
+    for endpoint, url in (
+        (api_attachments.get_attachment, f"/api/attachments/{attachment_id}"),
+        (
+            api_attachments.download_attachment,
+            f"/api/attachments/{attachment_id}/content",
+        ),
+        (
+            api_attachments.download_thumbnail,
+            f"/api/attachments/{attachment_id}/thumbnail",
+        ),
+    ):
+        response, count = await request(
+            client,
+            endpoint,
+            "GET",
+            url,
+            headers=alice_headers,
+        )
+        assert response.status_code == (
+            404 if "thumbnail" in url and thumbnail_status != "ready" else 200
+        )
+        assert count == 2
+
+
+async def test_chat_pages(client, users):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    await send(client, alice_headers, bob.id, "hello")
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    response, count = await request(
+        client,
+        views_messages.chat_page,
+        "GET",
+        "/messages/",
+    )
+    assert response.status_code == 200
+    assert count == 3
+
+    # Отрисованный список пользователей берется из кэша
+    response, count = await request(
+        client,
+        views_messages.chat_page,
+        "GET",
+        "/messages/",
+    )
+    assert response.status_code == 200
+    assert count == 2
+
+    response, count = await request(
+        client,
+        views_messages.user_chat,
+        "GET",
+        f"/messages/{bob.id}",
+    )
+    assert response.status_code == 200
+    assert count == 3
+
+    # Отрисованная история берется из кэша
+    response, count = await request(
+        client,
+        views_messages.user_chat,
+        "GET",
+        f"/messages/{bob.id}",
+    )
+    assert response.status_code == 200
+    assert count == 2
+
+    response, count = await request(
+        client,
+        views_messages.send_message,
+        "POST",
+        f"/messages/{bob.id}",
+        data={"text": "from form"},
+    )
+    assert response.status_code in (200, 302)
+    assert count == 1
+
+
+async def test_chat_fallback_transports(client, users, monkeypatch):
+    _, alice_headers = users["alice"]
+    bob, _ = users["bob"]
+    message = await send(client, alice_headers, bob.id, "hello")
+    client.cookies.set("access_token", alice_headers["Authorization"].split()[1])
+
+    response, count = await request(
+        client,
+        views_messages_stream.chat_poll,
+        "GET",
+        f"/messages/{bob.id}/poll?last_id={message['id'] - 1}",
+    )
+    assert response.status_code == 200
+    assert count == 2
+
+    response, count = await request(
+        client,
+        views_messages_stream.chat_send,
+        "POST",
+        f"/messages/{bob.id}/send",
+        json={"type": "message", "text": "hi", "client_msg_id": "s-1"},
+    )
+    assert response.status_code == 200
+    # Собеседник не в сети: уведомление пишется в outbox
+    assert count == 4
+
+    # Воркер останавливается: поток сразу завершается кадром reconnect
+    monkeypatch.setattr(connection_registry, "draining", True)
+    response, count = await request(
+        client,
+        views_messages_stream.chat_events,
+        "GET",
+        f"/messages/{bob.id}/events",
+    )
+    assert response.status_code == 200
+    assert count == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import src.services.rate_limit as rate_limit_service
+from src.services.rate_limit import InMemoryTokenBucket, RedisTokenBucket
+
+
+pytestmark = pytest.mark.anyio
+
+
+# Часы, которые тест передвигает сам
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit_service.time, "monotonic", clock)
+    return clock
+
+
+async def test_memory_bucket_allows_burst_then_rejects(clock):
+    bucket = InMemoryTokenBucket(rate=2.0, burst=3)
+
+    assert [await bucket.acquire(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await bucket.acquire(1) == pytest.approx(0.5)
+    # Ведро другого ключа не тронуто
+    assert await bucket.acquire(2) == 0.0
+
+
+async def test_memory_bucket_refills(clock):
+    bucket = InMemoryTokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        await bucket.acquire(1)
+
+    clock.now += 0.5
+    assert await bucket.acquire(1) == 0.0
+    assert await bucket.acquire(1) > 0
+
+    # Запас не превышает burst, сколько бы ни прошло времени
+    clock.now += 60
+    assert [await bucket.acquire(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await bucket.acquire(1) > 0
+
+
+# Наполнившиеся ведра удаляются, частично пустые остаются
+async def test_memory_bucket_drops_full_buckets(clock):
+    bucket = InMemoryTokenBucket(rate=1.0, burst=2)
+    for key in range(100):
+        await bucket.acquire(key)
+    assert len(bucket) == 100
+
+    clock.now += 2
+    for _ in range(2):
+        await bucket.acquire("active")
+
+    assert len(bucket) == 1
+
+
+async def test_redis_bucket_burst_reject_and_refill():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    bucket = RedisTokenBucket(fakeredis.FakeAsyncRedis(), rate=20.0, burst=2)
+
+    assert [await bucket.acquire(1) for _ in range(2)] == [0.0, 0.0]
+    retry_after = await bucket.acquire(1)
+    assert 0 < retry_after <= 0.05
+    assert await bucket.acquire(2) == 0.0
+
+    await asyncio.sleep(0.1)
+    assert await bucket.acquire(1) == 0.0
+
+
+# Ошибка Redis не блокирует отправку
+async def test_redis_bucket_fails_open():
+    fakeredis = pytest.importorskip("fakeredis")
+    bucket = RedisTokenBucket(fakeredis.FakeAsyncRedis(), rate=1.0, burst=1)
+
+    async def unavailable(**kwargs):
+        raise ConnectionError("Redis is down")
+
+    bucket._script = unavailable
+
+    assert await bucket.acquire(1) == 0.0
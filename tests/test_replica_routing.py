@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.data.routing as routing
+from src.data.routing import ReplicaRouter, replica_execute
+from src.models.base import Base
+from src.models.user import UserORM
+import src.services.messages as messages_service
+
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(routing.time, "monotonic", clock)
+    return clock
+
+
+def make_router(engines) -> ReplicaRouter:
+    return ReplicaRouter(
+        engines, sticky_seconds=5.0, max_lag_seconds=5.0, retry_seconds=30.0
+    )
+
+
+# Реплика с копией схемы и собственными данными, чтобы было видно, откуда
+# пришел результат
+@pytest.fixture
+async def replica(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(
+            insert(UserORM).values(username="replica", email="replica@example.com")
+        )
+
+    yield engine
+
+    await engine.dispose()
+
+
+# Реплика, к которой нельзя подключиться
+@pytest.fixture
+async def broken_replica(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    yield engine
+    await engine.dispose()
+
+
+async def test_without_replicas_reads_go_to_primary():
+    assert make_router([]).choose(1) is None
+
+
+async def test_replicas_are_used_in_turn():
+    router = make_router(["first", "second"])
+
+    assert [router.choose() for _ in range(4)] == ["first", "second", "first", "second"]
+
+
+async def test_writer_reads_primary_within_sticky_window(clock):
+    router = make_router(["replica"])
+    router.mark_write(1)
+
+    assert router.choose(1) is None
+    assert router.choose(2) == "replica"
+    # Чтение переписки касается обоих участников
+    assert router.choose(2, 1) is None
+
+    clock.now += 5.0
+    assert router.choose(1) == "replica"
+
+
+async def test_failed_replica_is_skipped_until_retry(clock):
+    router = make_router(["first", "second"])
+    router.mark_failed("first")
+
+    assert {router.choose() for _ in range(4)} == {"second"}
+
+    router.mark_failed("second")
+    assert router.choose() is None
+
+    clock.now += 30.0
+    assert router.choose() in {"first", "second"}
+
+
+async def test_replica_execute_reads_from_replica(db, replica, monkeypatch):
+    monkeypatch.setattr(routing, "replica_router", make_router([replica]))
+
+    result = await replica_execute(db, select(UserORM.username))
+
+    assert result.scalars().all() == ["replica"]
+
+
+async def test_replica_error_falls_back_to_primary(db, broken_replica, monkeypatch):
+    router = make_router([broken_replica])
+    monkeypatch.setattr(routing, "replica_router", router)
+
+    result = await replica_execute(db, select(UserORM.username))
+
+    assert result.scalars().all() == []
+    assert router.choose() is None
+
+
+# Ошибка реплики не должна откатывать то, что вызывающий код уже сделал в сессии
+async def test_replica_error_keeps_session_work(db, broken_replica, monkeypatch):
+    monkeypatch.setattr(routing, "replica_router", make_router([broken_replica]))
+
+    await db.execute(
+        insert(UserORM).values(username="pending", email="pending@example.com")
+    )
+    result = await replica_execute(db, select(UserORM.username))
+    assert result.scalars().all() == ["pending"]
+
+    await db.commit()
+    result = await db.execute(select(UserORM.username))
+    assert result.scalars().all() == ["pending"]
+
+
+# Отправитель сразу видит свое сообщение: его чтения идут на основной сервер,
+# а собеседник читает с реплики
+async def test_sender_reads_own_writes(db, users, replica, monkeypatch):
+    router = make_router([replica])
+    monkeypatch.setattr(routing, "replica_router", router)
+    monkeypatch.setattr(messages_service, "replica_router", router)
+    alice, _ = users["alice"]
+    bob, _ = users["bob"]
+
+    message = await messages_service.create_message(alice.id, bob.id, "hello", db)
+
+    messages = await messages_service.get_messages_between_users(alice.id, bob.id, db)
+    assert [m.id for m in messages] == [message.id]
+    assert router.choose(alice.id) is None
+    assert router.choose(bob.id) is replica
@@ -0,0 +1,41 @@
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_room(client, headers) -> int:
+    response = await client.post("/api/rooms/", json={"name": "team"}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+# Пустой PATCH не меняет срок жизни, явный null его отключает
+async def test_update_room_message_ttl(client, users):
+    _, alice_headers = users["alice"]
+    room_id = await create_room(client, alice_headers)
+
+    response = await client.patch(
+        f"/api/rooms/{room_id}",
+        json={"message_ttl_seconds": 60},
+        headers=alice_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["message_ttl_seconds"] == 60
+
+    response = await client.patch(
+        f"/api/rooms/{room_id}", json={}, headers=alice_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["message_ttl_seconds"] == 60
+
+    response = await client.patch(
+        f"/api/rooms/{room_id}",
+        json={"message_ttl_seconds": None},
+        headers=alice_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["message_ttl_seconds"] is None
+
+    response = await client.get("/api/rooms/", headers=alice_headers)
+    assert response.json()[0]["message_ttl_seconds"] is None
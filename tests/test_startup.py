@@ -0,0 +1,43 @@
+import os
+import sys
+import json
+import subprocess
+
+
+# Модули, которые приложение загружает при первом использовании или в lifespan
+# (список совпадает с benchmarks/startup_time.py)
+DEFERRED_MODULES = (
+    "jose",
+    "passlib",
+    "bcrypt",
+    "asyncpg",
+    "aiosqlite",
+    "psycopg2",
+    "redis",
+    "celery",
+    "requests",
+    "PIL",
+    "zstandard",
+)
+
+CHECK_IMPORTS = """
+import sys, json
+import src.main
+print(json.dumps(sorted({name.split(".")[0] for name in sys.modules})))
+"""
+
+
+# Импорт src.main в новом процессе (окружение тестов из conftest) не загружает
+# отложенные модули
+def test_import_does_not_load_deferred_modules():
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORTS],
+        env=dict(os.environ),
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(json.loads(result.stdout.splitlines()[-1]))
+
+    assert sorted(loaded.intersection(DEFERRED_MODULES)) == []